@@ -5,12 +5,22 @@ import "../interfaces/common/IERC20.sol";
 
 contract Withdrawable {
     address payable owner = payable(msg.sender);
+    mapping(address => bool) executors;
 
     modifier restricted() {
         require(msg.sender == owner, 'Withdrawable: RESTRICTED');
         _;
     }
 
+    modifier restrictedExecutor() {
+        require(msg.sender == owner || executors[msg.sender], 'Withdrawable: RESTRICTED');
+        _;
+    }
+
+    function setExecutor(address _executor, bool _allowed) external restricted {
+        executors[_executor] = _allowed;
+    }
+
     receive() external payable {}
 
     function withdrawToken(address _tokenAddress) public restricted {
@@ -8,6 +8,7 @@ import "../libraries/Withdrawable.sol";
 import "../libraries/CHIBurner.sol";
 
 import {PancakeswapLibrary} from "../libraries/uniswap_v2/PancakeswapLibrary.sol";
+import {MdexLibrary} from "../libraries/uniswap_v2/MdexLibrary.sol";
 
 
 contract MultiV1 is Withdrawable, CHIBurner {
@@ -81,7 +82,7 @@ contract MultiV1 is Withdrawable, CHIBurner {
 
     // function flash_09lc(  // 0x00000d86
     //     bytes calldata data
-    // ) external discountCHIOn restricted {
+    // ) external discountCHIOn restrictedExecutor {
     //     (,uint256 dex1, address[] memory path) = _decodeFlash(data);
     //     address pcs1Pair;
     //     address token0;
@@ -175,7 +176,7 @@ contract MultiV1 is Withdrawable, CHIBurner {
 
     function swap32_bZf(  // 0x000019e2
         bytes32 data
-    ) external discountCHIOn restricted {
+    ) external discountCHIOn restrictedExecutor {
         uint256 amountLast;
         bytes32 amountIn0;
         uint256 amountIn1;
@@ -248,6 +249,93 @@ contract MultiV1 is Withdrawable, CHIBurner {
     //     require(amountIn0 < amountLast, 'LR');
     // }
 
+    // Result of each arbitrage of a batch, `index` being its position in the batch and `gasUsed`
+    // the gas it used before refunds
+    event BatchItemResult(uint256 index, bool executed, uint256 gasUsed);
+
+    function swapBatch_SYr(  // 0x0000e735
+        bytes32[] calldata data
+    ) external discountCHIOn restrictedExecutor {
+        // Each arbitrage is encoded in two words, with the same format used in _swapV2
+        require(data.length % 2 == 0, 'BL');
+        uint256 nExecuted;
+        for (uint256 i; i < data.length; i += 2) {
+            uint256 gasStart = gasleft();
+            bool executed = _swapV2(data[i], data[i + 1]);
+            if (executed) {
+                nExecuted++;
+            }
+            emit BatchItemResult(i / 2, executed, gasStart - gasleft());
+        }
+        require(nExecuted > 0, 'LR');
+    }
+
+    function _swapV2(bytes32 data0, bytes32 data1) internal returns (bool executed) {
+        // Data has structure {b2 tokenFirst}{b1 tokenLast}{b5 dex0}{b5 dex1}{b6 amountExp}{b13 amountMant}{b160 pair0}{b160 pair1}{b160 pair2}
+        // pair0 is the dex0 pair, which receives WBNB, and pair1 (+ pair2) are the dex1 route
+        // pairs, with the last one returning `amountLast` WBNB
+        uint256 d0 = uint256(data0);
+        uint256 d1 = uint256(data1);
+        address[] memory pairs = new address[](d1 & _ADDR_2_MASK == 0 ? 2 : 3);
+        pairs[0] = address(uint160(d0 >> 64));
+        pairs[1] = address(uint160(((d0 & _ADDR_1_MASK_0) << 96) + (d1 >> 160)));
+        if (pairs.length == 3) {
+            pairs[2] = address(uint160(d1));
+        }
+        bool[] memory zeroForOne = _getDirections(pairs, d0 >> 254, (d0 >> 253) & 1);
+
+        // amounts[i] is the input of pairs[i] and amounts[i + 1] its output
+        uint256[] memory amounts = new uint256[](pairs.length + 1);
+        amounts[pairs.length] = ((d0 >> 224) & 0x1fff) << ((d0 >> 237) & 0x3f);
+        for (uint256 i = pairs.length - 1; i > 0; i--) {
+            amounts[i] = _getAmountIn(pairs[i], zeroForOne[i], amounts[i + 1], (d0 >> 243) & 0x1f);
+        }
+        amounts[0] = _getAmountIn(pairs[0], zeroForOne[0], amounts[1], (d0 >> 248) & 0x1f);
+        if (amounts[0] >= amounts[pairs.length]) {
+            return false;  // Skip arbitrages no longer profitable instead of reverting the batch
+        }
+
+        TransferHelper.safeTransfer(WBNB, pairs[0], amounts[0]);
+        for (uint256 i; i < pairs.length; i++) {
+            (uint256 amount0Out, uint256 amount1Out) = zeroForOne[i] ? (uint256(0), amounts[i + 1]) : (amounts[i + 1], uint256(0));
+            address to = i == pairs.length - 1 ? address(this) : pairs[i + 1];
+            IUniswapV2Pair(pairs[i]).swap(amount0Out, amount1Out, to, new bytes(0));
+        }
+        return true;
+    }
+
+    function _getDirections(
+        address[] memory pairs,
+        uint256 tokenFirst,
+        uint256 tokenLast
+    ) internal view returns (bool[] memory zeroForOne) {
+        // tokenFirst is the index of the token received from pairs[0], tokenLast the index of
+        // WBNB in the last pair
+        zeroForOne = new bool[](pairs.length);
+        zeroForOne[0] = tokenFirst == 1;
+        zeroForOne[pairs.length - 1] = tokenLast == 1;
+        if (pairs.length == 3) {
+            IUniswapV2Pair pair0 = IUniswapV2Pair(pairs[0]);
+            address token = tokenFirst == 0 ? pair0.token0() : pair0.token1();
+            zeroForOne[1] = IUniswapV2Pair(pairs[1]).token0() == token;
+        }
+    }
+
+    function _getAmountIn(
+        address pair,
+        bool zeroForOne,
+        uint256 amountOut,
+        uint256 dex
+    ) internal view returns (uint256 amountIn) {
+        (uint256 reserve0, uint256 reserve1,) = IUniswapV2Pair(pair).getReserves();
+        (uint256 reserveIn, uint256 reserveOut) = zeroForOne ? (reserve0, reserve1) : (reserve1, reserve0);
+        if (amountOut >= reserveOut) {
+            return uint256(-1);
+        }
+        uint256 fee = dex == PCS_1 ? pcs1Fee : dex == PCS_2 ? pcs2Fee : MdexLibrary.getPairFees(pair);
+        amountIn = PancakeswapLibrary.getAmountIn(amountOut, reserveIn, reserveOut, fee);
+    }
+
     function _get_amounts(
         uint256 dex0,
         uint256 dex1,
@@ -35,7 +35,7 @@ contract PcsPcs2V3 is Withdrawable, CHIBurner {
     function flash_09lc(  // 0x00000d86
         bytes calldata data,
         uint256 amount
-    ) external discountCHIOn restricted {
+    ) external discountCHIOn restrictedExecutor {
         (,uint8 dex1, address[] memory path) = AddressArrayEncoder.decodeWithHeader2(data);
         address pcs1Pair;
         address token0;
@@ -110,7 +110,7 @@ contract PcsPcs2V3 is Withdrawable, CHIBurner {
 
     function swap32_bZf(  // 0x000019e2
         bytes32 data
-    ) external discountCHIOn restricted {
+    ) external discountCHIOn restrictedExecutor {
         uint256 amountLast;
         address token;
         uint8 dex0;
@@ -172,7 +172,7 @@ contract PcsPcs2V3 is Withdrawable, CHIBurner {
     function swap64_Fi4(  // 0x00002189
         bytes32 data0,
         bytes32 data1
-    ) external discountCHIOn restricted {
+    ) external discountCHIOn restrictedExecutor {
         uint256 amountLast;
         uint8 dex0;
         uint8 dex1;
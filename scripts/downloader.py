@@ -1,85 +1,165 @@
 #!/usr/bin/env python3
+# Parallel download of a large file with HTTP Range requests. Parts are written directly at their
+# offsets of a preallocated output file, and progress of each part is kept in a journal, so that
+# an interrupted download resumes from the last bytes written.
+# Usage: downloader.py [DOWNLOAD_DIR] [URL]
 import asyncio
 import concurrent.futures
+import json
 import os
 import sys
 import time
 from random import random
+from threading import Lock
 
 import requests
 from tqdm import tqdm
 
-URL = 'https://binance-smart-chain-snapshot.s3.amazonaws.com/snap.tar.gz'
-DOWNLOAD_DIR = sys.argv[1] if len(sys.argv) > 0 else '/mnt/nvme0'
-OUTPUT = os.path.join(DOWNLOAD_DIR, 'snap.tar.gz')
+URL = sys.argv[2] if len(sys.argv) > 2 else \
+    'https://binance-smart-chain-snapshot.s3.amazonaws.com/snap.tar.gz'
+DOWNLOAD_DIR = sys.argv[1] if len(sys.argv) > 1 else '/mnt/nvme0'
+OUTPUT = os.path.join(DOWNLOAD_DIR, os.path.basename(URL))
 DOWNLOAD_JIGGLE_TIME = 10
 N_WORKERS = 60
-BLOCK_SIZE_DISK_WRITE = 10_2400  # 100 KB
+BLOCK_SIZE_DISK_WRITE = 1_048_576  # 1 MiB, maximum memory used by each worker
 BLOCK_SIZE_DOWNLOAD = 500_000_000  # 500 MiB
-N_TRIES = 3
-
-
-async def get_size(url):
-    response = requests.get(url, stream=True)
-    size = int(response.headers['Content-Length'])
-    return size
-
-
-def download_range(url, start, end, output):
-    if os.path.exists(output):
-        print(f'Skipping {output}')
+N_TRIES = 5
+RETRY_WAIT_TIME = 5
+TIMEOUT = 60
+JOURNAL_SAVE_INTERVAL = 5.0
+
+
+class Journal:
+    def __init__(self, output: str, url: str, size: int, chunk_size: int):
+        """Bytes already written of each part of output file, saved at `{output}.journal`.
+        Progress of a previous download is only used if url, size and chunk size match, and
+        output file still exists with the expected size"""
+        self.path = f'{output}.journal'
+        self.header = {'url': url, 'size': size, 'chunk_size': chunk_size}
+        self.written: dict[int, int] = {}
+        self._lock = Lock()
+        self._saved_at = 0.0
+        if os.path.exists(self.path) and not (
+            os.path.exists(output) and os.path.getsize(output) == size
+        ):
+            print(f'Discarding journal, {output} is missing or has a different size')
+            os.remove(self.path)
+        if os.path.exists(self.path):
+            data = json.load(open(self.path))
+            if all(data.get(key) == value for key, value in self.header.items()):
+                self.written = {int(i): n for i, n in data['written'].items()}
+
+    def get(self, part: int) -> int:
+        with self._lock:
+            return self.written.get(part, 0)
+
+    def update(self, part: int, n_written: int, fd: int, force: bool = False):
+        """Record `n_written` bytes of part. Output is synced to disk before journal is saved,
+        so that journal never records bytes that were not persisted"""
+        with self._lock:
+            self.written[part] = n_written
+            if not force and time.time() - self._saved_at < JOURNAL_SAVE_INTERVAL:
+                return
+            os.fsync(fd)
+            tmp_path = f'{self.path}.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump({**self.header, 'written': self.written}, f)
+            os.replace(tmp_path, self.path)
+            self._saved_at = time.time()
+
+    def remove(self):
+        os.remove(self.path)
+
+
+def get_size(url: str) -> int:
+    with requests.get(url, stream=True, timeout=TIMEOUT) as response:
+        response.raise_for_status()
+        return int(response.headers['Content-Length'])
+
+
+def open_output(output: str, size: int) -> int:
+    """Open output file, preallocating it to its final size"""
+    fd = os.open(output, os.O_RDWR | os.O_CREAT, 0o644)
+    if os.fstat(fd).st_size != size:
+        if hasattr(os, 'posix_fallocate'):
+            os.posix_fallocate(fd, 0, size)
+        os.ftruncate(fd, size)
+    return fd
+
+
+def download_range(
+    url: str,
+    part: int,
+    start: int,
+    end: int,
+    fd: int,
+    journal: Journal,
+    progress: tqdm,
+):
+    """Download bytes [start, end] of url into output file, resuming from journal"""
+    offset = start + journal.get(part)
+    if offset > end:
         return
     time.sleep(random() * DOWNLOAD_JIGGLE_TIME)
-    print(f'Starting {output}')
-    headers = {'Range': f'bytes={start}-{end}'}
-    response = requests.get(url, stream=True, headers=headers)
-
-    for _ in range(N_TRIES):
+    for i in range(N_TRIES):
         try:
-            with open(f'{output}_incomplete', 'wb') as f:
-                for part in response.iter_content(BLOCK_SIZE_DISK_WRITE):
-                    f.write(part)
-        except Exception:
-            pass
+            headers = {'Range': f'bytes={offset}-{end}'}
+            with requests.get(url, stream=True, headers=headers, timeout=TIMEOUT) as response:
+                if response.status_code != 206:
+                    raise Exception(f'Range request not supported ({response.status_code=})')
+                for data in response.iter_content(BLOCK_SIZE_DISK_WRITE):
+                    data = data[:end + 1 - offset]
+                    os.pwrite(fd, data, offset)
+                    offset += len(data)
+                    progress.update(len(data))
+                    journal.update(part, offset - start, fd)
+            if offset <= end:
+                raise Exception(f'Incomplete response ({end + 1 - offset} bytes missing)')
+        except Exception as e:
+            tqdm.write(f'Error on part {part} at byte {offset} ({e!r})')
+            if i == N_TRIES - 1:
+                journal.update(part, offset - start, fd, force=True)
+                raise
+            time.sleep(RETRY_WAIT_TIME)
         else:
-            os.rename(f'{output}_incomplete', output)
-            break
-        finally:
-            if os.path.exists(f'{output}_incomplete'):
-                os.remove(f'{output}_incomplete')
-    else:
-        raise Exception(f'Error when downloading {output}')
-    print(f'Finished {output}')
+            journal.update(part, offset - start, fd, force=True)
+            return
 
 
 async def download(executor, url, output, chunk_size=BLOCK_SIZE_DOWNLOAD):
     loop = asyncio.get_event_loop()
 
-    file_size = await get_size(url)
+    file_size = get_size(url)
     chunks = range(0, file_size, chunk_size)
-
-    tasks = [
-        loop.run_in_executor(
-            executor,
-            download_range,
-            url,
-            start,
-            start + chunk_size - 1,
-            f'{output}.part{i:04d}',
-        )
-        for i, start in enumerate(chunks)
-    ]
-
-    await asyncio.wait(tasks)
-
-    print('Finished downloads, consolidating parts')
-    with open(output, 'wb') as o:
-        for i in tqdm(range(len(chunks))):
-            chunk_path = f'{output}.part{i:04d}'
-
-            with open(chunk_path, 'rb') as s:
-                o.write(s.read())
-            os.remove(chunk_path)
+    journal = Journal(output, url, file_size, chunk_size)
+    fd = open_output(output, file_size)
+    n_written = sum(journal.written.values())
+    progress = tqdm(total=file_size, initial=n_written, unit='B', unit_scale=True)
+
+    try:
+        tasks = [
+            loop.run_in_executor(
+                executor,
+                download_range,
+                url,
+                i,
+                start,
+                min(start + chunk_size, file_size) - 1,
+                fd,
+                journal,
+                progress,
+            )
+            for i, start in enumerate(chunks)
+        ]
+        # Wait for all parts before closing output, even if some of them fail
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+        progress.close()
+    if errors := [result for result in results if isinstance(result, Exception)]:
+        raise Exception(f'{len(errors)} parts failed, run again to resume') from errors[0]
+    journal.remove()
     print('Finished')
 
 
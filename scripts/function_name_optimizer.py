@@ -1,6 +1,10 @@
+import argparse
 import itertools
+import multiprocessing
 import re
 import string
+import time
+from typing import Iterable, Iterator
 
 from web3 import Web3
 
@@ -25,3 +29,132 @@ def get_name(signature: str, start_value: str) -> tuple[str, str]:
             sig_hash = Web3.sha3(text=test_signature).hex()[:10]
             if sig_hash.startswith(start_value):
                 return test_signature, sig_hash
+
+
+# Parallel search of suffixes for multiple selector prefixes at once. Each task covers the
+# suffixes sharing their first characters, and workers only report matches back to the main
+# process. Keccak is still called once per suffix, directly on bytes (no Web3.sha3 string/hex
+# conversions): signatures fit in a single keccak block (136 bytes), so reusing the state of an
+# absorbed prefix would not save any permutation, and speeding up further needs a C extension
+# hashing many candidates per call
+CHARS = (string.digits + string.ascii_letters).encode()
+MAX_SUFFIX_LEN = 10
+TASK_HEAD_LEN = 2  # Suffixes sharing their first TASK_HEAD_LEN characters form a task
+REPORT_INTERVAL = 10.0
+
+
+def _get_keccak():
+    from eth_hash.auto import keccak  # Same backend as Web3.sha3
+    return keccak
+
+
+def _parse_targets(start_values: Iterable[str]) -> dict[int, dict[int, str]]:
+    """Map number of hex digits to {prefix value: start value}"""
+    targets: dict[int, dict[int, str]] = {}
+    for start_value in start_values:
+        assert start_value.startswith('0x')
+        assert all(c in string.hexdigits for c in start_value[2:])
+        assert 2 < len(start_value) < 11
+        targets.setdefault(len(start_value) - 2, {})[int(start_value, 16)] = start_value.lower()
+    return targets
+
+
+def _search_task(
+    task: tuple[bytes, bytes, bytes, int, dict[int, dict[int, str]]],
+) -> tuple[int, list[tuple[str, str, str]]]:
+    """Hash all suffixes starting with `head` of length `suffix_len`.
+    Return number of hashes and list of matches (start value, signature, selector)"""
+    prefix, args, head, suffix_len, targets = task
+    keccak = _get_keccak()
+    shifts = [(32 - 4 * n_digits, prefixes) for n_digits, prefixes in targets.items()]
+    start = prefix + head
+    n_hashes = 0
+    matches = []
+    for tail in itertools.product(CHARS, repeat=suffix_len - len(head)):
+        signature = start + bytes(tail) + args
+        selector = int.from_bytes(keccak(signature)[:4], 'big')
+        for shift, prefixes in shifts:
+            if (value := selector >> shift) in prefixes:
+                matches.append((prefixes[value], signature.decode(), f'0x{selector:08x}'))
+        n_hashes += 1
+    return n_hashes, matches
+
+
+def _get_tasks(
+    fn_name: str,
+    args: str,
+    suffix_len: int,
+    targets: dict[int, dict[int, str]],
+) -> Iterator[tuple[bytes, bytes, bytes, int, dict[int, dict[int, str]]]]:
+    prefix, args_ = f'{fn_name}_'.encode(), args.encode()
+    for head in itertools.product(CHARS, repeat=min(suffix_len, TASK_HEAD_LEN)):
+        yield prefix, args_, bytes(head), suffix_len, targets
+
+
+def get_names(
+    signature: str,
+    start_values: Iterable[str],
+    processes: int = None,
+    max_suffix_len: int = MAX_SUFFIX_LEN,
+) -> dict[str, tuple[str, str]]:
+    """Parallel version of `get_name` searching for multiple start values at once. Returns
+    {start_value: (signature, selector)} with the shortest suffix found for each start value
+    (lowest signature among suffixes of same length)"""
+    match = sig_pat.search(signature)
+    if not match:
+        raise Exception('Incorrect signature')
+    fn_name = match.group('fn_name')
+    args = match.group('args')
+    targets = _parse_targets(start_values)
+    n_targets = sum(len(prefixes) for prefixes in targets.values())
+
+    results: dict[str, tuple[int, str, str]] = {}
+    n_hashes = 0
+    start_time = last_report = time.time()
+    with multiprocessing.Pool(processes) as pool:
+        for suffix_len in range(max_suffix_len):
+            tasks = _get_tasks(fn_name, args, suffix_len, targets)
+            for task_hashes, matches in pool.imap_unordered(_search_task, tasks):
+                n_hashes += task_hashes
+                for start_value, test_signature, sig_hash in matches:
+                    if start_value in results and results[start_value][0] != suffix_len:
+                        continue  # Already found with shorter suffix
+                    if start_value not in results:
+                        print(f'Found {test_signature} -> {sig_hash}')
+                    # Tasks complete out of order, keep lowest signature to be deterministic
+                    if start_value not in results or test_signature < results[start_value][1]:
+                        results[start_value] = suffix_len, test_signature, sig_hash
+                if (now := time.time()) - last_report > REPORT_INTERVAL:
+                    last_report = now
+                    elapsed = now - start_time
+                    print(
+                        f'{suffix_len=}: {n_hashes:,} hashes in {elapsed:,.0f}s '
+                        f'({n_hashes / elapsed:,.0f} hashes/s), '
+                        f'found {len(results)}/{n_targets}'
+                    )
+            if len(results) == n_targets:
+                break
+    elapsed = time.time() - start_time
+    print(f'{n_hashes:,} hashes in {elapsed:,.1f}s ({n_hashes / elapsed:,.0f} hashes/s)')
+    return {
+        start_value: (test_signature, sig_hash)
+        for start_value, (_, test_signature, sig_hash) in results.items()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Find function names with selector prefixes')
+    parser.add_argument('signature', help='e.g.: "swap(uint256,bytes32)"')
+    parser.add_argument('start_values', nargs='+', help='Selector prefixes, e.g.: 0x0000')
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--max-suffix-len', type=int, default=MAX_SUFFIX_LEN)
+    args = parser.parse_args()
+
+    results = get_names(args.signature, args.start_values, args.processes, args.max_suffix_len)
+    for start_value in args.start_values:
+        test_signature, sig_hash = results.get(start_value.lower(), (None, None))
+        print(f'{start_value}: {test_signature} ({sig_hash})')
+
+
+if __name__ == '__main__':
+    main()
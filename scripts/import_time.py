@@ -0,0 +1,68 @@
+# Check that importing main packages is fast and has no side effects (e.g.: probing RPC endpoints)
+import os
+import pathlib
+import re
+import subprocess
+import sys
+
+ROOT_DIRECTORY = pathlib.Path(__file__).parents[1]
+MODULES_BUDGET_MS = {
+    'configs': 10,
+    'core': 300,
+    'tools': 1_500,
+    'dex': 1_700,
+    'arbitrage': 2_000,
+}
+PAT_IMPORT_TIME = re.compile(r'^import time:\s+\d+ \|\s+(?P<cumulative>\d+) \| (?P<name>.+)$')
+
+# Unreachable endpoints, so that any connection attempt during import fails
+ENV = {
+    'CHAIN_ID': '56',
+    'PRIVATE_KEY': '0x' + '1' * 64,
+    'ADDRESS': '0x' + '0' * 40,
+    'CACHE_TTL': '1',
+    'POLL_INTERVAL': '1',
+    **os.environ,
+    'RPC_LOCAL_URI': '/nonexistent/geth.ipc',
+    'RPC_REMOTE_URI': 'wss://127.0.0.1:9',
+    'USE_REMOTE_RCP_CONNECTION': 'True',
+    'PYTHONPATH': str(ROOT_DIRECTORY / 'src'),
+}
+
+
+def get_import_time_ms(module: str) -> float:
+    """Cumulative import time of module in a fresh interpreter"""
+    res = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=ROOT_DIRECTORY,
+        env=ENV,
+        capture_output=True,
+        text=True,
+    )
+    if res.returncode != 0:
+        error = '\n'.join(
+            line for line in res.stderr.splitlines() if not line.startswith('import time:'))
+        raise Exception(f'Failed to import {module}:\n{error}')
+    for line in res.stderr.splitlines():
+        if (match := PAT_IMPORT_TIME.match(line)) and match['name'].strip() == module:
+            return int(match['cumulative']) / 1000
+    raise Exception(f'Import time of {module} not found')
+
+
+def main():
+    failed = False
+    for module, budget in MODULES_BUDGET_MS.items():
+        try:
+            import_time = get_import_time_ms(module)
+        except Exception as e:
+            print(e)
+            failed = True
+            continue
+        status = 'OK' if import_time <= budget else 'OVER BUDGET'
+        failed |= import_time > budget
+        print(f'{module:<12} {import_time:>8,.1f} ms (budget: {budget:,} ms) {status}')
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+"""Migrate arb_pairs/<hash>/summary.json and arb_pairs/<hash>/tx/<block>.json files of all
+strategies to a single ledger per strategy directory. Old files are kept."""
+import json
+import pathlib
+
+from arbitrage.ledger import Ledger
+
+STRATEGY_FILES_DIR = pathlib.Path('strategy_files')
+
+
+def load_summary(arb_pair_dir: pathlib.Path) -> dict:
+    for filename in ('summary.json', 'summary_BAK.json'):
+        if (filepath := arb_pair_dir / filename).exists():
+            try:
+                return json.load(open(filepath))
+            except json.JSONDecodeError:
+                continue
+    return {}
+
+
+def load_transactions(arb_pair_dir: pathlib.Path) -> list[dict]:
+    tx_dir = arb_pair_dir / 'tx'
+    if not tx_dir.exists():
+        return []
+    return [json.load(open(tx_file)) for tx_file in sorted(tx_dir.iterdir())]
+
+
+def migrate_strategy(strategy_dir: pathlib.Path):
+    ledger = Ledger(strategy_dir)
+    pairs_pools = {}
+    for arb_pair_dir in (strategy_dir / 'arb_pairs').iterdir():
+        pair_hash = arb_pair_dir.name
+        summary = load_summary(arb_pair_dir)
+        if summary:
+            ledger.update_summary(pair_hash, summary)
+            addresses = summary.get('addresses', {})
+            pairs_pools[pair_hash] = addresses.get('route_0', []) + addresses.get('route_1', [])
+        if transactions := load_transactions(arb_pair_dir):
+            ledger.append_transactions(pair_hash, transactions)
+    ledger.register_pairs(pairs_pools)
+    ledger.close()
+    print(f'{strategy_dir}: migrated {len(pairs_pools)} pairs')
+
+
+for strategy_dir in STRATEGY_FILES_DIR.iterdir():
+    if not strategy_dir.is_dir() or not (strategy_dir / 'arb_pairs').exists():
+        continue
+    migrate_strategy(strategy_dir)
@@ -3,10 +3,15 @@ from web3 import Web3
 
 import tools
 
-WEB3 = tools.w3.get_web3()
 
+def __getattr__(name: str):
+    if name == 'WEB3':
+        return tools.w3.get_default_web3()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
 
-def get_receipts(block_number: int, web3: Web3 = WEB3) -> pd.DataFrame:
+
+def get_receipts(block_number: int, web3: Web3 = None) -> pd.DataFrame:
+    web3 = tools.w3.get_default_web3() if web3 is None else web3
     data = [
         web3.eth.getTransactionReceipt(tx)
         for tx in web3.eth.get_block(block_number).transactions
@@ -14,7 +19,8 @@ def get_receipts(block_number: int, web3: Web3 = WEB3) -> pd.DataFrame:
     return pd.DataFrame(data)
 
 
-def get_transactions(block_number: int, web3: Web3 = WEB3) -> pd.DataFrame:
+def get_transactions(block_number: int, web3: Web3 = None) -> pd.DataFrame:
+    web3 = tools.w3.get_default_web3() if web3 is None else web3
     df_receipts = get_receipts(block_number, web3)
     df_transactions = pd.DataFrame([
         web3.eth.get_transaction(tx)
@@ -43,7 +49,8 @@ def get_transactions(block_number: int, web3: Web3 = WEB3) -> pd.DataFrame:
     return pd.concat([df_receipts[receipts_columns], df_transactions[transactions_columns]], axis=1)
 
 
-def get_gas_data(block_number: int, web3: Web3 = WEB3) -> pd.DataFrame:
+def get_gas_data(block_number: int, web3: Web3 = None) -> pd.DataFrame:
+    web3 = tools.w3.get_default_web3() if web3 is None else web3
     data = [
         {
             'tx': tx.hex(),
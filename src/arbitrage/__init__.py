@@ -1,12 +1,27 @@
+from .arbitrage_batch import ArbitrageBatch
 from .arbitrage_pair_v1 import ArbitragePairV1
-from .encode_data import decompose_amount, decompose_amount_v2, encode_data32, encode_data64
+from .cycle_engine import CycleEngine
+from .encode_data import (
+    decompose_amount,
+    decompose_amount_v2,
+    decompose_amount_v2_gas_optimal,
+    encode_data32,
+    encode_data64,
+)
+from .gas_model import GasModel
 from .pair_manager import PairManager
+from .pool_discovery import PoolDiscovery
 
 __all__ = [
+    'ArbitrageBatch',
     'ArbitragePairV1',
+    'CycleEngine',
     'decompose_amount',
     'decompose_amount_v2',
+    'decompose_amount_v2_gas_optimal',
     'encode_data32',
     'encode_data64',
+    'GasModel',
     'PairManager',
+    'PoolDiscovery',
 ]
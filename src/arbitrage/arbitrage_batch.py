@@ -0,0 +1,73 @@
+import logging
+from datetime import datetime
+
+import tools
+
+from .arbitrage_pair_v1 import ArbitragePairV1
+from .encode_data import encode_batch_data_v2
+
+log = logging.getLogger(__name__)
+
+
+class ArbitrageBatch:
+    def __init__(self, arbs: list[ArbitragePairV1]):
+        """Non-overlapping arbitrages executed in a single transaction, sharing its fixed gas costs.
+        Gas price is set from the combined expected profit of all arbitrages"""
+        assert len(arbs) > 1
+        assert all(arb.batchable for arb in arbs)
+        assert len({arb.contract.address for arb in arbs}) == 1
+        self.arbs = arbs
+        self.contract = arbs[0].contract
+
+        self.estimated_gross_result_usd = sum(arb.estimated_gross_result_usd for arb in arbs)
+        self.gas_cost = arbs[0].batch_base_gas_cost + sum(arb._get_batch_gas_cost() for arb in arbs)
+        self.gas_price = 0
+        self.estimated_net_result_usd = 0.0
+        self._set_gas_params()
+
+    def __repr__(self):
+        return (
+            f'{self.__class__.__name__}(n_arbs={len(self.arbs)}, '
+            f'est_result=US${self.estimated_net_result_usd:,.2f})'
+        )
+
+    def _set_gas_params(self):
+        arb = self.arbs[0]
+        baseline_gas_price = arb._get_baseline_gas_price()
+        base_gas_cost_usd = tools.price.get_gas_cost_usd(
+            arb.base_gas_cost, gas_price=baseline_gas_price)
+        gas_profit_usd = sum(
+            arb.gas_share_of_profit * arb.estimated_gross_result_usd
+            for arb in self.arbs
+        )
+        gas_premium = max(gas_profit_usd / base_gas_cost_usd, 1.0)
+
+        max_gas_price = min(arb.max_gas_price for arb in self.arbs)
+        self.gas_price = min(round(baseline_gas_price * gas_premium), max_gas_price)
+        gas_premium = self.gas_price / baseline_gas_price
+        gas_cost_usd = tools.price.get_gas_cost_usd(self.gas_cost, gas_price=baseline_gas_price)
+        self.estimated_net_result_usd = self.estimated_gross_result_usd - gas_cost_usd * gas_premium
+
+    def _get_tx_arguments(self) -> dict:
+        max_gas_multiplier = max(arb.max_gas_multiplier for arb in self.arbs)
+        return {
+            'func': self.arbs[0]._get_batch_contract_function(),
+            'data': encode_batch_data_v2([arb._get_batch_data() for arb in self.arbs]),
+            'max_gas_': int(self.gas_cost * max_gas_multiplier),
+            'gas_price_': self.gas_price,
+        }
+
+    def execute(self):
+        account, nonce = tools.transaction.WALLET_POOL.acquire()
+        tx_hash = tools.transaction.sign_and_send_contract_tx(
+            **self._get_tx_arguments(),
+            account_=account,
+            nonce_=nonce,
+        )
+        timestamp_sent = datetime.now().timestamp()
+        for i, arb in enumerate(self.arbs):
+            arb.set_batch_execution(tx_hash, account, nonce, timestamp_sent, len(self.arbs), i)
+        log.info(f'Sent batch transaction with hash {tx_hash}')
+        for arb in self.arbs:
+            log.info(f'Trades: {arb.dex_0}:{arb.trade_0}; {arb.dex_1}:{arb.trade_1}')
+        log.info(f'{self}: {self.gas_cost=}, {self.gas_price=}')
@@ -2,19 +2,23 @@ import json
 import logging
 from datetime import datetime
 from enum import Enum
-from typing import Callable
+from functools import lru_cache
+from typing import Callable, Optional
 
-from web3 import Web3
+from web3 import Account, Web3
 from web3.contract import Contract, ContractFunction
 from web3.exceptions import TransactionNotFound
 
 import configs
 import tools
-from core import LiquidityPool, Route, RoutePairs, Token, TokenAmount, TradePairs, TradePools
+from core import (LiquidityPair, LiquidityPool, Route, RoutePairs, Token, TokenAmount, TradePairs,
+                  TradePools)
 from dex import DexProtocol
+from dex.uniswap_v2.entities import UniV2Pair
 from exceptions import InsufficientLiquidity, NotProfitable, OptimizationError
 
 from .encode_data import decompose_amount
+from .gas_model import GasModel, GasModelKey
 
 log = logging.getLogger(__name__)
 
@@ -23,6 +27,7 @@ DEFAULT_MIN_CONFIRMATIONS = 2
 DEFAULT_MAX_TRANSACTION_CHECKS = 20
 MAX_GAS_PRICE = 21428571428571  # Equal to 3 BNB/ETH tx cost at 140_000 gas
 BASE_GAS_COST = 140_000
+BATCH_BASE_GAS_COST = 50_000  # Fixed cost of a batched transaction, shared by its arbitrages
 
 # Default optimization parameters
 INITIAL_VALUE = 1.0  # Initial value in USD to estimate best trade
@@ -30,18 +35,52 @@ INCREMENT = 0.001  # Increment to estimate derivatives in optimization
 TOLERANCE_USD = 0.01  # Tolerance to stop optimization
 MAX_ITERATIONS = 100
 USE_FALLBACK = True
+WARM_START = True  # Start optimization from optimum of previous estimate
+WARM_START_INCREMENT = 1e-6  # Increment relative to initial guess when warm starting
+WARM_START_TOLERANCE = 1e-5  # Tolerance relative to initial guess when warm starting
+ANALYTIC_DERIVATIVES = True  # Use pools' derivatives instead of finite differences if available
+CLOSED_FORM = True  # Use closed form / bounded optimizer if all pools are (weighted) pairs
 
 # Gas parameters
 DEFAULT_GAS_SHARE_OF_PROFIT = 0.26
+MAX_COMPETITOR_GAS_SHARE_OF_PROFIT = 0.5  # Max share of profit spent on gas to outbid competitors
+OUTBID_GAS_PRICE_INCREMENT = 1  # In wei, enough to be ordered before competitor transactions
 MAX_GAS_MULTIPLIER = 3.5
 MIN_ARBITRAGE_LOGS = 4  # At least one CHI transfer and three ERC20 transfers
+# Event emitted by batch contract functions for each arbitrage of the batch
+BATCH_ITEM_RESULT_TOPIC = Web3.keccak(text='BatchItemResult(uint256,bool,uint256)').hex()
+
+# Local EVM state other than pools' reserves (e.g.: CHI) is captured again after this many blocks
+LOCAL_EVM_MAX_FIXTURE_AGE = 20
 
 PREFERED_TOKENS_FILE = 'addresses/preferred_tokens.json'
 TOKEN_MULTIPLIER_WEIGHT = 0.01
-TOKEN_MULTIPLIERS = {
-    Token(configs.CHAIN_ID, **data['token']): 1 + data['weight'] * TOKEN_MULTIPLIER_WEIGHT
-    for data in json.load(open(PREFERED_TOKENS_FILE))[str(configs.CHAIN_ID)]
-}
+
+
+@lru_cache(maxsize=None)
+def _get_token_multipliers() -> dict[Token, float]:
+    return {
+        Token(configs.CHAIN_ID, **data['token']): 1 + data['weight'] * TOKEN_MULTIPLIER_WEIGHT
+        for data in json.load(open(PREFERED_TOKENS_FILE))[str(configs.CHAIN_ID)]
+    }
+
+
+def get_batch_item_results(receipt, contract_address: str) -> dict[int, tuple[bool, int]]:
+    """Map index of each arbitrage of a batch transaction to (executed, gas used before
+    refunds), from the contract's BatchItemResult events"""
+    results = {}
+    for log_ in receipt.logs:
+        topics = log_['topics']
+        if (
+            not topics
+            or log_['address'].lower() != contract_address.lower()
+            or (topics[0] if isinstance(topics[0], str) else topics[0].hex()).lower()
+            != BATCH_ITEM_RESULT_TOPIC
+        ):
+            continue
+        index, executed, gas_used = tools.rpc.decode_words(log_['data'], 3)
+        results[index] = (bool(executed), gas_used)
+    return results
 
 
 class HighGasPriceStrategy(Enum):
@@ -78,6 +117,13 @@ class ArbitragePairV1:
         decomposer_function: Callable = decompose_amount,
         optimization_params: dict = None,
         w_swap_available: bool = False,
+        price_table: tools.price.UsdPriceTable = None,
+        gas_oracle: tools.gas.GasOracle = None,
+        gas_model: GasModel = None,
+        max_competitor_gas_share_of_profit: float = MAX_COMPETITOR_GAS_SHARE_OF_PROFIT,
+        use_local_evm: bool = configs.USE_LOCAL_EVM,
+        batch_available: bool = False,
+        batch_base_gas_cost: int = BATCH_BASE_GAS_COST,
     ):
         """"The V1 pair has two fixed routes:
             - route_0 has a single generic liquidity pool
@@ -102,6 +148,17 @@ class ArbitragePairV1:
         self.max_gas_multiplier = max_gas_multiplier
         self.high_gas_price_strategy = high_gas_price_strategy
         self.decomposer_function = decomposer_function
+        self.price_table = price_table
+        self.gas_oracle = gas_oracle
+        self.gas_model = gas_model
+        self.max_competitor_gas_share_of_profit = max_competitor_gas_share_of_profit
+        self.use_local_evm = use_local_evm
+        self.local_evm: tools.evm.LocalEVM = None
+        self._local_evm_block: int = None
+        self._local_evm_fn_name: str = None
+        self._contract_wrapped_currency_balance: TokenAmount = None
+        self.batch_available = batch_available
+        self.batch_base_gas_cost = batch_base_gas_cost
 
         optimization_params = optimization_params or {}
         self.opt_initial_value = optimization_params.get('initial_value', INITIAL_VALUE)
@@ -109,6 +166,24 @@ class ArbitragePairV1:
         self.opt_tol = optimization_params.get('tolerance', TOLERANCE_USD)
         self.opt_max_iter = optimization_params.get('max_iter', MAX_ITERATIONS)
         self.opt_use_fallback = optimization_params.get('use_fallback', USE_FALLBACK)
+        self.opt_warm_start = optimization_params.get('warm_start', WARM_START)
+        self.opt_warm_start_dx = \
+            optimization_params.get('warm_start_increment', WARM_START_INCREMENT)
+        self.opt_warm_start_tol = \
+            optimization_params.get('warm_start_tolerance', WARM_START_TOLERANCE)
+        self.opt_analytic_derivatives = (
+            optimization_params.get('analytic_derivatives', ANALYTIC_DERIVATIVES)
+            and route_0.has_derivatives
+            and route_1.has_derivatives
+        )
+        self.opt_closed_form = (
+            optimization_params.get('closed_form', CLOSED_FORM)
+            and isinstance(route_0.pools[0], LiquidityPair)
+            and (len(route_1.pools) == 1 or self.opt_analytic_derivatives)
+        )
+        self._warm_start_amount_last: int = None  # Kept between resets
+        self.opt_n_evaluations = 0  # Evaluations of estimate_result on last estimate
+        self.opt_warm_started = False
 
         self.wrapped_currency = tools.price.get_wrapped_currency_token()
         self.wrapped_currency.contract = web3.eth.contract(
@@ -121,7 +196,7 @@ class ArbitragePairV1:
             and self.dex_0 != self.dex_1
             )
 
-        self.result_multiplier: float = TOKEN_MULTIPLIERS.get(self.token_first, 1.0)
+        self.result_multiplier: float = _get_token_multipliers().get(self.token_first, 1.0)
         self.flag_disabled = False
         self.reference_price_pools = [
             pool
@@ -136,6 +211,7 @@ class ArbitragePairV1:
         self.amount_last = TokenAmount(token_last)
         self._amount_last_exp: int = None
         self._amount_last_mant: int = None
+        self.calldata_gas_saved = 0
         self.estimated_result = TokenAmount(token_first)
         self.trade_0: TradePools = None
         self.trade_1: TradePairs = None
@@ -150,6 +226,10 @@ class ArbitragePairV1:
         # Arbitrage params set during / after execution
         self.flag_execute = False
         self._is_running = False
+        self.account: Account = None
+        self.nonce: int = None
+        self.batch_size: int = None
+        self.batch_index: int = None
         self.timestamp_sent: float = 0.0
         self.block_executed: int = None
         self.tx_hash = ''
@@ -172,12 +252,67 @@ class ArbitragePairV1:
     def _get_contract_function(self) -> ContractFunction:
         raise NotImplementedError
 
+    def _get_chi_flag(self, gas_price: int = None) -> Optional[int]:
+        """chiFlag sent to contract at `gas_price` (by default, bid gas price, or baseline gas
+        price if not set yet), or None if contract function does not take it"""
+        if not tools.transaction._has_chi_flag(self._get_contract_function()):
+            return None
+        if gas_price is None:
+            gas_price = self.gas_price or self._get_baseline_gas_price()
+        return tools.transaction.get_chi_flag(gas_price)
+
+    def get_gas_model_key(self, tx: dict = None, gas_price: int = None) -> GasModelKey:
+        """Key of arbitrage on gas model, for transaction stats `tx` (as in `get_tx_stats()`)
+        or, by default, for current contract, function and chiFlag at `gas_price`"""
+        if tx is None:
+            contract_address = self.contract.address
+            fn_name = self._get_contract_function().fn_name
+            chi_flag = self._get_chi_flag(gas_price)
+        else:
+            contract_address, fn_name, chi_flag = tx['to'], tx['fn_name'], tx.get('chi_flag')
+        return GasModelKey(
+            contract_address,
+            fn_name,
+            len(self.route_1.pools),
+            type(self.dex_0).__name__,
+            type(self.dex_1).__name__,
+            chi_flag,
+        )
+
+    def _get_estimated_gas_cost(self, gas_price: int = None) -> int:
+        """Gas cost learned by gas model from previous receipts at `gas_price`, if available,
+        else strategy's fixed estimate"""
+        if self.gas_model is None:
+            return self._get_gas_cost()
+        key = self.get_gas_model_key(gas_price=gas_price)
+        if (gas_cost := self.gas_model.get_gas_cost(key)) is not None:
+            return gas_cost
+        return self._get_gas_cost()
+
+    def _get_max_gas(self) -> int:
+        if (
+            self.gas_model is not None
+            and (gas_limit := self.gas_model.get_gas_limit(self.get_gas_model_key())) is not None
+        ):
+            return gas_limit
+        return int(self.gas_cost * self.max_gas_multiplier)
+
     def _get_function_arguments(self) -> dict:
         raise NotImplementedError
 
     def _get_contract_test_function(self):
         return self._get_contract_function()
 
+    def _get_batch_contract_function(self) -> ContractFunction:
+        raise NotImplementedError
+
+    def _get_batch_data(self) -> tuple[bytes, bytes]:
+        raise NotImplementedError
+
+    def _get_batch_gas_cost(self) -> int:
+        """Gas cost of arbitrage when executed in a batch, excluding `batch_base_gas_cost`"""
+        raise NotImplementedError
+
     @property
     def pools(self) -> list[LiquidityPool]:
         return self.route_0.pools + self.route_1.pools
@@ -190,14 +325,64 @@ class ArbitragePairV1:
     def adjusted_profit(self) -> float:
         return self.estimated_net_result_usd * self.result_multiplier
 
+    @property
+    def batchable(self) -> bool:
+        return (
+            self.batch_available
+            and self.flag_set
+            and self.execute_w_swap
+            and self.estimated_gross_result_usd > 0
+        )
+
+    def _get_price_usd(self, token: Token) -> float:
+        if self.price_table is not None:
+            return self.price_table.get_price_usd(token)
+        return tools.price.get_price_usd(token, self.reference_price_pools, self.web3)
+
+    def _get_baseline_gas_price(self) -> int:
+        if self.gas_oracle is not None and self.gas_oracle.is_ready:
+            return self.gas_oracle.get_gas_price()
+        return tools.price.get_gas_price()
+
+    def _outbid_competitors(
+        self,
+        gas_price: int,
+        baseline_gas_price: int,
+        baseline_gas_cost_usd: float,
+    ) -> int:
+        """Raise gas price above recent competing transactions on the same pools, as long as
+        total gas cost stays within `max_competitor_gas_share_of_profit` of the gross result"""
+        if self.gas_oracle is None:
+            return gas_price
+        competitor_gas_price = self.gas_oracle.get_competitor_gas_price(
+            pool.address for pool in self.pools)
+        if competitor_gas_price < gas_price:
+            return gas_price
+        outbid_gas_price = competitor_gas_price + OUTBID_GAS_PRICE_INCREMENT
+        max_gas_cost_usd = self.max_competitor_gas_share_of_profit * self.estimated_gross_result_usd
+        if baseline_gas_cost_usd * outbid_gas_price / baseline_gas_price > max_gas_cost_usd:
+            log.debug(f'{self}: Not outbidding {competitor_gas_price=}, max gas cost exceeded')
+            return gas_price
+        log.debug(f'{self}: Outbidding {competitor_gas_price=}')
+        return outbid_gas_price
+
     def _get_contract_wrapped_currency_balance(self) -> TokenAmount:
         balance = self.wrapped_currency.contract.functions.balanceOf(self.contract.address).call()
         return TokenAmount(self.wrapped_currency, balance)
 
     def _estimate_result_int(self, amount_last_int: int) -> int:
+        self.opt_n_evaluations += 1
         amount_last = TokenAmount(self.token_last, amount_last_int)
         return self.estimate_result(amount_last).amount
 
+    def _estimate_result_derivatives(self, amount_last_int: int) -> tuple[int, float, float]:
+        """Result of arbitrage (without w_swap) and its derivatives with respect to amount_last"""
+        self.opt_n_evaluations += 1
+        amount_last = TokenAmount(self.token_last, amount_last_int)
+        amount_out_0, first_0, second_0 = self.route_0.get_amount_out_derivatives(amount_last)
+        amount_in_1, first_1, second_1 = self.route_1.get_amount_in_derivatives(amount_last)
+        return (amount_out_0 - amount_in_1).amount, first_0 - first_1, second_0 - second_1
+
     def estimate_result(self, amount_last: TokenAmount, w_swap: bool = False) -> TokenAmount:
         trade_0, trade_1 = self.get_arbitrage_trades(amount_last, w_swap)
         if w_swap:
@@ -225,46 +410,104 @@ class ArbitragePairV1:
         try:
             amount_last, estimated_result = self.get_updated_results()
         except NotProfitable:
+            self._warm_start_amount_last = None
             return
         except InsufficientLiquidity:
+            self._warm_start_amount_last = None
             log.info(f'Insufficient liquidity for {self}, removing it from next iterations')
             reserves = {pool: pool.reserves for pool in self.pools}
             log.debug(f'Reserves: {reserves}')
             self.reset()
             self.flag_disabled = True
         except OptimizationError as e:
+            self._warm_start_amount_last = None
             log.debug(f'{self}: Error during optimization: {e!r}')
         else:
             self._set_arbitrage_params(amount_last, estimated_result, block_number)
 
     def get_updated_results(self) -> tuple[TokenAmount, TokenAmount]:
-        usd_price_token_last = tools.price.get_price_usd(
-            self.token_last, self.reference_price_pools, self.web3)
+        self.opt_n_evaluations = 0
+        self.opt_warm_started = False
+        usd_price_token_last = self._get_price_usd(self.token_last)
         amount_last_initial = TokenAmount(
             self.token_last,
             round(self.opt_initial_value / usd_price_token_last * 10 ** self.token_last.decimals)
         )
-        result_initial = self.estimate_result(amount_last_initial)
-        if result_initial < 0:
+        if self._estimate_result_int(amount_last_initial.amount) < 0:
             # If gross result is negative even with small amount, skip optimization
             raise NotProfitable
-        try:
-            int_amount_last, int_result = tools.optimization.optimizer_second_order(
-                func=self._estimate_result_int,
-                x0=amount_last_initial.amount,
-                dx=round(self.opt_dx * 10 ** self.token_last.decimals / usd_price_token_last),
-                tol=round(self.opt_tol * 10 ** self.token_last.decimals / usd_price_token_last),
-                max_iter=self.opt_max_iter,
-                use_fallback=self.opt_use_fallback,
-            )
-        except Exception as e:
-            raise OptimizationError(e.args)
+        dx = round(self.opt_dx * 10 ** self.token_last.decimals / usd_price_token_last)
+        tol = round(self.opt_tol * 10 ** self.token_last.decimals / usd_price_token_last)
+
+        func_derivatives = \
+            self._estimate_result_derivatives if self.opt_analytic_derivatives else None
+        int_amount_last = None
+        if self.opt_closed_form:
+            x0 = self._warm_start_amount_last or amount_last_initial.amount
+            try:
+                int_amount_last, int_result = self._optimize_weighted_pairs(x0, tol)
+                self.opt_warm_started = self._warm_start_amount_last is not None
+            except NotProfitable:
+                raise
+            except Exception as e:
+                log.debug(f'{self}: Closed form optimization failed ({e!r})')
+                int_amount_last = None
+        if (
+            int_amount_last is None
+            and self.opt_warm_start
+            and (x0 := self._warm_start_amount_last) is not None
+        ):
+            # Reserves change little between blocks, so previous optimum is a close guess
+            try:
+                int_amount_last, int_result = tools.optimization.optimizer_second_order(
+                    func=self._estimate_result_int,
+                    x0=x0,
+                    dx=max(round(x0 * self.opt_warm_start_dx), dx),
+                    tol=max(round(x0 * self.opt_warm_start_tol), tol),
+                    max_iter=self.opt_max_iter,
+                    use_fallback=False,
+                    func_derivatives=func_derivatives,
+                )
+                self.opt_warm_started = int_amount_last >= 0
+            except Exception as e:
+                log.debug(f'{self}: Warm start failed ({e!r}), optimizing from initial value')
+        if int_amount_last is None or int_amount_last < 0:
+            try:
+                int_amount_last, int_result = tools.optimization.optimizer_second_order(
+                    func=self._estimate_result_int,
+                    x0=amount_last_initial.amount,
+                    dx=dx,
+                    tol=tol,
+                    max_iter=self.opt_max_iter,
+                    use_fallback=self.opt_use_fallback,
+                    func_derivatives=func_derivatives,
+                )
+            except Exception as e:
+                raise OptimizationError(e.args)
         if int_amount_last < 0:  # Fail-safe in case optimizer returns negative inputs
             raise OptimizationError('Negative int_amount_last')
+        self._warm_start_amount_last = int_amount_last
         amount_last = TokenAmount(self.token_last, int_amount_last)
         estimated_result = TokenAmount(self.token_first, int_result)
         return amount_last, estimated_result
 
+    def _optimize_weighted_pairs(self, x0: int, tol: int) -> tuple[int, int]:
+        """Optimize amount_last in closed form when both routes have a single weighted pair, or
+        with a bounded Newton search for multi-hop routes"""
+        if len(self.route_1.pools) == 1:
+            pair_0 = self.route_0.pools[0].get_weighted_params(self.token_last)
+            reserve_in, reserve_out, power, gamma = \
+                self.route_1.pools[0].get_weighted_params(self.token_first)
+            int_amount_last = tools.optimization.weighted_pairs_optimizer(
+                pair_0, (reserve_in, reserve_out, 1 / power, gamma))
+            if int_amount_last == 0:
+                raise NotProfitable
+            return int_amount_last, self._estimate_result_int(int_amount_last)
+        # Amount last must be lower than reserve of token_last in last pool of route_1
+        _, x_max, _, _ = self.route_1.pools[-1].get_weighted_params(self.route_1.tokens[-2])
+        return tools.optimization.bounded_newton_optimizer(
+            self._estimate_result_derivatives, x0, x_max, tol, self.opt_max_iter)
+
     def _set_arbitrage_params(
         self,
         amount_last: TokenAmount,
@@ -274,11 +517,14 @@ class ArbitragePairV1:
         self.flag_set = True
         self.timestamp_found = datetime.now().timestamp()
         self.block_found = block_number
-        if self._w_swap and amount_last < self._get_contract_wrapped_currency_balance():
+        if self._w_swap:
+            self._contract_wrapped_currency_balance = self._get_contract_wrapped_currency_balance()
+        if self._w_swap and amount_last < self._contract_wrapped_currency_balance:
             self.execute_w_swap = True
             amount, exp, mant = self.decomposer_function(amount_last)
             self._amount_last_exp = exp
             self._amount_last_mant = mant
+            self.calldata_gas_saved = self._get_calldata_gas_saved(amount_last.amount)
             amount_last.amount = amount
             estimated_result = self.estimate_result(amount_last, w_swap=True)
         self.amount_last = amount_last
@@ -286,26 +532,39 @@ class ArbitragePairV1:
         self.trade_0, self.trade_1 = self.get_arbitrage_trades(
             amount_last, w_swap=self.execute_w_swap)
 
-        self.result_token_usd_price = tools.price.get_price_usd(
-            estimated_result.token, self.reference_price_pools, self.web3)
+        self.result_token_usd_price = self._get_price_usd(estimated_result.token)
         self.estimated_gross_result_usd = \
             estimated_result.amount_in_units * self.result_token_usd_price
-        self.gas_cost = self._get_gas_cost()
-
-        base_gas_cost_usd = tools.price.get_gas_cost_usd(self.base_gas_cost)
+        baseline_gas_price = self._get_baseline_gas_price()
+        self.gas_cost = self._get_estimated_gas_cost(baseline_gas_price)
+        base_gas_cost_usd = tools.price.get_gas_cost_usd(
+            self.base_gas_cost, gas_price=baseline_gas_price)
         gas_premium = self.gas_share_of_profit * self.estimated_gross_result_usd / base_gas_cost_usd
         gas_premium = max(gas_premium, 1.0)
 
-        baseline_gas_price = tools.price.get_gas_price()
+        gas_cost_usd = tools.price.get_gas_cost_usd(self.gas_cost, gas_price=baseline_gas_price)
         gas_price = round(baseline_gas_price * gas_premium)
+        gas_price = self._outbid_competitors(gas_price, baseline_gas_price, gas_cost_usd)
+        gas_premium = gas_price / baseline_gas_price
         if gas_price > self.max_gas_price:
             gas_price, gas_premium = self._process_high_gas_price(baseline_gas_price, gas_price)
         self.gas_price = gas_price
+        # chiFlag, and with it the gas model key, depends on the final gas price
+        if (
+            self.gas_model is not None
+            and (gas_cost := self._get_estimated_gas_cost(gas_price)) != self.gas_cost
+        ):
+            self.gas_cost = gas_cost
+            gas_cost_usd = tools.price.get_gas_cost_usd(gas_cost, gas_price=baseline_gas_price)
         self.estimated_tx_cost = \
             self.gas_price * self.gas_cost / 10 ** tools.price.get_native_token_decimals()
-        gas_cost_usd = tools.price.get_gas_cost_usd(self.gas_cost)
         self.estimated_net_result_usd = self.estimated_gross_result_usd - gas_cost_usd * gas_premium
 
+    def _get_calldata_gas_saved(self, amount_last: int) -> int:
+        """Calldata gas saved by the current amount decomposition, compared to a plain rounding
+        of `amount_last`. Overridden by strategies using gas-optimal decomposers"""
+        return 0
+
     def _process_high_gas_price(self, baseline_gas_price: int, gas_price: int) -> tuple[int, float]:
         if self.high_gas_price_strategy == HighGasPriceStrategy.baseline_3x:
             log.info('High gas price detected, using fallback strategy baseline_3x')
@@ -322,12 +581,68 @@ class ArbitragePairV1:
         return {
             'func': self._get_contract_test_function() if test else self._get_contract_function(),
             **self._get_function_arguments(),
-            'max_gas_': int(self.gas_cost * self.max_gas_multiplier),
+            'max_gas_': self._get_max_gas(),
             'gas_price_': self.gas_price,
         }
 
     def dry_run(self):
-        tools.transaction.dry_run_contract_tx(**self._get_tx_arguments(test=True))
+        if self._can_use_local_evm():
+            self._dry_run_local_evm()
+        else:
+            tools.transaction.dry_run_contract_tx(**self._get_tx_arguments(test=True))
+
+    def _can_use_local_evm(self) -> bool:
+        """Local EVM is only kept in sync with the node for routes of uniswap_v2 pairs"""
+        return (
+            self.use_local_evm
+            and all(isinstance(pool, UniV2Pair) for pool in self.pools)
+            and tools.evm.is_available()
+        )
+
+    def _dry_run_local_evm(self):
+        """Dry run in local EVM, with state captured from node on first run. On following runs
+        only pairs' reserves and balances and the contract's wrapped currency balance are
+        updated; state is captured again when contract function changes or after
+        LOCAL_EVM_MAX_FIXTURE_AGE blocks"""
+        tx_arguments = self._get_tx_arguments(test=True)
+        fn_name = tx_arguments['func'].fn_name
+        if (
+            self.local_evm is None
+            or fn_name != self._local_evm_fn_name
+            or self.block_found - self._local_evm_block > LOCAL_EVM_MAX_FIXTURE_AGE
+            or not self._sync_local_evm()
+        ):
+            fixture = tools.evm.capture_contract_tx_prestate(**tx_arguments)
+            self.local_evm = tools.evm.LocalEVM(fixture)
+            self._local_evm_block = self.block_found
+            self._local_evm_fn_name = fn_name
+        tools.evm.dry_run_contract_tx(**tx_arguments, evm_=self.local_evm)
+
+    def _sync_local_evm(self) -> bool:
+        """Update local EVM state, return False if it lacks storage slots to be updated"""
+        try:
+            if self.execute_w_swap and self._contract_wrapped_currency_balance is not None:
+                self.local_evm.set_erc20_balance(
+                    self.wrapped_currency.address,
+                    self.contract.address,
+                    self._contract_wrapped_currency_balance.amount,
+                )
+            self._sync_local_evm_reserves()
+        except ValueError as e:
+            log.debug(f'{self}: Capturing local EVM state again ({e})')
+            return False
+        return True
+
+    def _sync_local_evm_reserves(self):
+        for pool in self.pools:
+            reserve_0, reserve_1 = pool.reserves
+            self.local_evm.set_uniswap_v2_reserves(
+                pool.address,
+                reserve_0.amount,
+                reserve_1.amount,
+                reserve_0.token.address,
+                reserve_1.token.address,
+            )
 
     def get_params(self) -> dict:
         return {
@@ -344,12 +659,20 @@ class ArbitragePairV1:
             'gas_share_of_profit': self.gas_share_of_profit,
             'base_gas_cost': self.base_gas_cost,
             'fn_name': self._get_contract_function().fn_name,
+            'chi_flag': self._get_chi_flag(),
             'execute_w_swap': self.execute_w_swap,
+            'calldata_gas_saved': self.calldata_gas_saved,
+            'opt_n_evaluations': self.opt_n_evaluations,
+            'opt_warm_started': self.opt_warm_started,
         }
 
     def get_execution_stats(self) -> dict:
         return {
             'tx_hash': self.tx_hash,
+            'from': self.account.address if self.account is not None else None,
+            'nonce': self.nonce,
+            'batch_size': self.batch_size,
+            'batch_index': self.batch_index,
             'timestamp_sent': self.timestamp_sent,
             'block_executed': self.block_executed,
             'tx_status': self.tx_status,
@@ -363,14 +686,40 @@ class ArbitragePairV1:
     def execute(self):
         self.flag_execute = True
         self._is_running = True
-        self.tx_hash = tools.transaction.sign_and_send_contract_tx(**self._get_tx_arguments())
+        self.account, self.nonce = tools.transaction.WALLET_POOL.acquire()
+        self.tx_hash = tools.transaction.sign_and_send_contract_tx(
+            **self._get_tx_arguments(),
+            account_=self.account,
+            nonce_=self.nonce,
+        )
         self.timestamp_sent = datetime.now().timestamp()
+        self.batch_size = 1
         log.info(f'Sent transaction with hash {self.tx_hash}')
         log.info(f'Trades: {self.dex_0}:{self.trade_0}; {self.dex_1}:{self.trade_1}')
         log.info(self.get_params())
         reserves = {pool: pool.reserves for pool in self.pools}
         log.debug(f'Reserves: {reserves}')
 
+    def set_batch_execution(
+        self,
+        tx_hash: str,
+        account: Account,
+        nonce: int,
+        timestamp_sent: float,
+        batch_size: int,
+        batch_index: int,
+    ):
+        """Set execution params when sent as part of an `ArbitrageBatch`, at position
+        `batch_index` of the batch"""
+        self.flag_execute = True
+        self._is_running = True
+        self.account = account
+        self.nonce = nonce
+        self.tx_hash = tx_hash
+        self.timestamp_sent = timestamp_sent
+        self.batch_size = batch_size
+        self.batch_index = batch_index
+
     def reset(self):
         self.flag_set = False
         self.timestamp_found = 0.0
@@ -378,6 +727,7 @@ class ArbitragePairV1:
         self.amount_last = TokenAmount(self.token_last)
         self._amount_last_exp = None
         self._amount_last_mant = None
+        self.calldata_gas_saved = 0
         self.estimated_result = TokenAmount(self.token_first)
         self.trade_0 = None
         self.trade_1 = None
@@ -391,6 +741,10 @@ class ArbitragePairV1:
 
         self.flag_execute = False
         self._is_running = False
+        self.account = None
+        self.nonce = None
+        self.batch_size = None
+        self.batch_index = None
         self.timestamp_sent = 0.0
         self.block_executed = None
         self.tx_hash = ''
@@ -399,11 +753,29 @@ class ArbitragePairV1:
         self.gas_used = None
         self.block_send_delay = None
 
+    def _check_execution(self, receipt) -> bool:
+        """Whether arbitrage was executed by successful transaction. In batches, arbitrages
+        no longer profitable are skipped by contract, and each arbitrage is assigned its share
+        of the transaction's gas used"""
+        if self.batch_index is None:
+            return len(receipt.logs) >= MIN_ARBITRAGE_LOGS
+        results = get_batch_item_results(receipt, self.contract.address)
+        if self.batch_index not in results:
+            log.warning(f'Result of arbitrage not found in batch transaction {self.tx_hash}')
+            return False
+        executed, gas_used = results[self.batch_index]
+        total_gas_used = sum(gas_used for _, gas_used in results.values())
+        if total_gas_used > 0:
+            self.gas_used = round(receipt.gasUsed * gas_used / total_gas_used)
+        if not executed:
+            log.info(f'Arbitrage skipped in batch transaction {self.tx_hash}')
+        return executed
+
     def is_running(self, current_block: int = None) -> bool:
         if not self._is_running:
             return False
         try:
-            receipt = self.web3.eth.getTransactionReceipt(self.tx_hash)
+            receipt = tools.transaction.get_transaction_receipt(self.tx_hash, self.web3)
         except TransactionNotFound:
             log.info(f'Transaction {self.tx_hash} not found in node')
             self.n_tx_checks += 1
@@ -413,12 +785,14 @@ class ArbitragePairV1:
                     f'{self.max_transaction_checks} checks.'
                 )
                 self.tx_status = TxStatus.not_found
+                tools.transaction.WALLET_POOL.drop(self.account.address, self.nonce)
                 return False
             return True
+        tools.transaction.WALLET_POOL.confirm(self.account.address, self.nonce)
         self.gas_used = receipt.gasUsed
         self.block_executed = receipt.blockNumber
         self.block_send_delay = self.block_executed - self.block_found - 1
-        if receipt.status == 0 or len(receipt.logs) < MIN_ARBITRAGE_LOGS:
+        if receipt.status == 0 or not self._check_execution(receipt):
             log.info(f'Transaction {self.tx_hash} failed (gas_used={self.gas_used})')
             self.tx_status = TxStatus.failed
             log.info(self.get_execution_stats())
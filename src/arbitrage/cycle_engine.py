@@ -0,0 +1,279 @@
+import logging
+import math
+from collections import defaultdict
+from typing import Callable, Iterable, NamedTuple
+
+from web3 import Web3
+
+import tools
+from core import LiquidityPair, LiquidityPool, RoutePairs, Token, TokenAmount
+from dex import DexProtocol
+from dex.uniswap_v2.entities import UniV2Pair
+from exceptions import InsufficientLiquidity
+
+from .arbitrage_pair_v1 import ArbitragePairV1
+from .pair_manager import (PairManager, _get_dex_pairs, _get_pair_universe_arguments,
+                           _get_pair_universe_entry)
+
+log = logging.getLogger(__name__)
+
+DEFAULT_MAX_CYCLE_LENGTH = 4
+MIN_CYCLE_LOG_PROFIT = 1e-4  # Minimum marginal profit of cycle (in log) to be a candidate
+MAX_BLOCKS_SYNC_LOGS = 100  # Read reserves of all pools if more blocks passed since last update
+SYNC_TOPIC = Web3.keccak(text='Sync(uint112,uint112)').hex()  # UniswapV2 pairs' reserves changes
+
+
+class Edge(NamedTuple):
+    token_in: Token
+    token_out: Token
+    pool: LiquidityPool
+
+
+class Cycle(NamedTuple):
+    edges: list[Edge]
+    log_profit: float  # Minus the sum of edges' weights, positive for profitable cycles
+
+
+class CycleEngine:
+    def __init__(
+        self,
+        pair_manager: PairManager,
+        dexes: Iterable[DexProtocol],
+        get_arbitrage_pair: Callable[[dict], ArbitragePairV1],
+        web3: Web3,
+        self_trade: bool = False,
+        max_cycle_length: int = DEFAULT_MAX_CYCLE_LENGTH,
+        min_log_profit: float = MIN_CYCLE_LOG_PROFIT,
+    ):
+        """Detect profitable cycles on the graph of all pools of a set of dexes.
+
+        Tokens are nodes, and each pool has a directed edge per pair of its tokens, with weight
+        equal to minus the log of its marginal price (including fees), so that profitable cycles
+        are negative cycles. On each block, only edges of pools whose reserves changed are
+        updated, and searched for negative cycles passing through them with a hop-bounded
+        Bellman-Ford from the edges' heads. Changed UniswapV2 pairs are found from the `Sync`
+        events of the blocks since last update, reserves of other pools are read every block.
+
+        The search keeps a single shortest path per token and number of hops, so a profitable
+        cycle is missed when the shortest path to its closing edge repeats a pool or token
+        (it is then discarded) and a longer simple path was not kept.
+
+        Cycles that can be executed by the strategy's contract (one pool of dex_0 followed by
+        a route of pairs of dex_1) and are not already managed are converted into arbitrage
+        pairs and hot inserted into the pair manager, which sizes and executes them.
+
+        Args:
+            pair_manager (PairManager): Running pair manager
+            dexes (Iterable[DexProtocol]): Dexes of strategy
+            get_arbitrage_pair (Callable[[dict], ArbitragePairV1]): Creates arbitrage pair from
+                the arguments yielded by `PairManager.get_v1_pool_arguments`
+            web3 (Web3): Web3 provider
+            self_trade (bool): Allow dex_0 == dex_1
+            max_cycle_length (int): Maximum number of pools in cycle
+            min_log_profit (float): Minimum marginal profit (log) of candidate cycles
+        """
+        self.pair_manager = pair_manager
+        self.dexes = list(dexes)
+        self.get_arbitrage_pair = get_arbitrage_pair
+        self.web3 = web3
+        self.self_trade = self_trade
+        self.max_cycle_length = max_cycle_length
+        self.min_log_profit = min_log_profit
+
+        self.price_table = tools.price.UsdPriceTable(self.pools, web3)
+        self.weights: dict[Edge, float] = {}
+        self.adjacency: dict[Token, set[Edge]] = defaultdict(set)
+        self._reserves: dict[LiquidityPool, tuple[int, ...]] = {}
+        self._known_hashes: set[str] = set()
+        self.last_block: int = None
+        self.n_cycles_found = 0
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(n_edges={len(self.weights)})'
+
+    @property
+    def pools(self) -> list[LiquidityPool]:
+        return [pool for dex in self.dexes for pool in dex.pools if pool.has_derivatives]
+
+    def update(self, block_number: int = None) -> list[Cycle]:
+        """Update edges of changed pools, find cycles through them and send new arbitrage pairs
+        to pair manager. Must be called once per block, before `PairManager.update_and_execute`"""
+        changed_edges = self.update_edges(block_number)
+        cycles = self.find_cycles(changed_edges)
+        if cycles:
+            arbitrage_pairs = self.get_arbitrage_pairs(cycles)
+            log.debug(
+                f'{self}: {len(changed_edges)} edges changed, {len(cycles)} cycles, '
+                f'{len(arbitrage_pairs)} new pairs on {block_number=}'
+            )
+            if arbitrage_pairs:
+                self.pair_manager.add_arbitrage_pairs(arbitrage_pairs)
+        return cycles
+
+    def update_edges(self, block_number: int = None) -> list[Edge]:
+        changed_edges = []
+        for pool in self._get_changed_pools(block_number):
+            reserves = tuple(reserve.amount for reserve in pool.reserves)
+            if self._reserves.get(pool) == reserves:
+                continue
+            self._reserves[pool] = reserves
+            for token_in in pool.tokens:
+                for token_out in pool.tokens:
+                    if token_in == token_out:
+                        continue
+                    edge = Edge(token_in, token_out, pool)
+                    if self._update_edge(edge):
+                        changed_edges.append(edge)
+        return changed_edges
+
+    def _get_changed_pools(self, block_number: int = None) -> list[LiquidityPool]:
+        """Pools whose reserves may have changed since last update: UniswapV2 pairs that emitted
+        `Sync` events, pools not read yet and other pools. All pools if logs are not available"""
+        pools = self.pools
+        last_block, self.last_block = self.last_block, block_number
+        if (
+            block_number is None
+            or last_block is None
+            or not 0 < block_number - last_block <= MAX_BLOCKS_SYNC_LOGS
+        ):
+            return pools
+        try:
+            logs = self.web3.eth.get_logs({
+                'fromBlock': last_block + 1,
+                'toBlock': block_number,
+                'topics': [SYNC_TOPIC],
+            })
+        except Exception as e:
+            log.warning(f'{self}: Failed to get Sync logs ({e!r}), reading all pools')
+            return pools
+        synced_addresses = {log_['address'] for log_ in logs}
+        return [
+            pool
+            for pool in pools
+            if pool.address in synced_addresses
+            or pool not in self._reserves
+            or not isinstance(pool, UniV2Pair)
+        ]
+
+    def _update_edge(self, edge: Edge) -> bool:
+        try:
+            marginal_price, _ = edge.pool.get_amount_out_derivatives(
+                TokenAmount(edge.token_in, 0), edge.token_out)
+        except (InsufficientLiquidity, ZeroDivisionError):
+            marginal_price = 0
+        if marginal_price <= 0:
+            if edge in self.weights:
+                del self.weights[edge]
+                self.adjacency[edge.token_in].discard(edge)
+            return False
+        self.weights[edge] = -math.log(marginal_price)
+        self.adjacency[edge.token_in].add(edge)
+        return True
+
+    def find_cycles(self, changed_edges: list[Edge]) -> list[Cycle]:
+        """Find negative cycles, each through at least one of the changed edges"""
+        edges_by_head: dict[Token, list[Edge]] = defaultdict(list)
+        for edge in changed_edges:
+            edges_by_head[edge.token_out].append(edge)
+        cycles = {}
+        for source, edges in edges_by_head.items():
+            layers = self._get_shortest_paths(source, self.max_cycle_length - 1)
+            for edge in edges:
+                cycle = self._get_cycle(edge, layers)
+                if cycle is not None:
+                    key = frozenset(e.pool for e in cycle.edges)
+                    if key not in cycles or cycles[key].log_profit < cycle.log_profit:
+                        cycles[key] = cycle
+        self.n_cycles_found += len(cycles)
+        return sorted(cycles.values(), key=lambda cycle: cycle.log_profit, reverse=True)
+
+    def _get_shortest_paths(
+        self,
+        source: Token,
+        max_hops: int,
+    ) -> list[dict[Token, tuple[float, Edge]]]:
+        """Hop-bounded Bellman-Ford: layers[k][token] = (distance, last edge) of shortest path
+        from source with exactly k hops, relaxing only tokens updated on previous layer"""
+        layers = [{source: (0.0, None)}]
+        for _ in range(max_hops):
+            layer: dict[Token, tuple[float, Edge]] = {}
+            for token, (distance, _) in layers[-1].items():
+                for edge in self.adjacency[token]:
+                    new_distance = distance + self.weights[edge]
+                    if edge.token_out not in layer or new_distance < layer[edge.token_out][0]:
+                        layer[edge.token_out] = (new_distance, edge)
+            layers.append(layer)
+        return layers
+
+    def _get_cycle(
+        self,
+        closing_edge: Edge,
+        layers: list[dict[Token, tuple[float, Edge]]],
+    ) -> Cycle:
+        """Most profitable simple cycle closed by `closing_edge` among the shortest paths of each
+        number of hops. Cycles whose shortest path repeats a pool or token are not searched
+        further, so a profitable cycle through a longer simple path can be missed"""
+        closing_weight = self.weights.get(closing_edge)
+        if closing_weight is None:
+            return None
+        best: Cycle = None
+        for n_hops, layer in enumerate(layers[1:], start=1):
+            if closing_edge.token_in not in layer:
+                continue
+            log_profit = -(layer[closing_edge.token_in][0] + closing_weight)
+            if log_profit < self.min_log_profit or (best and best.log_profit >= log_profit):
+                continue
+            edges = self._get_path(closing_edge.token_in, n_hops, layers) + [closing_edge]
+            if len({edge.pool for edge in edges}) != len(edges):
+                continue  # Pools must not repeat
+            if len({edge.token_in for edge in edges}) != len(edges):
+                continue  # Tokens must not repeat
+            best = Cycle(edges, log_profit)
+        return best
+
+    @staticmethod
+    def _get_path(
+        token: Token,
+        n_hops: int,
+        layers: list[dict[Token, tuple[float, Edge]]],
+    ) -> list[Edge]:
+        path = []
+        for k in range(n_hops, 0, -1):
+            _, edge = layers[k][token]
+            path.append(edge)
+            token = edge.token_in
+        return path[::-1]
+
+    def get_arbitrage_pairs(self, cycles: list[Cycle]) -> list[ArbitragePairV1]:
+        """Convert cycles into new arbitrage pairs, for each possible choice of pool_0"""
+        dex_indexes = {pool: i for i, dex in enumerate(self.dexes) for pool in dex.pools}
+        dex_pairs = set(_get_dex_pairs(range(len(self.dexes)), self.self_trade))
+        managed_hashes = {pair.hash_ for pair in self.pair_manager.arbitrage_pairs}
+        entries = []
+        for cycle in cycles:
+            n_edges = len(cycle.edges)
+            for i in range(n_edges):
+                # pool_0 goes from token_last to token_first, route_1 is the rest of the cycle
+                edge_0 = cycle.edges[i]
+                edges_1 = [cycle.edges[(i + j) % n_edges] for j in range(1, n_edges)]
+                if not all(isinstance(edge.pool, LiquidityPair) for edge in edges_1):
+                    continue
+                dexes_1 = {dex_indexes[edge.pool] for edge in edges_1}
+                if len(dexes_1) != 1:
+                    continue  # Contracts only execute route_1 in a single dex
+                i_0, i_1 = dex_indexes[edge_0.pool], dexes_1.pop()
+                if (i_0, i_1) not in dex_pairs:
+                    continue
+                route_1 = RoutePairs(
+                    [edge.pool for edge in edges_1], edge_0.token_out, edge_0.token_in)
+                entry = _get_pair_universe_entry(
+                    i_0, i_1, edge_0.token_out, edge_0.token_in, edge_0.pool, route_1)
+                if entry.hash_ in managed_hashes or entry.hash_ in self._known_hashes:
+                    continue
+                self._known_hashes.add(entry.hash_)
+                entries.append(entry)
+        return [
+            self.get_arbitrage_pair(params)
+            for params in _get_pair_universe_arguments(
+                entries, self.dexes, self.web3, self.price_table)
+        ]
@@ -3,6 +3,17 @@ from typing import Union
 
 from core import Token, TokenAmount, LiquidityPool
 
+CALLDATA_ZERO_BYTE_GAS = 4
+CALLDATA_NONZERO_BYTE_GAS = 16
+MAX_AMOUNT_ROUNDING_ERROR = 0.001  # Relative error allowed when trading calldata gas for precision
+
+
+def calldata_gas(data: bytes) -> int:
+    """Gas paid for `data` as transaction calldata"""
+    n_zero_bytes = data.count(0)
+    return CALLDATA_ZERO_BYTE_GAS * n_zero_bytes \
+        + CALLDATA_NONZERO_BYTE_GAS * (len(data) - n_zero_bytes)
+
 
 def decompose_amount(amount: Union[int, TokenAmount]) -> tuple[int, int, int]:
     """Decompose amount into 6 bits exponent and 14 bits mantissa. Can represent numbers up to
@@ -102,6 +113,65 @@ def decompose_amount_v2(amount: Union[int, TokenAmount]) -> tuple[int, int, int]
     return mant << exp, exp, mant
 
 
+def get_amount_calldata_gas_v2(exp: int, mant: int, dex_1: int = None) -> int:
+    """Calldata gas of the bytes of `encode_data_v2`'s first word that hold the amount (bits 247
+    to 224, shared with dex_1). If dex_1 is None, it is assumed to be non-zero"""
+    dex_1 = 1 if dex_1 is None else dex_1
+    header = (dex_1 << 243) + (exp << 237) + (mant << 224)
+    return calldata_gas(header.to_bytes(32, 'big')[1:4])
+
+
+def decompose_amount_v2_gas_optimal(
+    amount: Union[int, TokenAmount],
+    max_rounding_error: float = MAX_AMOUNT_ROUNDING_ERROR,
+    dex_1: int = None,
+) -> tuple[int, int, int]:
+    """Same format as `decompose_amount_v2`, but choose the exponent and mantissa that encode
+    into more zero bytes (cheaper calldata) on `encode_data_v2`, as long as the approximated
+    amount is within `max_rounding_error` of `amount`. Ties are broken by the lowest error.
+    Falls back to `decompose_amount_v2` if no representation is within the allowed error
+
+    Args:
+        amount (int): Amount to be decomposed, must be in interval [2 ** 13, 2 ** 76)
+        max_rounding_error (float): Maximum relative error of approximated amount
+        dex_1 (int): dex_1 code, which shares a byte with the exponent
+
+    Returns:
+        tuple[int, int, int]: tuple of (aproximated amount, exponent, mantissa)
+    """
+    amount = amount.amount if isinstance(amount, TokenAmount) else amount
+    best_amount, best_exp, best_mant = decompose_amount_v2(amount)
+    best_key = (
+        get_amount_calldata_gas_v2(best_exp, best_mant, dex_1),
+        abs(best_amount - amount),
+    )
+    min_amount = math.ceil(amount * (1 - max_rounding_error))
+    max_amount = math.floor(amount * (1 + max_rounding_error))
+    for exp in range(2 ** 6):
+        min_mant = max(-(-min_amount >> exp), 1)  # ceil division
+        max_mant = min(max_amount >> exp, 2 ** 13 - 1)
+        if min_mant > max_mant:
+            continue
+        nearest_mant = min(max(round(amount / 2 ** exp), min_mant), max_mant)
+        # Zero bytes come from mantissas lower than 256 or multiples of 256; otherwise only
+        # the nearest mantissa is worth considering
+        candidates = {nearest_mant, min_mant, max_mant}
+        for mant in (
+            2 ** 8 - 1,
+            min_mant + (-min_mant % 2 ** 8),
+            max_mant - max_mant % 2 ** 8,
+        ):
+            if min_mant <= mant <= max_mant:
+                candidates.add(mant)
+        for mant in candidates:
+            key = (get_amount_calldata_gas_v2(exp, mant, dex_1), abs((mant << exp) - amount))
+            if key < best_key:
+                best_key = key
+                best_amount, best_exp, best_mant = mant << exp, exp, mant
+
+    return best_amount, best_exp, best_mant
+
+
 def encode_data_v2(
     dex_0: int,
     dex_1: int,
@@ -145,3 +215,17 @@ def encode_data_v2(
         + (int(pools[2], 0) if len(pools) == 3 else 0)
     )
     return data0.to_bytes(32, 'big'), data1.to_bytes(32, 'big')
+
+
+def encode_batch_data_v2(
+    arbitrages_data: list[tuple[bytes, bytes]],
+) -> list[bytes]:
+    """Encode multiple arbitrages, each one encoded with `encode_data_v2`, into a flat list of
+    32 bytes words in format [data0_0, data1_0, data0_1, data1_1, ...]
+    """
+    assert len(arbitrages_data) > 0
+    batch_data = []
+    for data0, data1 in arbitrages_data:
+        assert len(data0) == len(data1) == 32
+        batch_data.extend([data0, data1])
+    return batch_data
@@ -0,0 +1,103 @@
+import math
+from threading import Lock
+from typing import NamedTuple, Optional
+
+MIN_SAMPLES = 10  # Minimum receipts of a key before its estimates replace strategy's constants
+GAS_LIMIT_STDS = 4.0  # Gas limit is at least this many standard deviations above mean gas used
+GAS_LIMIT_MARGIN = 0.25  # Gas limit is at least this much above largest gas used
+# Receipts' gas used is net of gas refunds (e.g.: CHI burns), which are at most half of the gas
+# executed, so gas executed before refunds is at most twice the gas used
+REFUND_GAS_MULTIPLIER = 2.0
+
+
+class GasModelKey(NamedTuple):
+    contract: str
+    fn_name: str
+    n_hops: int  # Number of pools in route_1
+    dex_0: str
+    dex_1: str
+    chi_flag: Optional[int]  # None if contract function does not take a chiFlag argument
+
+
+class GasStats:
+    def __init__(self):
+        """Running mean, variance and maximum of gas used (Welford's algorithm)"""
+        self.n = 0
+        self.mean = 0.0
+        self.max = 0
+        self._m2 = 0.0
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(n={self.n}, mean={self.mean:,.0f}, std={self.std:,.0f})'
+
+    def add(self, gas_used: int):
+        self.n += 1
+        delta = gas_used - self.mean
+        self.mean += delta / self.n
+        self._m2 += delta * (gas_used - self.mean)
+        self.max = max(self.max, gas_used)
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self._m2 / (self.n - 1)) if self.n > 1 else 0.0
+
+    @property
+    def gas_limit(self) -> int:
+        """Upper bound of gas executed before refunds"""
+        return math.ceil(REFUND_GAS_MULTIPLIER * max(
+            self.mean + GAS_LIMIT_STDS * self.std,
+            self.max * (1 + GAS_LIMIT_MARGIN),
+        ))
+
+
+class GasModel:
+    def __init__(self, min_samples: int = MIN_SAMPLES):
+        """Gas used by arbitrage transactions, by contract function, route shape and dexes.
+        Learned incrementally from receipts of successful non-batched transactions, stored on
+        strategy's ledger or received during execution. Thread-safe"""
+        self.min_samples = min_samples
+        self.stats: dict[GasModelKey, GasStats] = {}
+        self._lock = Lock()
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(n_keys={len(self.stats)})'
+
+    def add_tx(self, key: GasModelKey, tx: dict):
+        """Add transaction stats (as in `ArbitragePairV1.get_tx_stats()`) to model"""
+        if (
+            tx.get('tx_status') != 'succeeded'
+            or tx.get('gas_used') is None
+            or (tx.get('batch_size') or 1) > 1
+        ):
+            return
+        with self._lock:
+            if (stats := self.stats.get(key)) is None:
+                stats = self.stats[key] = GasStats()
+            stats.add(tx['gas_used'])
+
+    def _get_stats(self, key: GasModelKey) -> Optional[GasStats]:
+        if (stats := self.stats.get(key)) is None or stats.n < self.min_samples:
+            return None
+        return stats
+
+    def get_gas_cost(self, key: GasModelKey) -> Optional[int]:
+        """Expected gas used, or None if there are not enough receipts of `key`"""
+        with self._lock:
+            if (stats := self._get_stats(key)) is None:
+                return None
+            return round(stats.mean)
+
+    def get_gas_limit(self, key: GasModelKey) -> Optional[int]:
+        """Gas limit safely above all observed gas usage before refunds, or None if there are
+        not enough receipts of `key`"""
+        with self._lock:
+            if (stats := self._get_stats(key)) is None:
+                return None
+            return stats.gas_limit
+
+    def get_summary(self) -> dict[GasModelKey, dict]:
+        with self._lock:
+            return {
+                key: {'n': stats.n, 'mean': stats.mean, 'std': stats.std, 'max': stats.max}
+                for key, stats in self.stats.items()
+            }
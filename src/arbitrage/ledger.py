@@ -0,0 +1,137 @@
+import json
+import os
+import pathlib
+import sqlite3
+from typing import Iterable, Union
+
+PathLike = Union[bytes, str, os.PathLike]
+
+LEDGER_FILENAME = 'ledger.sqlite'
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS pairs (
+    hash TEXT PRIMARY KEY,
+    disabled INTEGER NOT NULL DEFAULT 0,
+    n_successes INTEGER NOT NULL DEFAULT 0,
+    n_failures INTEGER NOT NULL DEFAULT 0,
+    summary TEXT
+);
+CREATE TABLE IF NOT EXISTS pair_pools (
+    pair_hash TEXT NOT NULL,
+    pool_address TEXT NOT NULL,
+    PRIMARY KEY (pair_hash, pool_address)
+);
+CREATE INDEX IF NOT EXISTS idx_pair_pools_pool_address ON pair_pools (pool_address);
+CREATE TABLE IF NOT EXISTS transactions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    pair_hash TEXT NOT NULL,
+    block_found INTEGER NOT NULL,
+    tx_hash TEXT,
+    tx_status TEXT,
+    data TEXT NOT NULL,
+    UNIQUE (pair_hash, block_found)
+);
+CREATE INDEX IF NOT EXISTS idx_transactions_tx_hash ON transactions (tx_hash);
+'''
+
+
+class Ledger:
+    def __init__(self, data_directory: PathLike):
+        """Append-only SQLite ledger (WAL mode) with summaries and transactions of all arbitrage
+        pairs of a strategy, indexed by pair hash and pool address"""
+        self.data_directory = pathlib.Path(data_directory)
+        self.data_directory.mkdir(parents=True, exist_ok=True)
+        self.filepath = self.data_directory / LEDGER_FILENAME
+        self.connection = sqlite3.connect(self.filepath)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.executescript(SCHEMA)
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.filepath})'
+
+    def close(self):
+        self.connection.close()
+
+    def register_pairs(self, pairs_pools: dict[str, Iterable[str]]):
+        """Register pools used by each pair hash"""
+        with self.connection:
+            self.connection.executemany(
+                'INSERT OR IGNORE INTO pair_pools (pair_hash, pool_address) VALUES (?, ?)',
+                (
+                    (pair_hash, pool_address)
+                    for pair_hash, pools_addresses in pairs_pools.items()
+                    for pool_address in pools_addresses
+                ),
+            )
+
+    def get_summary(self, pair_hash: str) -> dict:
+        row = self.connection.execute(
+            'SELECT summary FROM pairs WHERE hash = ?', (pair_hash,)).fetchone()
+        return {} if row is None or row[0] is None else json.loads(row[0])
+
+    def update_summary(self, pair_hash: str, summary: dict):
+        with self.connection:
+            self.connection.execute(
+                '''
+                INSERT INTO pairs (hash, disabled, n_successes, n_failures, summary)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (hash) DO UPDATE SET
+                    disabled = excluded.disabled,
+                    n_successes = excluded.n_successes,
+                    n_failures = excluded.n_failures,
+                    summary = excluded.summary
+                ''',
+                (
+                    pair_hash,
+                    summary.get('disabled', False),
+                    summary.get('n_successes', 0),
+                    summary.get('n_failures', 0),
+                    json.dumps(summary),
+                ),
+            )
+
+    def append_transactions(self, pair_hash: str, transactions: list[dict]):
+        """Store transactions; one per pair and block, replacing previous data on same block"""
+        with self.connection:
+            self.connection.executemany(
+                '''
+                INSERT OR REPLACE INTO transactions
+                    (pair_hash, block_found, tx_hash, tx_status, data)
+                VALUES (?, ?, ?, ?, ?)
+                ''',
+                (
+                    (
+                        pair_hash,
+                        tx['block_found'],
+                        tx.get('tx_hash'),
+                        tx.get('tx_status'),
+                        json.dumps({k: v for k, v in tx.items() if not k.startswith('_')}),
+                    )
+                    for tx in transactions
+                ),
+            )
+
+    def get_transactions(self, pair_hash: str, limit: int = None) -> list[dict]:
+        """Last `limit` transactions of pair, ordered by block"""
+        rows = self.connection.execute(
+            '''
+            SELECT data FROM transactions WHERE pair_hash = ?
+            ORDER BY block_found DESC LIMIT ?
+            ''',
+            (pair_hash, -1 if limit is None else limit),
+        ).fetchall()
+        return [json.loads(data) for data, in reversed(rows)]
+
+    def get_pool_transactions(self, pool_address: str, limit: int = None) -> list[dict]:
+        """Last `limit` transactions of all pairs using pool, ordered by block"""
+        rows = self.connection.execute(
+            '''
+            SELECT tx.data FROM transactions AS tx
+            JOIN pair_pools AS pp ON pp.pair_hash = tx.pair_hash
+            WHERE pp.pool_address = ?
+            ORDER BY tx.block_found DESC LIMIT ?
+            ''',
+            (pool_address, -1 if limit is None else limit),
+        ).fetchall()
+        return [json.loads(data) for data, in reversed(rows)]
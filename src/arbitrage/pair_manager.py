@@ -7,19 +7,26 @@ import pathlib
 import re
 import sys
 import time
+from collections import deque
+from concurrent import futures
 from copy import copy
 from enum import Enum
 from itertools import product, permutations
-from typing import Iterable, Type, Union
+from threading import Lock
+from typing import Callable, Iterable, NamedTuple, Type, Union
 
 from web3 import Web3
 
+import configs
 import tools
 from core import LiquidityPool, Route, RoutePairs, Token, TokenAmount
 from dex import DexProtocol
 from exceptions import InsufficientLiquidity
 
+from .arbitrage_batch import ArbitrageBatch
 from .arbitrage_pair_v1 import ArbitragePairV1, TxStatus
+from .gas_model import GasModel
+from .ledger import Ledger
 
 log = logging.getLogger(__name__)
 
@@ -28,17 +35,21 @@ PathLike = Union[bytes, str, os.PathLike]
 POOLS_FILE = 'pools.json'
 REMOVED_POOLS_FILE = 'pools_removed.json'
 REMOVED_POOLS_BACKUP_FILE = 'pools_removed_BAK.json'
-ARBITRAGE_PAIR_SUMMARY_FILENAME = 'summary.json'
-ARBITRAGE_PAIR_SUMMARY_BACKUP_FILENAME = 'summary_BAK.json'
+PAIR_UNIVERSE_FILE = 'pair_universe.json'
+PAIR_UNIVERSE_MAX_AGE = 86_400  # Cached pair universe is fully rebuilt after this many seconds
 
 DEFAULT_MIN_PROFITABILITY = 2.0
 DEFAULT_MAX_HOPS_DEX_1 = 2
+MAX_HOPS_INCREMENTAL_REBUILD = 2
 DEFAULT_MIN_POOL_SUCCESS_RATE = 0.2
 DEFAULT_MIN_POOL_SUCCESS_RATE_SAMPLE_SIZE = 20
 DEFAULT_MAX_POOL_REPEATED_FAILURES = 5
 DEFAULT_MAX_TOTAL_REPEATED_FAILURES = 10
 MIN_AMOUNT_OUT_USD = 1.0
-MAX_TRANSACTIONS_STORE_PER_PAIR = 1000
+MAX_TRANSACTIONS_LOAD_PER_PAIR = 1000
+MAX_TX_KEYS_DEDUPE = 20  # Recent transactions per pair kept to avoid storing them twice
+DEFAULT_MAX_CONCURRENT_DRY_RUNS = 8  # Top candidates tested concurrently against node
+DEFAULT_MAX_BATCH_SIZE = 1  # Max arbitrages executed in one transaction, 1 disables batching
 
 # Disable if testing transaction raises message with any of the following messages
 PAT_ERROR_REMOVE_POOL = re.compile('K|TransferHelper|TRANSFER_FAILED')
@@ -55,35 +66,32 @@ class ManagedPair:
         self,
         arb: ArbitragePairV1,
         pools: list[ManagedPool],
-        data_directory: pathlib.Path,
+        ledger: Ledger,
+        gas_model: GasModel = None,
     ):
         self.arb = arb
         self.pools = {pool for pool in pools if pool.lp in arb.pools}
-        self.data_directory = data_directory
+        self.ledger = ledger
+        self.gas_model = gas_model
 
-        self._change_summary_file = False
-        self._new_transactions = False
+        self._change_summary = False
         self._flag_disabled = False
         self.n_successes = 0
         self.n_failures = 0
-        self.transactions: list[dict] = []
+        self._unwritten_transactions: list[dict] = []
+        self._tx_keys: set[tuple[str, int]] = set()
+        self._recent_tx_keys: deque[tuple[str, int]] = deque()
 
         self.route_0_addresses = [p.address for p in self.arb.route_0.pools]
         self.route_1_addresses = [p.address for p in self.arb.route_1.pools]
 
-        addresses = [
+        self.hash_ = get_pair_hash(
             arb.token_first.address,
             arb.token_last.address,
-            *self.route_1_addresses,  # route_1_addresses need to be first for compatibility
-            *self.route_0_addresses,
-        ]
-        self.hash_ = Web3.sha3(text=''.join(addresses)).hex()[:42]
-        self.data_directory = data_directory / 'arb_pairs' / self.hash_
-        self.summary_filepath = self.data_directory / ARBITRAGE_PAIR_SUMMARY_FILENAME
-        self.summary_backup_filepath = self.data_directory / ARBITRAGE_PAIR_SUMMARY_BACKUP_FILENAME
-        self.transactions_directory = self.data_directory / 'tx'
-        self.transactions_directory.mkdir(parents=True, exist_ok=True)
-        self.load_files()
+            self.route_0_addresses,
+            self.route_1_addresses,
+        )
+        self.load_ledger()
 
     def __repr__(self):
         return f'{self.__class__.__name__}({self.arb})'
@@ -100,29 +108,40 @@ class ManagedPair:
     def disable(self):
         self._flag_disabled = True
         self.arb.flag_disabled = True
-        self._change_summary_file = True
+        self._change_summary = True
 
     def is_running(self, block_number: int = None) -> bool:
         is_running = self.arb.is_running(block_number)
         if not is_running and self.arb.flag_execute:
             tx = self.arb.get_tx_stats()
-            if tx not in self.transactions:
+            if self._add_tx_key(tx):
                 self._load_transaction(tx)
-                self._new_transactions = True
-                self._change_summary_file = True
+                self._unwritten_transactions.append(tx)
+                self._change_summary = True
         return is_running
 
-    def load_files(self):
-        self._load_summary_file()
-        self._load_transaction_files()
+    def _add_tx_key(self, tx: dict) -> bool:
+        """Add transaction to recent transactions keys, return False if already added"""
+        key = (tx['tx_hash'], tx['block_found'])
+        if key in self._tx_keys:
+            return False
+        self._tx_keys.add(key)
+        self._recent_tx_keys.append(key)
+        if len(self._recent_tx_keys) > MAX_TX_KEYS_DEDUPE:
+            self._tx_keys.discard(self._recent_tx_keys.popleft())
+        return True
+
+    def get_transactions(self, limit: int = None) -> list[dict]:
+        """Load stored transactions from ledger, for analysis only"""
+        self.update_ledger()
+        return self.ledger.get_transactions(self.hash_, limit)
 
-    def _load_summary_file(self):
-        if self.summary_filepath.exists():
-            summary_data = json.load(open(self.summary_filepath))
-        elif self.summary_backup_filepath.exists():
-            summary_data = json.load(open(self.summary_backup_filepath))
-        else:
-            summary_data = {}
+    def load_ledger(self):
+        self._load_summary()
+        self._load_transactions()
+
+    def _load_summary(self):
+        summary_data = self.ledger.get_summary(self.hash_)
         if 'addresses' in summary_data:
             assert self.arb.token_first.address == summary_data['addresses']['token_fist']
             assert self.arb.token_last.address == summary_data['addresses']['token_last']
@@ -132,32 +151,29 @@ class ManagedPair:
         self.n_successes = summary_data.get('n_successes', 0)
         self.n_failures = summary_data.get('n_failures', 0)
 
-    def _load_transaction_files(self):
-        tx_files = sorted(self.transactions_directory.iterdir())[-MAX_TRANSACTIONS_STORE_PER_PAIR:]
-        for tx_file in tx_files:
-            tx = json.load(open(tx_file))
-            tx['_written'] = True
+    def _load_transactions(self):
+        for tx in self.ledger.get_transactions(self.hash_, MAX_TRANSACTIONS_LOAD_PER_PAIR):
+            self._add_tx_key(tx)
             self._load_transaction(tx, skip_check=True)
 
     def _load_transaction(self, tx: dict, skip_check: bool = False):
-        self.transactions.append(tx)
-        self.transactions = self.transactions[-MAX_TRANSACTIONS_STORE_PER_PAIR:]
         for pool in self.pools:
             pool.add_tx(tx, skip_check)
+        if self.gas_model is not None and 'fn_name' in tx and 'to' in tx:
+            self.gas_model.add_tx(self.arb.get_gas_model_key(tx), tx)
         if tx['tx_status'] == TxStatus.succeeded:
             self.n_successes += 1
         elif tx['tx_status'] == TxStatus.failed:
             self.n_failures += 1
 
-    def update_files(self):
-        if self._change_summary_file:
-            self._update_summary_file()
-            self._change_summary_file = False
-        if self._new_transactions:
+    def update_ledger(self):
+        if self._change_summary:
+            self._update_summary()
+            self._change_summary = False
+        if self._unwritten_transactions:
             self._save_new_transactions()
-            self._new_transactions = False
 
-    def _update_summary_file(self):
+    def _update_summary(self):
         data = {
             'addresses': {
                 'token_fist': self.arb.token_first.address,
@@ -169,21 +185,18 @@ class ManagedPair:
             'n_successes': self.n_successes,
             'n_failures': self.n_failures,
         }
-        if self.summary_filepath.exists():
-            os.rename(self.summary_filepath, self.summary_backup_filepath)
-        with open(self.summary_filepath, 'w') as f:
-            json.dump(data, f, indent=4)
+        self.ledger.update_summary(self.hash_, data)
 
     def _save_new_transactions(self):
-        for tx in reversed(self.transactions):
-            if tx.get('_written'):
-                return
-            with open(self.transactions_directory / f'{tx["block_found"]}.json', 'w') as f:
-                json.dump(tx, f, indent=4)
-            tx['_written'] = True
+        self.ledger.append_transactions(self.hash_, self._unwritten_transactions)
+        self._unwritten_transactions = []
+
+    @property
+    def is_tested(self) -> bool:
+        return all(pool.status == PoolStatus.enabled for pool in self.pools)
 
     def test_pools(self) -> bool:
-        if all(pool.status == PoolStatus.enabled for pool in self.pools):
+        if self.is_tested:
             return True
         try:
             self.arb.dry_run()
@@ -221,7 +234,8 @@ class ManagedPool:
         self._status = PoolStatus.untested
         self.n_successes = 0
         self.n_failures = 0
-        self.block_failures: list[int] = []
+        self.block_failures: deque[int] = deque(maxlen=max_repeated_failures)
+        self._loaded_block_failures: list[int] = []  # Unsorted, until sort_and_check()
 
     def __repr__(self):
         return f'{self.__class__.__name__}({self.lp})'
@@ -241,15 +255,19 @@ class ManagedPool:
     def add_tx(self, tx: dict, skip_check: bool = False):
         if tx['tx_status'] == TxStatus.succeeded:
             self.n_successes += 1
-            self.block_failures = []
+            self.block_failures.clear()
+            self._loaded_block_failures.clear()
         elif tx['tx_status'] == TxStatus.failed:
             self.n_failures += 1
-            self.block_failures.append(tx['block_found'])
-            if not skip_check:
+            if skip_check:
+                self._loaded_block_failures.append(tx['block_found'])
+            else:
+                self.block_failures.append(tx['block_found'])
                 self.check_disable()
 
     def sort_and_check(self):
-        block_failures = sorted(self.block_failures)
+        block_failures = sorted(self._loaded_block_failures + list(self.block_failures))
+        self._loaded_block_failures = []
         for i in range(len(block_failures) - self.max_repeated_failures):
             n_blocks = block_failures[i] - block_failures[i + self.max_repeated_failures] + 1
             if n_blocks <= self.max_repeated_failures * self.blocks_per_transaction:
@@ -259,7 +277,8 @@ class ManagedPool:
                 )
                 self.disable()
                 break
-        self.block_failures = block_failures[-self.max_repeated_failures:]
+        self.block_failures.clear()
+        self.block_failures.extend(block_failures[-self.max_repeated_failures:])
 
     def check_disable(self):
         n_total = self.n_successes + self.n_failures
@@ -270,7 +289,6 @@ class ManagedPool:
             log.info(f'{self}: {success_rate=:.1%} lower than minimum, disabling pool')
             self.disable()
         elif len(self.block_failures) >= self.max_repeated_failures:
-            self.block_failures = self.block_failures[-self.max_repeated_failures:]
             n_blocks = self.block_failures[-1] - self.block_failures[0] + 1
             if n_blocks <= self.max_repeated_failures * self.blocks_per_transaction:
                 log.info(
@@ -291,33 +309,49 @@ class PairManager:
         min_pool_success_rate: float = DEFAULT_MIN_POOL_SUCCESS_RATE,
         min_pool_success_rate_sample_size: int = DEFAULT_MIN_POOL_SUCCESS_RATE_SAMPLE_SIZE,
         max_pool_repeated_failures: int = DEFAULT_MAX_POOL_REPEATED_FAILURES,
+        max_concurrent_dry_runs: int = DEFAULT_MAX_CONCURRENT_DRY_RUNS,
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
     ):
         self.addresses_directory = pathlib.Path(addresses_directory)
         self.removed_pools: list[str] = _load_removed_pools(self.addresses_directory)
         self.web3 = web3
         self.min_profitability = min_profitability
         self.max_total_repeated_failures = max_total_repeated_failures
-        self.block_failures = []
+        self.block_failures: deque[int] = deque(maxlen=max_total_repeated_failures)
+        self.max_concurrent_dry_runs = max_concurrent_dry_runs
+        self.max_batch_size = max_batch_size
+        self._dry_run_executor = futures.ThreadPoolExecutor(max_concurrent_dry_runs)
+        self.gas_oracle: tools.gas.GasOracle = None
+        self.gas_model = GasModel() if configs.USE_GAS_MODEL else None
+        self.min_pool_success_rate = min_pool_success_rate
+        self.min_pool_success_rate_sample_size = min_pool_success_rate_sample_size
+        self.max_pool_repeated_failures = max_pool_repeated_failures
 
         all_pools = {pool for arb in arbitrage_pairs for pool in arb.pools}
         self.blocks_per_transaction = max(arb.min_confirmations for arb in arbitrage_pairs) + 2
-        self.pools = [
-            ManagedPool(
-                lp,
-                min_pool_success_rate,
-                min_pool_success_rate_sample_size,
-                max_pool_repeated_failures,
-                self.blocks_per_transaction,
-            )
-            for lp in all_pools
-        ]
+        self.pools = [self._get_managed_pool(lp) for lp in all_pools]
         self._running_pools = set()
+        self._new_arbitrage_pairs: list[ArbitragePairV1] = []
+        self._new_pools: list[tuple[LiquidityPool, DexProtocol, Callable]] = []
+        self._new_arbitrage_pairs_lock = Lock()
+        self.ledger = Ledger(self.addresses_directory)
         self._arbitrage_pairs = [
-            ManagedPair(arb, self.pools, self.addresses_directory)
+            ManagedPair(arb, self.pools, self.ledger, self.gas_model)
             for arb in arbitrage_pairs
         ]
+        self.ledger.register_pairs({
+            pair.hash_: pair.route_0_addresses + pair.route_1_addresses
+            for pair in self._arbitrage_pairs
+        })
         for pool in self.pools:
             pool.sort_and_check()
+        if configs.USE_GAS_ORACLE:
+            self._start_gas_oracle(arbitrage_pairs, all_pools)
+        if self.gas_model is not None:
+            for arb in arbitrage_pairs:
+                if arb.gas_model is None:
+                    arb.gas_model = self.gas_model
+            log.info(f'Loaded {self.gas_model} from ledger')
         tools.process.register_exit_handle(self._handle_exit)
 
     def __repr__(self):
@@ -331,12 +365,95 @@ class PairManager:
             if not arb_pair.disabled
         ]
 
+    def _get_managed_pool(self, lp: LiquidityPool) -> ManagedPool:
+        return ManagedPool(
+            lp,
+            self.min_pool_success_rate,
+            self.min_pool_success_rate_sample_size,
+            self.max_pool_repeated_failures,
+            self.blocks_per_transaction,
+        )
+
+    def add_arbitrage_pairs(self, arbitrage_pairs: list[ArbitragePairV1]):
+        """Add arbitrage pairs to a running manager, e.g.: pairs of newly created pools.
+        Thread-safe; pairs are inserted at the beggining of the next `update_and_execute()`"""
+        with self._new_arbitrage_pairs_lock:
+            self._new_arbitrage_pairs.extend(arbitrage_pairs)
+
+    def add_pool(
+        self,
+        pool: LiquidityPool,
+        dex: DexProtocol,
+        get_arbitrage_pairs: Callable[[LiquidityPool], list[ArbitragePairV1]],
+    ):
+        """Add pool to a running manager, e.g.: newly created pools. Thread-safe; at the beggining
+        of the next `update_and_execute()` pool is appended to `dex.pools` and the arbitrage
+        pairs returned by `get_arbitrage_pairs(pool)` are inserted"""
+        with self._new_arbitrage_pairs_lock:
+            self._new_pools.append((pool, dex, get_arbitrage_pairs))
+
+    def _insert_new_arbitrage_pairs(self):
+        with self._new_arbitrage_pairs_lock:
+            arbitrage_pairs, self._new_arbitrage_pairs = self._new_arbitrage_pairs, []
+            new_dex_pools, self._new_pools = self._new_pools, []
+        for pool, dex, get_arbitrage_pairs in new_dex_pools:
+            if pool in dex.pools:
+                continue
+            dex.pools.append(pool)
+            arbitrage_pairs.extend(get_arbitrage_pairs(pool))
+        if not arbitrage_pairs:
+            return
+        pools_by_lp = {pool.lp: pool for pool in self.pools}
+        new_pools = [
+            self._get_managed_pool(lp)
+            for lp in {lp for arb in arbitrage_pairs for lp in arb.pools}
+            if lp not in pools_by_lp
+        ]
+        self.pools.extend(new_pools)
+
+        hashes = {pair.hash_ for pair in self._arbitrage_pairs}
+        new_pairs = []
+        for arb in arbitrage_pairs:
+            pair = ManagedPair(arb, self.pools, self.ledger, self.gas_model)
+            if pair.hash_ in hashes:
+                continue
+            hashes.add(pair.hash_)
+            new_pairs.append(pair)
+            if self.gas_oracle is not None and arb.gas_oracle is None:
+                arb.gas_oracle = self.gas_oracle
+            if self.gas_model is not None and arb.gas_model is None:
+                arb.gas_model = self.gas_model
+        self._arbitrage_pairs.extend(new_pairs)
+        self.ledger.register_pairs({
+            pair.hash_: pair.route_0_addresses + pair.route_1_addresses
+            for pair in new_pairs
+        })
+        for pool in new_pools:
+            pool.sort_and_check()
+        if self.gas_oracle is not None:
+            self.gas_oracle.watch(pool.lp.address for pool in new_pools)
+        log.info(f'{self}: Added {len(new_pairs)} arbitrage pairs and {len(new_pools)} pools')
+
+    def _start_gas_oracle(
+        self,
+        arbitrage_pairs: list[ArbitragePairV1],
+        pools: Iterable[LiquidityPool],
+    ):
+        watched_addresses = [pool.address for pool in pools]
+        self.gas_oracle = tools.gas.GasOracle(self.web3, watched_addresses=watched_addresses)
+        self.gas_oracle.start()
+        for arb in arbitrage_pairs:
+            if arb.gas_oracle is None:
+                arb.gas_oracle = self.gas_oracle
+        log.info(f'Started {self.gas_oracle}')
+
     def update_and_execute(self, block_number: int = None):
         if block_number is None:
             return  # Case when process is shutting down
+        self._insert_new_arbitrage_pairs()
         next_round_pairs = self._get_next_round_pairs(block_number)  # Needs to be called before checking for status  # noqa: E501
         if any(arb_pair.arb.tx_status == TxStatus.succeeded for arb_pair in self.arbitrage_pairs):
-            self.block_failures = []
+            self.block_failures.clear()
         if any(arb_pair.arb.tx_status == TxStatus.failed for arb_pair in self.arbitrage_pairs):
             self.block_failures.append(block_number)
             self._check_shutdown()
@@ -358,29 +475,117 @@ class PairManager:
 
     def _update_and_execute(self, block_number: int, next_round_pairs: list[ManagedPair]) -> bool:
         best_pairs = []
+        marginal_pairs = []
+        n_evaluations = n_warm_started = 0
         for pair in next_round_pairs:
             pair.arb.update_estimate(block_number)
+            n_evaluations += pair.arb.opt_n_evaluations
+            n_warm_started += pair.arb.opt_warm_started
             if pair.arb.estimated_net_result_usd > self.min_profitability:
                 best_pairs.append(pair)
+            elif self.max_batch_size > 1 and pair.arb.batchable:
+                marginal_pairs.append(pair)
+        log.debug(
+            f'{self}: Estimated {len(next_round_pairs)} pairs with {n_evaluations} evaluations '
+            f'({n_warm_started} warm started)'
+        )
+        if self.max_batch_size > 1 and best_pairs + marginal_pairs:
+            best_pairs = self._execute_batch(block_number, best_pairs, marginal_pairs)
         if not best_pairs:
             return
         best_pairs = sorted(best_pairs, key=lambda x: x.arb.adjusted_profit, reverse=True)
         log.info(f'Arbitrage opportunity(ies) found on block {block_number}')
-        for pair in best_pairs:
-            if not pair.test_pools() or pair.pools & self._running_pools:
+        test_futures = self._submit_test_pools(best_pairs)
+        check_block = True
+        try:
+            for pair in best_pairs:
+                if pair.pools & self._running_pools:
+                    continue
+                if pair in test_futures:
+                    test_future = test_futures[pair]
+                    check_block = check_block or not test_future.done()
+                    passed = test_future.result()
+                else:
+                    check_block = check_block or not pair.is_tested
+                    passed = pair.test_pools()
+                if not passed:
+                    continue
+                if check_block:
+                    if (current_block := self.web3.eth.block_number) != block_number:
+                        log.warning(
+                            'Latest block advanced since beggining of iteration: '
+                            f'{block_number=} vs {current_block=}'
+                        )
+                        return
+                    check_block = False
+                self._running_pools.update(pair.pools)
+                pair.arb.execute()
+        finally:
+            # Dry runs already started can not be cancelled, wait for them so that they do not
+            # overlap with next iteration's updates of the same pools
+            for test_future in test_futures.values():
+                test_future.cancel()
+            futures.wait(test_futures.values())
+
+    def _execute_batch(
+        self,
+        block_number: int,
+        best_pairs: list[ManagedPair],
+        marginal_pairs: list[ManagedPair],
+    ) -> list[ManagedPair]:
+        """Execute top non-overlapping tested pairs, including ones not profitable on their own,
+        in a single transaction if it beats executing them separately. Return remaining pairs"""
+        candidates = sorted(
+            (pair for pair in best_pairs + marginal_pairs if pair.arb.batchable and pair.is_tested),
+            key=lambda x: x.arb.adjusted_profit,
+            reverse=True,
+        )
+        batch_pairs: list[ManagedPair] = []
+        batch_pools = set(self._running_pools)
+        for pair in candidates:
+            if len(batch_pairs) == self.max_batch_size:
+                break
+            if pair.pools & batch_pools:
                 continue
-            if (current_block := self.web3.eth.block_number) != block_number:
-                log.warning(
-                    'Latest block advanced since beggining of iteration: '
-                    f'{block_number=} vs {current_block=}'
-                )
-                return
-            self._running_pools.update(pair.pools)
-            pair.arb.execute()
+            batch_pairs.append(pair)
+            batch_pools.update(pair.pools)
+        if len(batch_pairs) < 2:
+            return best_pairs
+
+        batch = ArbitrageBatch([pair.arb for pair in batch_pairs])
+        separate_result_usd = sum(
+            pair.arb.estimated_net_result_usd for pair in batch_pairs if pair in best_pairs)
+        if (
+            batch.estimated_net_result_usd <= self.min_profitability
+            or batch.estimated_net_result_usd <= separate_result_usd
+        ):
+            return best_pairs
+        if (current_block := self.web3.eth.block_number) != block_number:
+            log.warning(
+                'Latest block advanced since beggining of iteration: '
+                f'{block_number=} vs {current_block=}'
+            )
+            return []
+        log.info(f'Batch arbitrage opportunity found on block {block_number}: {batch}')
+        self._running_pools.update(batch_pools)
+        batch.execute()
+        return [pair for pair in best_pairs if pair not in batch_pairs]
+
+    def _submit_test_pools(
+        self,
+        best_pairs: list[ManagedPair],
+    ) -> dict[ManagedPair, futures.Future]:
+        """Start dry runs of untested pairs among the top candidates concurrently"""
+        top_pairs = best_pairs[:self.max_concurrent_dry_runs]
+        return {
+            pair: self._dry_run_executor.submit(pair.test_pools)
+            for pair in top_pairs
+            if not pair.is_tested
+        }
 
     def _update_arb_pairs(self):
         for arb_pair in self._arbitrage_pairs:
-            arb_pair.update_files()
+            arb_pair.update_ledger()
         self._arbitrage_pairs = self.arbitrage_pairs
 
     def _update_pools(self):
@@ -400,7 +605,6 @@ class PairManager:
 
     def _check_shutdown(self):
         if len(self.block_failures) >= self.max_total_repeated_failures:
-            self.block_failures = self.block_failures[-self.max_total_repeated_failures:]
             n_blocks = self.block_failures[-1] - self.block_failures[0] + 1
             if n_blocks <= self.max_total_repeated_failures * self.blocks_per_transaction:
                 log.info(f'At least {len(self.block_failures)} failures last {n_blocks} blocks')
@@ -446,47 +650,320 @@ class PairManager:
         max_hops_dex_1: int = DEFAULT_MAX_HOPS_DEX_1,
         self_trade: bool = False,
         load_low_liquidity: bool = False,
-    ) -> Iterable[tuple[DexProtocol, DexProtocol]]:
-        all_tokens = {token for dex in dexes for token in dex.tokens}
+        cache_directory: PathLike = None,
+    ) -> Iterable[dict]:
+        """Yield arguments of all V1 arbitrage pairs. If `cache_directory` is passed, the pair
+        universe is loaded from / saved to a file in it, and only rebuilt for changed pools"""
+        dexes = list(dexes)
         all_pools = [pool for dex in dexes for pool in dex.pools]
-        prices = {}
-        for token in all_tokens:
-            if not load_low_liquidity:
-                try:
-                    prices[token] = tools.price.get_price_usd(token, all_pools, web3)
-                except InsufficientLiquidity:
-                    pass
-        for dex_0, dex_1 in _get_dex_pairs(dexes, self_trade):
-            for pool_0 in dex_0.pools:
-                for token_first, token_last in permutations(pool_0.tokens):
-                    if token_last not in prices and not load_low_liquidity:
+        price_table = tools.price.UsdPriceTable(all_pools, web3)
+        build_args = (dexes, price_table, max_hops_dex_1, self_trade, load_low_liquidity)
+        if cache_directory is None:
+            entries = _build_pair_universe(*build_args)
+        else:
+            entries = _load_pair_universe(pathlib.Path(cache_directory), *build_args)
+
+        yield from _get_pair_universe_arguments(entries, dexes, web3, price_table)
+
+    @staticmethod
+    def get_new_pool_v1_arguments(
+        pool: LiquidityPool,
+        dexes: Iterable[DexProtocol],
+        web3: Web3,
+        price_table: tools.price.UsdPriceTable,
+        max_hops_dex_1: int = DEFAULT_MAX_HOPS_DEX_1,
+        self_trade: bool = False,
+        load_low_liquidity: bool = False,
+    ) -> Iterable[dict]:
+        """Yield arguments of V1 arbitrage pairs that use `pool`, which must have already been
+        added to its dex's pools"""
+        dexes = list(dexes)
+        entries = _build_pool_pair_universe(
+            pool, dexes, price_table, max_hops_dex_1, self_trade, load_low_liquidity)
+        yield from _get_pair_universe_arguments(entries, dexes, web3, price_table)
+
+
+class PairUniverseEntry(NamedTuple):
+    dex_0: int  # Index of dex in list of dexes
+    dex_1: int
+    token_first: str
+    token_last: str
+    pool_0: str
+    route_1: list[str]
+    hash_: str
+
+
+def get_pair_hash(
+    token_first_address: str,
+    token_last_address: str,
+    route_0_addresses: list[str],
+    route_1_addresses: list[str],
+) -> str:
+    addresses = [
+        token_first_address,
+        token_last_address,
+        *route_1_addresses,  # route_1_addresses need to be first for compatibility
+        *route_0_addresses,
+    ]
+    return Web3.sha3(text=''.join(addresses)).hex()[:42]
+
+
+def _build_pair_universe(
+    dexes: list[DexProtocol],
+    price_table: tools.price.UsdPriceTable,
+    max_hops_dex_1: int,
+    self_trade: bool,
+    load_low_liquidity: bool,
+    pools_0_addresses: set[str] = None,
+) -> list[PairUniverseEntry]:
+    """Build pair universe entries, optionally only for given pool_0 addresses"""
+    prices = price_table.prices if not load_low_liquidity else {}
+    entries = []
+    for i_0, i_1 in _get_dex_pairs(range(len(dexes)), self_trade):
+        dex_0, dex_1 = dexes[i_0], dexes[i_1]
+        for pool_0 in dex_0.pools:
+            if pools_0_addresses is not None and pool_0.address not in pools_0_addresses:
+                continue
+            for token_first, token_last in permutations(pool_0.tokens):
+                if token_last not in prices and not load_low_liquidity:
+                    continue
+                min_amount_last = _get_min_amount_last(token_last, prices, load_low_liquidity)
+
+                pools_1 = [pool for pool in dex_1.pools if pool != pool_0]
+                dex_1_routes = _get_routes(pools_1, token_first, min_amount_last, max_hops_dex_1)
+
+                for route_1 in dex_1_routes:
+                    entries.append(_get_pair_universe_entry(
+                        i_0, i_1, token_first, token_last, pool_0, route_1))
+    return entries
+
+
+def _build_pool_pair_universe(
+    pool: LiquidityPool,
+    dexes: list[DexProtocol],
+    price_table: tools.price.UsdPriceTable,
+    max_hops_dex_1: int,
+    self_trade: bool,
+    load_low_liquidity: bool,
+) -> list[PairUniverseEntry]:
+    """Build pair universe entries with `pool` either as pool_0 or in route_1"""
+    entries = _build_pair_universe(
+        dexes,
+        price_table,
+        max_hops_dex_1,
+        self_trade,
+        load_low_liquidity,
+        pools_0_addresses={pool.address},
+    )
+    prices = price_table.prices if not load_low_liquidity else {}
+    for i_0, i_1 in _get_dex_pairs(range(len(dexes)), self_trade):
+        dex_0, dex_1 = dexes[i_0], dexes[i_1]
+        if pool not in dex_1.pools:
+            continue
+        if max_hops_dex_1 > MAX_HOPS_INCREMENTAL_REBUILD:
+            pools_1 = None
+        else:
+            # Routes with up to 2 hops that include `pool` only use pools with one of its tokens
+            pools_1 = [p for p in dex_1.pools if set(p.tokens) & set(pool.tokens)]
+        for pool_0 in dex_0.pools:
+            if pool_0 == pool or not set(pool_0.tokens) & set(pool.tokens):
+                continue
+            for token_first, token_last in permutations(pool_0.tokens):
+                if token_last not in prices and not load_low_liquidity:
+                    continue
+                min_amount_last = _get_min_amount_last(token_last, prices, load_low_liquidity)
+                candidate_pools = [
+                    p for p in (dex_1.pools if pools_1 is None else pools_1) if p != pool_0]
+                for route_1 in _get_routes(
+                    candidate_pools, token_first, min_amount_last, max_hops_dex_1
+                ):
+                    if pool not in route_1.pools:
                         continue
-                    if load_low_liquidity:
-                        min_amount_last = TokenAmount(token_last, 0)
-                    else:
-                        price_unit = prices[token_last] / 10 ** token_last.decimals
-                        min_amount_last = TokenAmount(
-                            token_last,
-                            round(MIN_AMOUNT_OUT_USD / price_unit)
-                        )
+                    entries.append(_get_pair_universe_entry(
+                        i_0, i_1, token_first, token_last, pool_0, route_1))
+    return entries
+
 
-                    # The order for token_first/token_last is inverted for the second route_0
-                    route_0 = Route([pool_0], [token_last, token_first])
+def _get_min_amount_last(
+    token_last: Token,
+    prices: dict[Token, float],
+    load_low_liquidity: bool,
+) -> TokenAmount:
+    if load_low_liquidity:
+        return TokenAmount(token_last, 0)
+    price_unit = prices[token_last] / 10 ** token_last.decimals
+    return TokenAmount(token_last, round(MIN_AMOUNT_OUT_USD / price_unit))
 
-                    pools_1 = [pool for pool in dex_1.pools if pool != pool_0]
-                    dex_1_routes = _get_routes(
-                        pools_1, token_first, min_amount_last, max_hops_dex_1)
 
-                    for route_1 in dex_1_routes:
-                        yield {
-                            'token_first': token_first,
-                            'token_last': token_last,
-                            'route_0': route_0,
-                            'route_1': route_1,
-                            'dex_0': dex_0,
-                            'dex_1': dex_1,
-                            'web3': web3,
-                        }
+def _get_pair_universe_entry(
+    i_0: int,
+    i_1: int,
+    token_first: Token,
+    token_last: Token,
+    pool_0: LiquidityPool,
+    route_1: RoutePairs,
+) -> PairUniverseEntry:
+    route_1_addresses = [pool.address for pool in route_1.pools]
+    return PairUniverseEntry(
+        i_0,
+        i_1,
+        token_first.address,
+        token_last.address,
+        pool_0.address,
+        route_1_addresses,
+        get_pair_hash(token_first.address, token_last.address, [pool_0.address], route_1_addresses),
+    )
+
+
+def _get_pair_universe_arguments(
+    entries: Iterable[PairUniverseEntry],
+    dexes: list[DexProtocol],
+    web3: Web3,
+    price_table: tools.price.UsdPriceTable,
+) -> Iterable[dict]:
+    pools = {pool.address: pool for dex in dexes for pool in dex.pools}
+    for entry in entries:
+        pool_0 = pools[entry.pool_0]
+        token_first, token_last = sorted(
+            pool_0.tokens, key=lambda token: token.address != entry.token_first)
+        yield {
+            'token_first': token_first,
+            'token_last': token_last,
+            # The order for token_first/token_last is inverted for the second route_0
+            'route_0': Route([pool_0], [token_last, token_first]),
+            'route_1': RoutePairs(
+                [pools[address] for address in entry.route_1], token_first, token_last),
+            'dex_0': dexes[entry.dex_0],
+            'dex_1': dexes[entry.dex_1],
+            'web3': web3,
+            'price_table': price_table,
+        }
+
+
+def _load_pair_universe(
+    cache_directory: pathlib.Path,
+    dexes: list[DexProtocol],
+    price_table: tools.price.UsdPriceTable,
+    max_hops_dex_1: int,
+    self_trade: bool,
+    load_low_liquidity: bool,
+) -> list[PairUniverseEntry]:
+    filepath = cache_directory / PAIR_UNIVERSE_FILE
+    params = {
+        'dexes': [type(dex).__name__ for dex in dexes],
+        'max_hops_dex_1': max_hops_dex_1,
+        'self_trade': self_trade,
+        'load_low_liquidity': load_low_liquidity,
+    }
+    pools_addresses = [sorted(pool.address for pool in dex.pools) for dex in dexes]
+    build_args = (dexes, price_table, max_hops_dex_1, self_trade, load_low_liquidity)
+
+    data = json.load(open(filepath)) if filepath.exists() else {}
+    built_at = data.get('built_at', 0)
+    if data.get('params') != params or time.time() - built_at > PAIR_UNIVERSE_MAX_AGE:
+        log.info('Building pair universe')
+        entries = _build_pair_universe(*build_args)
+        built_at = time.time()
+    else:
+        entries = _filter_pair_universe(
+            [PairUniverseEntry(*entry) for entry in data['entries']],
+            dexes,
+            price_table,
+            load_low_liquidity,
+        )
+        if data['pools'] == pools_addresses:
+            log.info(f'Loaded {len(entries)} pairs from {filepath}')
+            return entries
+        old_addresses = {address for addresses in data['pools'] for address in addresses}
+        new_addresses = {address for addresses in pools_addresses for address in addresses}
+        if max_hops_dex_1 > MAX_HOPS_INCREMENTAL_REBUILD:
+            log.info('Pools changed, rebuilding pair universe')
+            entries = _build_pair_universe(*build_args)
+            built_at = time.time()
+        else:
+            entries = _update_pair_universe(
+                entries, old_addresses, new_addresses, *build_args)
+
+    tmp_filepath = filepath.with_suffix('.tmp')
+    with open(tmp_filepath, 'w') as f:
+        json.dump({
+            'params': params,
+            'built_at': built_at,
+            'pools': pools_addresses,
+            'entries': entries,
+        }, f)
+    os.replace(tmp_filepath, filepath)
+    return entries
+
+
+def _filter_pair_universe(
+    entries: list[PairUniverseEntry],
+    dexes: list[DexProtocol],
+    price_table: tools.price.UsdPriceTable,
+    load_low_liquidity: bool,
+) -> list[PairUniverseEntry]:
+    """Re-apply the liquidity filter of `_build_pair_universe` to cached entries, with current
+    prices and reserves. Entries with pools no longer loaded are also removed"""
+    if load_low_liquidity:
+        return entries
+    prices = price_table.prices
+    pools = {pool.address: pool for dex in dexes for pool in dex.pools}
+    tokens = {token.address: token for pool in pools.values() for token in pool.tokens}
+    filtered_entries = []
+    for entry in entries:
+        if any(address not in pools for address in [entry.pool_0, *entry.route_1]):
+            continue
+        token_last = tokens[entry.token_last]
+        if token_last not in prices:
+            continue
+        min_amount_last = _get_min_amount_last(token_last, prices, load_low_liquidity)
+        route_1 = RoutePairs(
+            [pools[address] for address in entry.route_1], tokens[entry.token_first], token_last)
+        try:
+            assert route_1.get_amount_in(min_amount_last) >= 0
+        except (InsufficientLiquidity, AssertionError):
+            continue
+        filtered_entries.append(entry)
+    if (n_removed := len(entries) - len(filtered_entries)):
+        log.info(f'Removed {n_removed} cached pairs below minimum liquidity')
+    return filtered_entries
+
+
+def _update_pair_universe(
+    entries: list[PairUniverseEntry],
+    old_addresses: set[str],
+    new_addresses: set[str],
+    dexes: list[DexProtocol],
+    *build_args,
+) -> list[PairUniverseEntry]:
+    """Remove entries with removed pools and rebuild entries of pool_0s that share a token with
+    added pools. Valid for routes up to 2 hops, where all route_1 pools have a pool_0 token"""
+    removed_addresses = old_addresses - new_addresses
+    added_addresses = new_addresses - old_addresses
+    all_pools = [pool for dex in dexes for pool in dex.pools]
+    added_tokens = {
+        token
+        for pool in all_pools
+        if pool.address in added_addresses
+        for token in pool.tokens
+    }
+    rebuild_pools_0 = {
+        pool.address
+        for pool in all_pools
+        if added_tokens.intersection(pool.tokens)
+    }
+    entries = [
+        entry
+        for entry in entries
+        if entry.pool_0 not in rebuild_pools_0
+        and removed_addresses.isdisjoint([entry.pool_0, *entry.route_1])
+    ]
+    new_entries = _build_pair_universe(dexes, *build_args, pools_0_addresses=rebuild_pools_0)
+    log.info(
+        f'Pair universe updated: {len(removed_addresses)} pools removed, '
+        f'{len(added_addresses)} added, {len(new_entries)} pairs rebuilt'
+    )
+    return entries + new_entries
 
 
 def _load_removed_pools(addresses_directory: pathlib.Path) -> list[str]:
@@ -501,7 +978,7 @@ def _load_removed_pools(addresses_directory: pathlib.Path) -> list[str]:
 
 
 def _get_dex_pairs(
-    dexes: list[DexProtocol],
+    dexes: Iterable[DexProtocol],
     self_trade: bool,
 ) -> Iterable[tuple[DexProtocol, DexProtocol]]:
     if self_trade:
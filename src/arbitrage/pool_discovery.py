@@ -0,0 +1,188 @@
+import json
+import logging
+import os
+import pathlib
+from threading import Thread
+from typing import Callable, NamedTuple
+
+from web3 import Web3
+
+import tools
+from core import LiquidityPool
+from dex import DexProtocol
+from dex.uniswap_v2.entities import UniV2Pair
+from dex.uniswap_v2.uniswap_v2_protocol import PAIR_ABI, UniswapV2Protocol
+
+from .arbitrage_pair_v1 import ArbitragePairV1
+from .pair_manager import DEFAULT_MAX_HOPS_DEX_1, POOLS_FILE, PairManager
+
+log = logging.getLogger(__name__)
+
+DEFAULT_MIN_LIQUIDITY_USD = 10_000.0
+MAX_BLOCKS_PENDING_LIQUIDITY = 200  # About 10 minutes at 3 seconds per block
+MAX_BLOCKS_LOGS_QUERY = 100  # Limit of blocks on each eth_getLogs request when catching up
+
+
+class CandidatePool(NamedTuple):
+    pool: LiquidityPool
+    dex: UniswapV2Protocol
+    block_created: int
+
+
+class PoolDiscovery:
+    def __init__(
+        self,
+        pair_manager: PairManager,
+        dexes: dict[str, DexProtocol],
+        get_arbitrage_pair: Callable[[dict], ArbitragePairV1],
+        web3: Web3,
+        max_hops_dex_1: int = DEFAULT_MAX_HOPS_DEX_1,
+        self_trade: bool = False,
+        min_liquidity_usd: float = DEFAULT_MIN_LIQUIDITY_USD,
+    ):
+        """Follow `PairCreated` events of the factories of UniswapV2 based dexes and hot insert
+        new pools, and the arbitrage pairs derived from them, into a running `PairManager`.
+
+        New pools usually have no liquidity at creation, so they are kept as candidates until
+        their liquidity reaches `min_liquidity_usd` or `MAX_BLOCKS_PENDING_LIQUIDITY` pass.
+        Inserted pools are also added to the strategy's pools file, to be loaded on restart.
+
+        Args:
+            pair_manager (PairManager): Running pair manager
+            dexes (dict[str, DexProtocol]): Dexes of strategy, as returned by
+                `PairManager.load_dex_protocols`; only UniswapV2 based dexes are followed
+            get_arbitrage_pair (Callable[[dict], ArbitragePairV1]): Creates arbitrage pair from
+                the arguments yielded by `PairManager.get_new_pool_v1_arguments`
+            web3 (Web3): Web3 provider
+            max_hops_dex_1 (int): Same as used on strategy's `get_v1_pool_arguments`
+            self_trade (bool): Same as used on strategy's `get_v1_pool_arguments`
+            min_liquidity_usd (float): Minimum liquidity of pool to be inserted
+        """
+        self.pair_manager = pair_manager
+        self.dexes = dexes
+        self.get_arbitrage_pair = get_arbitrage_pair
+        self.web3 = web3
+        self.max_hops_dex_1 = max_hops_dex_1
+        self.self_trade = self_trade
+        self.min_liquidity_usd = min_liquidity_usd
+
+        self.factories = {
+            dex.factory_contract.address: dex
+            for dex in dexes.values()
+            if isinstance(dex, UniswapV2Protocol)
+        }
+        self.price_table = tools.price.UsdPriceTable(
+            [pool for dex in dexes.values() for pool in dex.pools], web3)
+        self.candidates: dict[str, CandidatePool] = {}
+        self.last_block: int = None
+        self._thread: Thread = None
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(n_factories={len(self.factories)})'
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self.last_block = self.web3.eth.block_number
+        self._thread = Thread(target=self._listen_blocks, daemon=True)
+        self._thread.start()
+        log.info(f'Started {self}')
+
+    def _listen_blocks(self):
+        listener = tools.w3.BlockListener(self.web3, verbose=False)
+        for block_number in listener.wait_for_new_blocks():
+            try:
+                self.process_block(block_number)
+            except Exception:
+                log.warning(f'{self} failed to process block {block_number}', exc_info=True)
+
+    def process_block(self, block_number: int):
+        from_block = self.last_block + 1 if self.last_block is not None else block_number
+        while from_block <= block_number:
+            to_block = min(from_block + MAX_BLOCKS_LOGS_QUERY - 1, block_number)
+            for dex in self.factories.values():
+                self._add_candidates(dex, from_block, to_block)
+            self.last_block = to_block
+            from_block = to_block + 1
+        if self.candidates:
+            self._check_candidates(block_number)
+
+    def _add_candidates(self, dex: UniswapV2Protocol, from_block: int, to_block: int):
+        events = dex.factory_contract.events.PairCreated.getLogs(
+            fromBlock=from_block, toBlock=to_block)
+        known_addresses = {pool.address for pool in dex.pools}
+        for event in events:
+            address = event.args.pair
+            if address in known_addresses or address in self.pair_manager.removed_pools:
+                continue
+            try:
+                pool = UniV2Pair.from_address(
+                    dex.chain_id, dex.fee, address, dex.abis[PAIR_ABI], self.web3)
+            except Exception as e:
+                log.info(f'Failed to load new pair {address=} ({e})')
+                continue
+            log.info(f'{self}: New pool {pool} on {dex} at block {event.blockNumber}')
+            self.candidates[address] = CandidatePool(pool, dex, event.blockNumber)
+
+    def _check_candidates(self, block_number: int):
+        self.price_table.add_pools(candidate.pool for candidate in self.candidates.values())
+        for address, candidate in list(self.candidates.items()):
+            liquidity = self.get_liquidity_usd(candidate.pool)
+            if liquidity >= self.min_liquidity_usd:
+                del self.candidates[address]
+                self.insert_pool(candidate.pool, candidate.dex)
+            elif block_number - candidate.block_created > MAX_BLOCKS_PENDING_LIQUIDITY:
+                log.info(f'{self}: Dropping {candidate.pool} with US${liquidity:,.0f} liquidity')
+                del self.candidates[address]
+                self.price_table.remove_pools([candidate.pool])
+
+    def get_liquidity_usd(self, pool: LiquidityPool) -> float:
+        """Liquidity of pool, assuming both reserves have the value of its priced reserve with
+        the highest value, or zero if no token of pool has an USD price"""
+        prices = self.price_table.prices
+        return 2 * max(
+            (
+                reserve.amount_in_units * prices[reserve.token]
+                for reserve in pool.reserves
+                if reserve.token in prices
+            ),
+            default=0.0,
+        )
+
+    def insert_pool(self, pool: LiquidityPool, dex: UniswapV2Protocol):
+        """Queue pool to be inserted by pair manager's thread, which owns dexes' pools"""
+        log.info(f'{self}: Queueing {pool} for insertion')
+        self.pair_manager.add_pool(pool, dex, lambda pool_: self._get_arbitrage_pairs(pool_, dex))
+
+    def _get_arbitrage_pairs(
+        self,
+        pool: LiquidityPool,
+        dex: UniswapV2Protocol,
+    ) -> list[ArbitragePairV1]:
+        """Build arbitrage pairs of pool, already appended to its dex's pools"""
+        arbitrage_pairs = [
+            self.get_arbitrage_pair(params)
+            for params in PairManager.get_new_pool_v1_arguments(
+                pool,
+                self.dexes.values(),
+                self.web3,
+                self.price_table,
+                self.max_hops_dex_1,
+                self.self_trade,
+            )
+        ]
+        log.info(f'{self}: Inserting {pool} with {len(arbitrage_pairs)} arbitrage pairs')
+        self._save_pool(pool, dex)
+        return arbitrage_pairs
+
+    def _save_pool(self, pool: LiquidityPool, dex: UniswapV2Protocol):
+        dex_name = next(name for name, dex_ in self.dexes.items() if dex_ is dex)
+        pools_file = pathlib.Path(self.pair_manager.addresses_directory) / POOLS_FILE
+        dict_addresses = json.load(open(pools_file))
+        if pool.address in dict_addresses[dex_name]:
+            return
+        dict_addresses[dex_name].append(pool.address)
+        tmp_pools_file = pools_file.with_suffix('.tmp')
+        with open(tmp_pools_file, 'w') as f:
+            json.dump(dict_addresses, f, indent=4)
+        os.replace(tmp_pools_file, pools_file)
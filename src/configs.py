@@ -10,10 +10,16 @@ CHAIN_ID = int(os.environ['CHAIN_ID'])
 POA_CHAIN = os.getenv('POA_CHAIN') == 'True'
 MULTI_BROADCAST_TRANSACTIONS = os.getenv('MULTI_BROADCAST_TRANSACTIONS') == 'True'
 USE_REMOTE_RCP_CONNECTION = os.getenv('USE_REMOTE_RCP_CONNECTION') == 'True'
+# Continuously select freshest / fastest endpoint, instead of choosing once at startup
+USE_MANAGED_PROVIDER = os.getenv('USE_MANAGED_PROVIDER') == 'True'
+# Unix socket of state daemon (strategies.state_daemon), shared between strategies if set
+STATE_DAEMON_SOCKET = os.getenv('STATE_DAEMON_SOCKET')
 
 # Wallet
 PRIVATE_KEY = os.environ['PRIVATE_KEY']
 ADDRESS = os.environ['ADDRESS']
+# Comma separated keys of accounts allowed to execute strategies besides the owner
+EXECUTOR_PRIVATE_KEYS = [key for key in os.getenv('EXECUTOR_PRIVATE_KEYS', '').split(',') if key]
 
 # Connection params
 CACHE_TTL = float(os.environ['CACHE_TTL'])
@@ -21,14 +27,22 @@ POLL_INTERVAL = float(os.environ['POLL_INTERVAL'])
 
 # Arbitrage params
 STRATEGY = os.getenv('STRATEGY', 'no_strategy')
+USE_POOL_DISCOVERY = os.getenv('USE_POOL_DISCOVERY') == 'True'  # Hot insert newly created pools
+USE_CYCLE_ENGINE = os.getenv('USE_CYCLE_ENGINE') == 'True'  # Find routes on pool graph each block
+# Max arbitrages per transaction, 1 disables batching (needs contract with batch function)
+MAX_BATCH_SIZE = int(os.getenv('MAX_BATCH_SIZE', '1'))
 
 # Debug / optimization
 CACHE_STATS = os.getenv('CACHE_STATS') == 'True'
 CACHE_LOG_LEVEL = os.getenv('CACHE_LOG_LEVEL', 'INFO')
+USE_LOCAL_EVM = os.getenv('USE_LOCAL_EVM') == 'True'  # Dry run transactions in-process
+USE_RAW_RPC = os.getenv('USE_RAW_RPC') == 'True'  # Hot-path calls bypass web3.py (tools.rpc)
 
 # Gas
 BASELINE_GAS_PRICE_PREMIUM = float(os.getenv('BASELINE_GAS_PRICE_PREMIUM', '1.0000000012'))
 MIN_GAS_PRICE = int(os.getenv('MIN_GAS_PRICE', '5000000000'))
+USE_GAS_ORACLE = os.getenv('USE_GAS_ORACLE') == 'True'
+USE_GAS_MODEL = os.getenv('USE_GAS_MODEL') == 'True'  # Learn gas costs from stored receipts
 
 # Testing
 BLOCK = 'latest'
@@ -16,11 +16,15 @@ log = logging.getLogger(__name__)
 MAX_UINT_256 = 2 ** 256 - 1
 
 ERC20_ABI_FILE = 'abis/IERC20.json'
-ERC20_ABI = json.load(open(ERC20_ABI_FILE))
 
 DEFAULT_MAX_SLIPPAGE = 30  # Default maximum slippage for trades in basis points
 
 
+@functools.lru_cache(maxsize=None)
+def get_erc20_abi() -> dict:
+    return json.load(open(ERC20_ABI_FILE))
+
+
 class TradeType(Enum):
     exact_in = 'Exact In'
     exact_out = 'Exact Oout'
@@ -34,14 +38,14 @@ class Token:
         address: str,
         symbol: str = None,
         decimals: int = None,
-        abi: dict = ERC20_ABI,
+        abi: dict = None,
         web3: Web3 = None,
     ):
         self.chain_id = int(chain_id)
         self.address = Web3.toChecksumAddress(address)
         self.decimals = int(decimals) if decimals is not None else None
         self.symbol = symbol
-        self.abi = abi
+        self.abi = get_erc20_abi() if abi is None else abi
         self.contract: Contract = None
 
         if web3 is None:
@@ -282,6 +286,8 @@ class Trade:
 
 
 class LiquidityPool:
+    has_derivatives = False  # Whether pool implements get_amount_{in,out}_derivatives
+
     def __init__(
         self,
         fee: int,
@@ -327,6 +333,32 @@ class LiquidityPool:
     def get_amount_out(self, amount_in: Token, token_out: TokenAmount) -> TokenAmount:
         raise NotImplementedError
 
+    def get_amount_in_derivatives(
+        self,
+        token_in: Token,
+        amount_out: TokenAmount,
+    ) -> tuple[float, float]:
+        """First and second derivatives of amount in with respect to amount out"""
+        raise NotImplementedError
+
+    def get_amount_out_derivatives(
+        self,
+        amount_in: TokenAmount,
+        token_out: Token,
+    ) -> tuple[float, float]:
+        """First and second derivatives of amount out with respect to amount in"""
+        raise NotImplementedError
+
+
+def compose_derivatives(
+    outer: tuple[float, float],
+    inner: tuple[float, float],
+) -> tuple[float, float]:
+    """First and second derivatives of f(g(x)) given those of f at g(x) and of g at x"""
+    f_1, f_2 = outer
+    g_1, g_2 = inner
+    return f_1 * g_1, f_2 * g_1 ** 2 + f_1 * g_2
+
 
 class Route:
     def __init__(
@@ -361,6 +393,34 @@ class Route:
             amount_out = pool.get_amount_in(token_in, amount_out)
         return amount_out
 
+    @property
+    def has_derivatives(self) -> bool:
+        return all(pool.has_derivatives for pool in self.pools)
+
+    def get_amount_out_derivatives(
+        self,
+        amount_in: TokenAmount,
+    ) -> tuple[TokenAmount, float, float]:
+        """Amount out and its first and second derivatives with respect to amount in"""
+        derivatives = (1.0, 0.0)
+        for token_out, pool in zip(self.tokens[1:], self.pools):
+            pool_derivatives = pool.get_amount_out_derivatives(amount_in, token_out)
+            derivatives = compose_derivatives(pool_derivatives, derivatives)
+            amount_in = pool.get_amount_out(amount_in, token_out)
+        return (amount_in, *derivatives)
+
+    def get_amount_in_derivatives(
+        self,
+        amount_out: TokenAmount,
+    ) -> tuple[TokenAmount, float, float]:
+        """Amount in and its first and second derivatives with respect to amount out"""
+        derivatives = (1.0, 0.0)
+        for token_in, pool in zip(reversed(self.tokens[:-1]), reversed(self.pools)):
+            pool_derivatives = pool.get_amount_in_derivatives(token_in, amount_out)
+            derivatives = compose_derivatives(pool_derivatives, derivatives)
+            amount_out = pool.get_amount_in(token_in, amount_out)
+        return (amount_out, *derivatives)
+
 
 class TradePools(Trade):
     def __init__(
@@ -8,12 +8,15 @@ from web3.contract import Contract
 
 from exceptions import InsufficientLiquidity
 
-from .base import LiquidityPool, Route, Token, TokenAmount, TradePools, TradeType
+from .base import (LiquidityPool, Route, Token, TokenAmount, TradePools, TradeType,
+                   compose_derivatives)
 
 log = logging.getLogger(__name__)
 
 
 class LiquidityPair(LiquidityPool):
+    has_derivatives = True
+
     def __init__(self, reserves: tuple[TokenAmount, TokenAmount], fee: int, *, contract: Contract):
         """Abstract class representing all liquidity pools with 2 different assets"""
         # Follow Uniswap convension of tokens sorted by address
@@ -104,6 +107,39 @@ class LiquidityPair(LiquidityPool):
         amount_in = numerator // denominator + 1
         return TokenAmount(reserve_in.token, amount_in)
 
+    def get_amount_out_derivatives(
+        self,
+        amount_in: TokenAmount,
+        token_out: Token = None,
+    ) -> tuple[float, float]:
+        reserve_in, reserve_out = self._get_in_out_reserves(amount_in=amount_in)
+        gamma = (10_000 - self.fee) / 10_000
+        reserve_in_after = reserve_in.amount + gamma * amount_in.amount
+
+        first = reserve_out.amount * reserve_in.amount * gamma / reserve_in_after ** 2
+        second = -2 * first * gamma / reserve_in_after
+        return first, second
+
+    def get_amount_in_derivatives(
+        self,
+        arg_0: Union[Token, TokenAmount],
+        arg_1: TokenAmount = None,
+    ) -> tuple[float, float]:
+        amount_out = arg_0 if arg_1 is None else arg_1
+        reserve_in, reserve_out = self._get_in_out_reserves(amount_out=amount_out)
+        gamma = (10_000 - self.fee) / 10_000
+        reserve_out_after = reserve_out.amount - amount_out.amount
+
+        first = reserve_in.amount * reserve_out.amount / (gamma * reserve_out_after ** 2)
+        second = 2 * first / reserve_out_after
+        return first, second
+
+    def get_weighted_params(self, token_in: Token) -> tuple[int, int, float, float]:
+        """Parameters of pool as a weighted pair: reserve_in, reserve_out,
+        weight_in / weight_out and (1 - fee)"""
+        reserve_in, reserve_out = self._get_in_out_reserves(amount_in=TokenAmount(token_in, 0))
+        return reserve_in.amount, reserve_out.amount, 1.0, (10_000 - self.fee) / 10_000
+
 
 class RoutePairs(Route):
     def __init__(
@@ -138,6 +174,28 @@ class RoutePairs(Route):
             amount_out = pool.get_amount_in(amount_out)
         return amount_out
 
+    def get_amount_out_derivatives(
+        self,
+        amount_in: TokenAmount,
+    ) -> tuple[TokenAmount, float, float]:
+        derivatives = (1.0, 0.0)
+        for pool in self.pools:
+            derivatives = compose_derivatives(
+                pool.get_amount_out_derivatives(amount_in), derivatives)
+            amount_in = pool.get_amount_out(amount_in)
+        return (amount_in, *derivatives)
+
+    def get_amount_in_derivatives(
+        self,
+        amount_out: TokenAmount,
+    ) -> tuple[TokenAmount, float, float]:
+        derivatives = (1.0, 0.0)
+        for pool in reversed(self.pools):
+            derivatives = compose_derivatives(
+                pool.get_amount_in_derivatives(amount_out), derivatives)
+            amount_out = pool.get_amount_in(amount_out)
+        return (amount_out, *derivatives)
+
 
 class TradePairs(TradePools):
     def __init__(
@@ -7,6 +7,7 @@ from web3.contract import Contract
 
 import configs
 from core import LiquidityPair, LiquidityPool, Token, TokenAmount, TradePairs
+from tools.state import get_pool_reserves, get_pool_tokens
 
 
 class DexProtocol:
@@ -122,15 +123,25 @@ class UniV2PairInitMixin:
         if web3 is None:
             web3 = contract.web3
 
-        token_0_address = contract.functions.token0().call(block_identifier=configs.BLOCK)
-        token_1_address = contract.functions.token1().call(block_identifier=configs.BLOCK)
-        reserve_0, reserve_1, last_timestamp = \
-            contract.functions.getReserves().call(block_identifier=configs.BLOCK)
-
-        reserves = (
-            TokenAmount(Token(chain_id, token_0_address, web3=web3), reserve_0),
-            TokenAmount(Token(chain_id, token_1_address, web3=web3), reserve_1)
-        )
+        if (
+            (tokens_data := get_pool_tokens(contract.address)) is not None
+            and (pool_reserves := get_pool_reserves(contract.address)) is not None
+        ):
+            # Pool known by state daemon, no need to call node
+            reserve_0, reserve_1, last_timestamp = pool_reserves
+            token_0, token_1 = (
+                Token(chain_id, address, symbol, decimals, web3=web3)
+                for address, symbol, decimals in tokens_data
+            )
+        else:
+            token_0_address = contract.functions.token0().call(block_identifier=configs.BLOCK)
+            token_1_address = contract.functions.token1().call(block_identifier=configs.BLOCK)
+            reserve_0, reserve_1, last_timestamp = \
+                contract.functions.getReserves().call(block_identifier=configs.BLOCK)
+            token_0 = Token(chain_id, token_0_address, web3=web3)
+            token_1 = Token(chain_id, token_1_address, web3=web3)
+
+        reserves = (TokenAmount(token_0, reserve_0), TokenAmount(token_1, reserve_1))
         fee: int = fee(contract.address) if callable(fee) else fee
 
         return cls(reserves, fee, contract=contract)
@@ -8,6 +8,7 @@ from web3.exceptions import BadFunctionCallOutput
 import configs
 from core import LiquidityPool, Token, TokenAmount, Trade
 from core.base import TradeType
+from tools import rpc
 from tools.cache import ttl_cache
 
 LENDING_PRECISION = 10 ** 18
@@ -19,6 +20,8 @@ N_POOLS_CACHE = 100  # Must be at least equal to number of pools in strategy
 
 
 class CurvePool(LiquidityPool):
+    has_derivatives = True
+
     def __init__(
         self,
         name: str,
@@ -70,6 +73,46 @@ class CurvePool(LiquidityPool):
         )
         return TokenAmount(token_out, amount_out)
 
+    def get_amount_out_derivatives(
+        self,
+        amount_in: TokenAmount,
+        token_out: Token,
+    ) -> tuple[float, float]:
+        return self._get_dy_derivatives(
+            self.tokens.index(amount_in.token),
+            self.tokens.index(token_out),
+            amount_in.amount
+        )
+
+    def _get_dy_derivatives(self, i: int, j: int, dx: int) -> tuple[float, float]:
+        """Derivatives of `_get_dy` by implicit differentiation of the StableSwap invariant
+        F(x, y) = Ann * S + D - Ann * D - D ** (n + 1) / (n ** n * prod(xp)) = 0, with D and
+        balances of other coins constant"""
+        _xp = self._xp()
+        amp = self._A()
+        scale_in = self._rates[i] / PRECISION
+        scale_out = PRECISION / self._rates[j] * (FEE_DENOMINATOR - self.fee) / FEE_DENOMINATOR
+
+        x = _xp[i] + (int(dx) * self._rates[i] // PRECISION)
+        y = self._get_y(i, j, x, _xp, amp)
+        D = self._get_D(_xp, amp)
+        Ann = amp * self.n_coins
+        xp_after = [x if k == i else y if k == j else _x for k, _x in enumerate(_xp)]
+        P = D
+        for _x in xp_after:
+            P = P * D / (_x * self.n_coins)  # P = D ** (n + 1) / (n ** n * prod(xp))
+
+        F_x = Ann + P / x
+        F_y = Ann + P / y
+        F_xx = -2 * P / x ** 2
+        F_yy = -2 * P / y ** 2
+        F_xy = -P / (x * y)
+        dy_dx = -F_x / F_y
+        d2y_dx2 = -(F_xx + 2 * F_xy * dy_dx + F_yy * dy_dx ** 2) / F_y
+
+        # dy = (xp[j] - y) * scale_out, with y evaluated at x = xp[i] + dx * scale_in
+        return -dy_dx * scale_in * scale_out, -d2y_dx2 * scale_in ** 2 * scale_out
+
     # Internal functions based from curve's 3pool contract:
     # https://github.com/curvefi/curve-contract/blob/master/contracts/pools/3pool/StableSwap3Pool.vy
 
@@ -79,6 +122,8 @@ class CurvePool(LiquidityPool):
 
     @ttl_cache(N_POOLS_CACHE)
     def _get_balance(self) -> list[int]:
+        if configs.USE_RAW_RPC:
+            return rpc.get_balances(self.contract.address, self.n_coins, self.contract.web3)
         return [
             self.contract.functions.balances(i).call(block_identifier=configs.BLOCK)
             for i in range(self.n_coins)
@@ -7,7 +7,9 @@ from web3.contract import Contract
 
 import configs
 from core import LiquidityPair, TokenAmount
+from tools import rpc
 from tools.cache import ttl_cache
+from tools.state import get_pool_reserves
 
 from ..base import UniV2PairInitMixin
 
@@ -59,4 +61,8 @@ class UniV2Pair(LiquidityPair, UniV2PairInitMixin):
 
     @ttl_cache(N_POOLS_CACHE)
     def _get_reserves(self):
+        if (reserves := get_pool_reserves(self.contract.address)) is not None:
+            return reserves
+        if configs.USE_RAW_RPC:
+            return rpc.get_reserves(self.contract.address, self.contract.web3)
         return self.contract.functions.getReserves().call(block_identifier=configs.BLOCK)
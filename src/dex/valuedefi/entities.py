@@ -1,10 +1,14 @@
 from __future__ import annotations
 
+from typing import Union
+
 from web3.contract import Contract
 from web3 import Web3
 
-from core import LiquidityPair, TokenAmount
+from core import LiquidityPair, Token, TokenAmount
+from tools import rpc
 from tools.cache import ttl_cache
+from tools.state import get_pool_reserves
 
 import configs
 from ..base import UniV2PairInitMixin
@@ -52,6 +56,10 @@ class ValueDefiPair(LiquidityPair, UniV2PairInitMixin):
 
     @ttl_cache(N_POOLS_CACHE)
     def _get_reserves(self):
+        if (reserves := get_pool_reserves(self.contract.address)) is not None:
+            return reserves
+        if configs.USE_RAW_RPC:
+            return rpc.get_reserves(self.contract.address, self.contract.web3)
         return self.contract.functions.getReserves().call(block_identifier=configs.BLOCK)
 
     def _get_in_out_weights(
@@ -94,3 +102,49 @@ class ValueDefiPair(LiquidityPair, UniV2PairInitMixin):
 
         # Use abs(base) to allow for negative values during optimization tests
         return reserve_in * ((abs(base) ** power - 1) * fee_impact) + 1
+
+    def get_amount_out_derivatives(
+        self,
+        amount_in: TokenAmount,
+        token_out: Token = None,
+    ) -> tuple[float, float]:
+        if self.weights == (50, 50):
+            return super().get_amount_out_derivatives(amount_in)
+        reserve_in, reserve_out = self._get_in_out_reserves(amount_in=amount_in)
+        weight_in, weight_out = self._get_in_out_weights(amount_in=amount_in)
+
+        # amount_out = reserve_out * (1 - base ** power)
+        gamma = (10_000 - self.fee) / 10_000
+        base = reserve_in.amount / (reserve_in.amount + gamma * amount_in.amount)
+        power = weight_in / weight_out
+
+        first = reserve_out.amount * power * gamma * abs(base) ** (power + 1) / reserve_in.amount
+        second = -first * (power + 1) * gamma * base / reserve_in.amount
+        return first, second
+
+    def get_amount_in_derivatives(
+        self,
+        arg_0: Union[Token, TokenAmount],
+        arg_1: TokenAmount = None,
+    ) -> tuple[float, float]:
+        if self.weights == (50, 50):
+            return super().get_amount_in_derivatives(arg_0, arg_1)
+        amount_out = arg_0 if arg_1 is None else arg_1
+        reserve_in, reserve_out = self._get_in_out_reserves(amount_out=amount_out)
+        weight_in, weight_out = self._get_in_out_weights(amount_out=amount_out)
+
+        # amount_in = reserve_in * (base ** power - 1) / gamma
+        gamma = (10_000 - self.fee) / 10_000
+        base = reserve_out.amount / (reserve_out.amount - amount_out.amount)
+        power = weight_out / weight_in
+
+        first = reserve_in.amount * power * abs(base) ** (power + 1) / (gamma * reserve_out.amount)
+        second = first * (power + 1) * base / reserve_out.amount
+        return first, second
+
+    def get_weighted_params(self, token_in: Token) -> tuple[int, int, float, float]:
+        amount_in = TokenAmount(token_in, 0)
+        reserve_in, reserve_out = self._get_in_out_reserves(amount_in=amount_in)
+        weight_in, weight_out = self._get_in_out_weights(amount_in=amount_in)
+        return reserve_in.amount, reserve_out.amount, weight_in / weight_out, \
+            (10_000 - self.fee) / 10_000
@@ -1,9 +1,12 @@
 # Runs housekeeping functions such as withdrawing funds from contracts
+import asyncio
 import importlib
 import json
 import logging
 import os
 import time
+from collections import deque
+from functools import lru_cache
 from typing import Iterable
 
 from web3 import Web3
@@ -15,7 +18,6 @@ import tools
 from arbitrage import PairManager
 from core import LiquidityPair, Token, TokenAmount
 from dex import DexProtocol
-from exceptions import InsufficientLiquidity
 
 log = logging.getLogger(__name__)
 
@@ -35,78 +37,143 @@ CHI_CONTRACT_TOP_UP = 900
 CHI_MINT_PRICE = 181530991848198  # Based on minting 600 CHI at 5.000000005 Gwei
 CHI_MINT_MAX_GAS = 34_000_000
 
-ERC20_ABI = json.load(open('abis/IERC20.json'))
-WETH_ABI = json.load(open('abis/IWETH9.json'))
-CHI_ABI = json.load(open('abis/ICHI.json'))
+WETH_ABI_FILE = 'abis/IWETH9.json'
+ADDRESSES_FILE = 'addresses/strategies/housekeeper.json'
 WRAPPED_CURRENCY_TOKEN = tools.price.get_wrapped_currency_token()
 NATIVE_CURRENCY_SYMBOL = tools.price.get_native_token_symbol()
-with open('addresses/strategies/housekeeper.json') as f:
-    addresses = json.load(f)[str(configs.CHAIN_ID)]
-    STABLE_RESERVE_TOKEN_DATA = addresses['stable_reserve_token']
-    CHI_TOKEN_DATA = addresses['chi_token']
 
 PREFERED_TOKENS_FILE = 'addresses/preferred_tokens.json'
 TOKEN_MULTIPLIER_WEIGHT = 0.2
-TOKEN_MULTIPLIERS = {
-    Token(configs.CHAIN_ID, **data['token']): 1 + data['weight'] * TOKEN_MULTIPLIER_WEIGHT
-    for data in json.load(open(PREFERED_TOKENS_FILE))[str(configs.CHAIN_ID)]
-}
 
 STRATEGIES_RESERVES = {
     'pcs_pcs2_v3': {WRAPPED_CURRENCY_TOKEN: 200 * 10 ** 18},  # 200 BNB for w-swaps
 }
 
+_event_loop: asyncio.AbstractEventLoop = None
+
+
+@lru_cache(maxsize=None)
+def _get_weth_abi() -> dict:
+    return json.load(open(WETH_ABI_FILE))
+
+
+@lru_cache(maxsize=None)
+def _get_addresses() -> dict:
+    return json.load(open(ADDRESSES_FILE))[str(configs.CHAIN_ID)]
+
+
+@lru_cache(maxsize=None)
+def _get_token_multipliers() -> dict[Token, float]:
+    return {
+        Token(configs.CHAIN_ID, **data['token']): 1 + data['weight'] * TOKEN_MULTIPLIER_WEIGHT
+        for data in json.load(open(PREFERED_TOKENS_FILE))[str(configs.CHAIN_ID)]
+    }
+
+
+def get_address_balances(address: str, tokens: list[Token], web3: Web3) -> list[TokenAmount]:
+    """Balances of address for all tokens, read in a single batch of calls"""
+    amounts = tools.rpc.get_token_balances(address, [token.address for token in tokens], web3)
+    return [TokenAmount(token, amount) for token, amount in zip(tokens, amounts)]
+
+
+def _run_async(coroutine):
+    """Run coroutine in an event loop kept for the life of the process, so that its pooled http
+    clients are reused by all runs"""
+    global _event_loop
+    if _event_loop is None:
+        _event_loop = asyncio.new_event_loop()
+        tools.process.register_exit_handle(_close_event_loop)
+    return _event_loop.run_until_complete(coroutine)
+
 
-def get_address_balances(address: str, tokens: list[Token]) -> list[TokenAmount]:
-    amounts = []
-    for token in tokens:
-        amount = token.contract.functions.balanceOf(address).call(block_identifier=configs.BLOCK)
-        amounts.append(TokenAmount(token, amount))
-    return amounts
+def _close_event_loop():
+    if _event_loop is None or _event_loop.is_closed() or _event_loop.is_running():
+        return
+    _event_loop.run_until_complete(tools.http.close_async_clients())
+    _event_loop.close()
+
+
+async def _get_quotes_native_currency(token_amounts: list[TokenAmount]) -> list[int]:
+    gas_price = tools.price.get_gas_price()
+    return await asyncio.gather(*(
+        tools.exchange.get_quote_1inch_async(token_amount, gas_price=gas_price)
+        for token_amount in token_amounts
+    ))
 
 
 def get_address_balances_in_native_currency(
     address: str,
     tokens: list[Token],
+    web3: Web3,
 ) -> list[tuple[TokenAmount, float]]:
-    balances = []
-    for token_amount in get_address_balances(address, tokens):
+    balances = get_address_balances(address, tokens, web3)
+    quote_amounts = [
+        token_amount
+        for token_amount in balances
+        if token_amount.amount and token_amount.token != WRAPPED_CURRENCY_TOKEN
+    ]
+    quotes = iter(_run_async(_get_quotes_native_currency(quote_amounts)))
+    native_token_decimals = tools.price.get_native_token_decimals()
+    ethers_amounts = []
+    for token_amount in balances:
         if not token_amount.amount:
             ethers_amount = 0.0
         elif token_amount.token == WRAPPED_CURRENCY_TOKEN:
             ethers_amount = token_amount.amount_in_units
         else:
-            quote_1inch = tools.exchange.get_quote_1inch(token_amount)
-            ethers_amount = quote_1inch / 10 ** tools.price.get_native_token_decimals()
-        balances.append((token_amount, ethers_amount))
-    return balances
-
+            ethers_amount = next(quotes) / 10 ** native_token_decimals
+        ethers_amounts.append((token_amount, ethers_amount))
+    return ethers_amounts
+
+
+class PriceChanges:
+    def __init__(
+        self,
+        pools: Iterable[LiquidityPair],
+        web3: Web3,
+        n_blocks: int = N_BLOCKS_PRICE_CHANGE,
+    ):
+        """Price changes of tokens over the last `n_blocks`, from a price table shared by all
+        strategies. Prices are recorded on each update, so that only the first update needs to
+        simulate a past block, to compute reference prices"""
+        self.pools = list(pools)
+        self.web3 = web3
+        self.n_blocks = n_blocks
+        self.price_table = tools.price.UsdPriceTable(self.pools, web3)
+        self.history: deque[tuple[int, dict[Token, float]]] = deque()
 
-def get_price_changes(
-    tokens: list[Token],
-    pools: list[LiquidityPair],
-    web3: Web3
-) -> list[float]:
-    with tools.simulation.simulate_block(web3.eth.block_number - N_BLOCKS_PRICE_CHANGE):
-        prices_24h = []
-        for token in tokens:
-            try:
-                prices_24h.append(tools.price.get_price_usd(token, pools, web3))
-            except BadFunctionCallOutput:  # In case token/pair didn't exist 24h ago
-                prices_24h.append(0)
-            except InsufficientLiquidity:  # Token lost liquidity
-                prices_24h.append(0)
-
-    prices_now = []
-    for price_24h, token in zip(prices_24h, tokens):
-        if price_24h == 0:
-            prices_now.append(0)
-        else:
-            prices_now.append(tools.price.get_price_usd(token, pools, web3))
-    return [
-        (price_now / price_24h - 1) if price_24h != 0 else DEFAULT_PRICE_CHANGE
-        for price_now, price_24h in zip(prices_now, prices_24h)
-    ]
+    def __repr__(self):
+        return f'{self.__class__.__name__}(n_records={len(self.history)})'
+
+    def update(self):
+        block_number = self.web3.eth.block_number
+        if not self.history:
+            self.history.append(self._get_past_prices(block_number - self.n_blocks))
+        self.history.append((block_number, self.price_table.prices))
+        while len(self.history) > 1 and self.history[1][0] <= block_number - self.n_blocks:
+            self.history.popleft()
+
+    def _get_past_prices(self, block_number: int) -> tuple[int, dict[Token, float]]:
+        with tools.simulation.simulate_block(block_number):
+            existing_pools = []
+            for pool in self.pools:
+                try:
+                    pool.reserves
+                except BadFunctionCallOutput:  # Pool didn't exist at block
+                    continue
+                existing_pools.append(pool)
+            prices = tools.price.UsdPriceTable(existing_pools, self.web3).prices
+        return block_number, prices
+
+    def get_price_changes(self, tokens: Iterable[Token]) -> list[float]:
+        """Price changes of tokens, or DEFAULT_PRICE_CHANGE if token had no price"""
+        _, prices_past = self.history[0]
+        _, prices_now = self.history[-1]
+        return [
+            prices_now.get(token, 0) / prices_past[token] - 1
+            if prices_past.get(token, 0) != 0 else DEFAULT_PRICE_CHANGE
+            for token in tokens
+        ]
 
 
 class Strategy:
@@ -131,14 +198,15 @@ class Strategy:
             return TokenAmount(token_amount.token, 0), 0.0
         return adjusted_amount, native_amount * adjusted_amount.amount / token_amount.amount
 
-    def withdraw_tokens(self):
-        balances = get_address_balances_in_native_currency(self.contract.address, self.tokens)
-        price_changes = get_price_changes(self.tokens, self.pools, self.web3)
+    def withdraw_tokens(self, price_changes: PriceChanges):
+        balances = get_address_balances_in_native_currency(
+            self.contract.address, self.tokens, self.web3)
+        price_changes = price_changes.get_price_changes(self.tokens)
         amounts_withdraw = []
         for (token_amount, native_amount), price_change in zip(balances, price_changes):
             token_amount, native_amount = self._adjust_for_reserve(token_amount, native_amount)
             price_impact_on_withdraw = 1 + price_change * PRICE_CHANGE_WITHDRAW_IMPACT
-            token_multiplier = TOKEN_MULTIPLIERS.get(token_amount.token, 1.0)
+            token_multiplier = _get_token_multipliers().get(token_amount.token, 1.0)
             min_withdraw = MIN_ETHERS_WITHDRAW * price_impact_on_withdraw * token_multiplier
             if native_amount > min_withdraw * max(min_withdraw, 0):
                 amounts_withdraw.append(token_amount)
@@ -213,7 +281,7 @@ def convert_amounts_native(amounts_convert: Iterable[TokenAmount], web3: Web3):
     for token_amount in amounts_convert:
         log.info(f'Converting {token_amount}')
         if token_amount.token == WRAPPED_CURRENCY_TOKEN:  # WBNB / WETH
-            contract = web3.eth.contract(token_amount.token.address, abi=WETH_ABI)
+            contract = web3.eth.contract(token_amount.token.address, abi=_get_weth_abi())
             tx_hash = tools.transaction.sign_and_send_contract_tx(
                 contract.functions.withdraw,
                 token_amount.amount,
@@ -247,7 +315,7 @@ def convert_amounts_stable(
 
 
 def convert_amounts(tokens: Iterable[Token], stable_reserve_token: Token, web3: Web3):
-    balances = get_address_balances_in_native_currency(configs.ADDRESS, tokens)
+    balances = get_address_balances_in_native_currency(configs.ADDRESS, list(tokens), web3)
     amounts_convert = [
         token_amount
         for token_amount, native_amount in balances
@@ -280,14 +348,19 @@ def get_strategy(strategy_name: str, web3: Web3):
 
 def run():
     web3 = tools.w3.get_web3(verbose=True)
-    stable_reserve_token = Token(chain_id=configs.CHAIN_ID, web3=web3, **STABLE_RESERVE_TOKEN_DATA)
-    chi_token = Token(chain_id=configs.CHAIN_ID, web3=web3, **CHI_TOKEN_DATA)
+    addresses = _get_addresses()
+    stable_reserve_token = Token(
+        chain_id=configs.CHAIN_ID, web3=web3, **addresses['stable_reserve_token'])
+    chi_token = Token(chain_id=configs.CHAIN_ID, web3=web3, **addresses['chi_token'])
 
     strategies = [get_strategy(name, web3) for name in RUNNING_STRATEGIES]
     all_tokens = {token for strategy in strategies for token in strategy.tokens}
+    price_changes = PriceChanges(
+        {pool for strategy in strategies for pool in strategy.pools}, web3)
     while True:
+        price_changes.update()
         for strategy in strategies:
-            strategy.withdraw_tokens()
+            strategy.withdraw_tokens(price_changes)
             strategy.top_up_chi(chi_token)
         convert_amounts(all_tokens, stable_reserve_token, web3)
 
@@ -1,20 +1,23 @@
 # Pancakeswap (PCS) x PancakeswapV2 (PCS2)
 
 import logging
+from functools import partial
 from typing import Iterable, Union
 
 from web3 import Web3
 from web3.contract import Contract
 
 import arbitrage
+import configs
 import tools
-from arbitrage import ArbitragePairV1, PairManager
+from arbitrage import ArbitragePairV1, CycleEngine, PairManager, PoolDiscovery
 from dex import MDex, PancakeswapDex, PancakeswapDexV2, ValueDefiSwapDex
 
 log = logging.getLogger(__name__)
 
 # Strategy parameters
 MAX_HOPS_DEX_1 = 2
+MAX_HOPS_DEX_1_CYCLE_ENGINE = 1  # Longer routes are found by cycle engine when enabled
 SELF_TRADE = True
 DEX_PROTOCOLS = {
     'pcs_dex': PancakeswapDex,
@@ -33,6 +36,8 @@ GAS_COST_FLASH_SWAP = 137_392.4
 GAS_INCREASE_WITH_HOP = 0.349470567513196
 GAS_SHARE_OF_PROFIT = 0.26
 MAX_GAS_MULTIPLIER = 7
+BATCH_BASE_GAS_COST = 50_000  # Transaction base cost, CHI burn and batch call overhead
+MAX_AMOUNT_ROUNDING_ERROR = 0.001  # Rounding of amount_last allowed to save calldata gas
 
 # Created with notebooks/strageties/pcs_pcs2_v1.ipynb (2021-05-01)
 ADDRESS_DIRECTORY = 'strategy_files/pcs_pcs2_v1'
@@ -46,7 +51,16 @@ class MultiPair(ArbitragePairV1):
 
         if not self.execute_w_swap:
             return round(GAS_COST_FLASH_SWAP * gas_cost_multiplier)
-        return round(GAS_COST_W_SWAP * gas_cost_multiplier)
+        return round(GAS_COST_W_SWAP * gas_cost_multiplier) - self.calldata_gas_saved
+
+    def _get_calldata_gas_saved(self, amount_last: int) -> int:
+        dex_1 = DEX_PROTOCOL_CODES[type(self.dex_1)]
+        _, exp, mant = arbitrage.decompose_amount_v2(amount_last)
+        return (
+            arbitrage.encode_data.get_amount_calldata_gas_v2(exp, mant, dex_1)
+            - arbitrage.encode_data.get_amount_calldata_gas_v2(
+                self._amount_last_exp, self._amount_last_mant, dex_1)
+        )
 
     def _get_contract_function(self):
         if not self.execute_w_swap:
@@ -69,6 +83,25 @@ class MultiPair(ArbitragePairV1):
             'data1': data1,
         }
 
+    def _get_batch_contract_function(self):
+        return self.contract.functions.swapBatch_SYr
+
+    def _get_batch_data(self) -> tuple[bytes, bytes]:
+        return arbitrage.encode_data.encode_data_v2(
+            DEX_PROTOCOL_CODES[type(self.dex_0)],
+            DEX_PROTOCOL_CODES[type(self.dex_1)],
+            self._amount_last_exp,
+            self._amount_last_mant,
+            self.route_0.pools + self.route_1.pools,
+            self.token_first,
+            self.token_last,
+        )
+
+    def _get_batch_gas_cost(self) -> int:
+        num_hops_extra_hops = len(self.trade_1.route.pools) - 1
+        gas_cost_multiplier = 1 + GAS_INCREASE_WITH_HOP * num_hops_extra_hops
+        return round(GAS_COST_W_SWAP * gas_cost_multiplier) - BATCH_BASE_GAS_COST
+
 
 def get_share_of_profit(params: dict):
     reduced_gas_share_pools = {
@@ -83,26 +116,38 @@ def get_share_of_profit(params: dict):
     return GAS_SHARE_OF_PROFIT
 
 
+def get_arbitrage_pair(params: dict, contract: Contract) -> MultiPair:
+    return MultiPair(
+        **params,
+        contract=contract,
+        gas_share_of_profit=get_share_of_profit(params),
+        max_gas_multiplier=MAX_GAS_MULTIPLIER,
+        decomposer_function=partial(
+            arbitrage.decompose_amount_v2_gas_optimal,
+            max_rounding_error=MAX_AMOUNT_ROUNDING_ERROR,
+            dex_1=DEX_PROTOCOL_CODES[type(params['dex_1'])],
+        ),
+        batch_available=True,
+        batch_base_gas_cost=BATCH_BASE_GAS_COST,
+    )
+
+
 def load_arbitrage_pairs(
     dexes: Iterable[Union[PancakeswapDex, PancakeswapDexV2]],
     contract: Contract,
     web3: Web3,
     load_low_liquidity: bool = False,
+    max_hops_dex_1: int = MAX_HOPS_DEX_1,
 ) -> list[MultiPair]:
     return [
-        MultiPair(
-            **params,
-            contract=contract,
-            gas_share_of_profit=get_share_of_profit(params),
-            max_gas_multiplier=MAX_GAS_MULTIPLIER,
-            decomposer_function=arbitrage.decompose_amount_v2,
-        )
+        get_arbitrage_pair(params, contract)
         for params in PairManager.get_v1_pool_arguments(
             dexes,
             web3,
-            MAX_HOPS_DEX_1,
+            max_hops_dex_1,
             SELF_TRADE,
             load_low_liquidity,
+            cache_directory=ADDRESS_DIRECTORY,
         )
     ]
 
@@ -111,9 +156,33 @@ def run():
     web3 = tools.w3.get_web3(verbose=True)
     dict_dex = PairManager.load_dex_protocols(ADDRESS_DIRECTORY, DEX_PROTOCOLS, web3)
     contract = tools.transaction.load_contract(CONTRACT_DATA_FILEPATH)
-    arbitrage_pairs = load_arbitrage_pairs(dict_dex.values(), contract, web3)
-    pair_manager = PairManager(ADDRESS_DIRECTORY, arbitrage_pairs, web3)
+    max_hops_dex_1 = MAX_HOPS_DEX_1_CYCLE_ENGINE if configs.USE_CYCLE_ENGINE else MAX_HOPS_DEX_1
+    arbitrage_pairs = load_arbitrage_pairs(
+        dict_dex.values(), contract, web3, max_hops_dex_1=max_hops_dex_1)
+    pair_manager = PairManager(
+        ADDRESS_DIRECTORY, arbitrage_pairs, web3, max_batch_size=configs.MAX_BATCH_SIZE)
+    cycle_engine = None
+    if configs.USE_CYCLE_ENGINE:
+        cycle_engine = CycleEngine(
+            pair_manager,
+            dict_dex.values(),
+            partial(get_arbitrage_pair, contract=contract),
+            web3,
+            SELF_TRADE,
+            max_cycle_length=MAX_HOPS_DEX_1 + 1,
+        )
+    if configs.USE_POOL_DISCOVERY:
+        PoolDiscovery(
+            pair_manager,
+            dict_dex,
+            partial(get_arbitrage_pair, contract=contract),
+            web3,
+            MAX_HOPS_DEX_1,
+            SELF_TRADE,
+        ).start()
     listener = tools.w3.BlockListener(web3)
     for block_number in listener.wait_for_new_blocks(update_block_config=True):
         tools.cache.clear_caches()
+        if cycle_engine is not None:
+            cycle_engine.update(block_number)
         pair_manager.update_and_execute(block_number)
@@ -159,7 +159,7 @@ class ArbitragePair:
         if not self._is_running:
             return False
         try:
-            receipt = self.web3.eth.getTransactionReceipt(self._transaction_hash)
+            receipt = tools.transaction.get_transaction_receipt(self._transaction_hash, self.web3)
         except TransactionNotFound:
             log.info(f'Transaction {self._transaction_hash} not found in node')
             return True
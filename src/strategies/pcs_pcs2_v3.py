@@ -1,20 +1,23 @@
 # Pancakeswap (PCS) x PancakeswapV2 (PCS2)
 
 import logging
+from functools import partial
 from typing import Iterable, Union
 
 from web3 import Web3
 from web3.contract import Contract
 
 import arbitrage
+import configs
 import tools
-from arbitrage import ArbitragePairV1, PairManager
+from arbitrage import ArbitragePairV1, CycleEngine, PairManager, PoolDiscovery
 from dex import PancakeswapDex, PancakeswapDexV2
 
 log = logging.getLogger(__name__)
 
 # Strategy parameters
 MAX_HOPS_DEX_1 = 2
+MAX_HOPS_DEX_1_CYCLE_ENGINE = 1  # Longer routes are found by cycle engine when enabled
 SELF_TRADE = True
 DEX_PROTOCOLS = {
     'pcs_dex': PancakeswapDex,
@@ -81,26 +84,32 @@ def get_share_of_profit(params: dict):
     return GAS_SHARE_OF_PROFIT
 
 
+def get_arbitrage_pair(params: dict, contract: Contract) -> PcsPcs2Pair:
+    return PcsPcs2Pair(
+        **params,
+        contract=contract,
+        gas_share_of_profit=get_share_of_profit(params),
+        max_gas_multiplier=MAX_GAS_MULTIPLIER,
+        w_swap_available=W_SWAP_AVAILABLE,
+    )
+
+
 def load_arbitrage_pairs(
     dexes: Iterable[Union[PancakeswapDex, PancakeswapDexV2]],
     contract: Contract,
     web3: Web3,
     load_low_liquidity: bool = False,
+    max_hops_dex_1: int = MAX_HOPS_DEX_1,
 ) -> list[PcsPcs2Pair]:
     return [
-        PcsPcs2Pair(
-            **params,
-            contract=contract,
-            gas_share_of_profit=get_share_of_profit(params),
-            max_gas_multiplier=MAX_GAS_MULTIPLIER,
-            w_swap_available=W_SWAP_AVAILABLE,
-        )
+        get_arbitrage_pair(params, contract)
         for params in PairManager.get_v1_pool_arguments(
             dexes,
             web3,
-            MAX_HOPS_DEX_1,
+            max_hops_dex_1,
             SELF_TRADE,
             load_low_liquidity,
+            cache_directory=ADDRESS_DIRECTORY,
         )
     ]
 
@@ -109,9 +118,32 @@ def run():
     web3 = tools.w3.get_web3(verbose=True)
     dict_dex = PairManager.load_dex_protocols(ADDRESS_DIRECTORY, DEX_PROTOCOLS, web3)
     contract = tools.transaction.load_contract(CONTRACT_DATA_FILEPATH)
-    arbitrage_pairs = load_arbitrage_pairs(dict_dex.values(), contract, web3)
+    max_hops_dex_1 = MAX_HOPS_DEX_1_CYCLE_ENGINE if configs.USE_CYCLE_ENGINE else MAX_HOPS_DEX_1
+    arbitrage_pairs = load_arbitrage_pairs(
+        dict_dex.values(), contract, web3, max_hops_dex_1=max_hops_dex_1)
     pair_manager = PairManager(ADDRESS_DIRECTORY, arbitrage_pairs, web3)
+    cycle_engine = None
+    if configs.USE_CYCLE_ENGINE:
+        cycle_engine = CycleEngine(
+            pair_manager,
+            dict_dex.values(),
+            partial(get_arbitrage_pair, contract=contract),
+            web3,
+            SELF_TRADE,
+            max_cycle_length=MAX_HOPS_DEX_1 + 1,
+        )
+    if configs.USE_POOL_DISCOVERY:
+        PoolDiscovery(
+            pair_manager,
+            dict_dex,
+            partial(get_arbitrage_pair, contract=contract),
+            web3,
+            MAX_HOPS_DEX_1,
+            SELF_TRADE,
+        ).start()
     listener = tools.w3.BlockListener(web3)
     for block_number in listener.wait_for_new_blocks(update_block_config=True):
         tools.cache.clear_caches()
+        if cycle_engine is not None:
+            cycle_engine.update(block_number)
         pair_manager.update_and_execute(block_number)
@@ -0,0 +1,150 @@
+# Shared reserves state: reads reserves of the pools of all strategies once per block, in a single
+# JSON-RPC batch, and serves them to strategy containers over a Unix socket (see tools.state)
+import json
+import logging
+import os
+import pathlib
+from concurrent import futures
+from threading import Lock, Thread
+
+from web3 import Web3
+
+import configs
+import tools
+from core import Token
+from dex.uniswap_v2.uniswap_v2_protocol import PAIR_ABI
+
+log = logging.getLogger(__name__)
+
+STRATEGY_FILES_DIRECTORY = 'strategy_files'
+STATE_DIRECTORY = 'strategy_files/state_daemon'
+POOLS_FILE = 'pools.json'
+METADATA_FILE = 'pools_metadata.json'
+MAX_WORKERS = 32  # Used to load metadata of new pools
+
+ABI = json.load(open(PAIR_ABI))
+
+
+class ReservesState:
+    def __init__(self, web3: Web3):
+        """Reserves of all pools listed on strategies' pools files, and tokens of pools"""
+        self.web3 = web3
+        self.metadata_file = pathlib.Path(STATE_DIRECTORY) / METADATA_FILE
+        self.metadata: dict[str, list[tuple[str, str, int]]] = self._load_metadata()
+        self.addresses: set[str] = self._load_strategies_addresses()
+        self.reserves: dict[str, tools.state.PoolReserves] = {}
+
+        self._snapshot = tools.state.encode_snapshot(0, {})
+        self._snapshot_lock = Lock()
+        self._pending_addresses: set[str] = set()
+        self._pending_lock = Lock()
+        self._contracts = {}
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(n_pools={len(self.addresses)})'
+
+    def _load_metadata(self) -> dict[str, list[tuple[str, str, int]]]:
+        if not self.metadata_file.exists():
+            return {}
+        return json.load(open(self.metadata_file))
+
+    def _save_metadata(self):
+        self.metadata_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_metadata_file = self.metadata_file.with_suffix('.tmp')
+        with open(tmp_metadata_file, 'w') as f:
+            json.dump(self.metadata, f)
+        os.replace(tmp_metadata_file, self.metadata_file)
+
+    @staticmethod
+    def _load_strategies_addresses() -> set[str]:
+        addresses = set()
+        for pools_file in pathlib.Path(STRATEGY_FILES_DIRECTORY).glob(f'*/{POOLS_FILE}'):
+            for dex_addresses in json.load(open(pools_file)).values():
+                addresses.update(dex_addresses)
+        return addresses
+
+    def _get_contract(self, address: str):
+        if (contract := self._contracts.get(address)) is None:
+            contract = self._contracts[address] = self.web3.eth.contract(address, abi=ABI)
+        return contract
+
+    def _get_tokens(self, address: str) -> list[tuple[str, str, int]]:
+        contract = self._get_contract(address)
+        tokens = []
+        for token_address in (
+            contract.functions.token0().call(block_identifier=configs.BLOCK),
+            contract.functions.token1().call(block_identifier=configs.BLOCK),
+        ):
+            token = Token(configs.CHAIN_ID, token_address, web3=self.web3)
+            tokens.append((token.address, token.symbol, token.decimals))
+        return tokens
+
+    def load_metadata(self, executor: futures.Executor):
+        """Load tokens of new pools, dropping pools that do not follow UniswapV2's interface"""
+        with self._pending_lock:
+            self.addresses.update(self._pending_addresses)
+            self._pending_addresses.clear()
+        new_addresses = [address for address in self.addresses if address not in self.metadata]
+        if not new_addresses:
+            return
+        log.info(f'{self}: Loading metadata of {len(new_addresses)} pools')
+        jobs = {executor.submit(self._get_tokens, address): address for address in new_addresses}
+        for job in futures.as_completed(jobs):
+            address = jobs[job]
+            try:
+                self.metadata[address] = job.result()
+            except Exception as e:
+                log.info(f'Failed to load pool {address=} ({e!r})')
+                self.addresses.discard(address)
+        self._save_metadata()
+
+    def update(self, block_number: int):
+        """Read reserves of all pools on `block_number` and update snapshot"""
+        addresses = [address for address in self.addresses if address in self.metadata]
+        reserves = {}
+        for address, result in zip(
+            addresses, tools.rpc.get_reserves_batch(addresses, self.web3, block_number)
+        ):
+            if result is None:
+                log.info(f'Failed to read reserves of pool {address}')
+                continue
+            reserves[address] = tools.state.PoolReserves(*result)
+        snapshot = tools.state.encode_snapshot(block_number, reserves)
+        with self._snapshot_lock:
+            self.reserves = reserves
+            self._snapshot = snapshot
+
+    def get_snapshot(self) -> bytes:
+        with self._snapshot_lock:
+            return self._snapshot
+
+    def register(self, addresses: list[str]):
+        with self._pending_lock:
+            self._pending_addresses.update(
+                address for address in addresses if address not in self.addresses)
+
+    def get_metadata(self, addresses: list[str]) -> dict[str, list[tuple[str, str, int]]]:
+        return {
+            address: self.metadata[address]
+            for address in addresses
+            if address in self.metadata
+        }
+
+
+def run():
+    if not configs.STATE_DAEMON_SOCKET:
+        raise ValueError('STATE_DAEMON_SOCKET must be set to run state daemon')
+    web3 = tools.w3.get_web3(verbose=True)
+    state = ReservesState(web3)
+    server = tools.state.StateServer(configs.STATE_DAEMON_SOCKET, state)
+    Thread(target=server.serve_forever, daemon=True).start()
+    log.info(f'Serving {state} on {configs.STATE_DAEMON_SOCKET}')
+
+    listener = tools.w3.BlockListener(web3)
+    with futures.ThreadPoolExecutor(MAX_WORKERS) as executor:
+        for block_number in listener.wait_for_new_blocks():
+            try:
+                state.load_metadata(executor)
+                state.update(block_number)
+            except Exception:
+                log.warning(f'{state} failed to update block {block_number}', exc_info=True)
@@ -1,13 +1,18 @@
-from . import cache, exchange, http, optimization, price, process, simulation, transaction, w3
+from . import (cache, evm, exchange, gas, http, optimization, price, process, rpc, simulation,
+               state, transaction, w3)
 
 __all__ = [
     'cache',
+    'evm',
     'exchange',
+    'gas',
     'http',
     'optimization',
     'price',
     'process',
+    'rpc',
     'simulation',
+    'state',
     'transaction',
     'w3',
 ]
@@ -1,11 +1,12 @@
 import logging
+from threading import RLock
 from typing import Callable, Union
 
 from cachetools import TTLCache, cached
 
 import configs
 
-_caches: list[TTLCache] = []
+_caches: list[tuple[TTLCache, RLock]] = []  # Caches and locks used by their decorators
 log = logging.getLogger(__name__)
 
 
@@ -42,41 +43,47 @@ class TTLCacheWithStats(TTLCache):
         return super().setdefault(k, v)
 
 
-def _get_ttl_cache(maxsize: int = 1, ttl: float = configs.CACHE_TTL) -> TTLCache:
+def _get_ttl_cache(
+    maxsize: int = 1,
+    ttl: float = configs.CACHE_TTL,
+) -> tuple[TTLCache, RLock]:
     if configs.CACHE_STATS:
         cache = TTLCacheWithStats(maxsize, ttl)
     else:
         cache = TTLCache(maxsize, ttl)
+    lock = RLock()
 
-    _caches.append(cache)
-    return cache
+    _caches.append((cache, lock))
+    return cache, lock
 
 
 def ttl_cache(maxsize: Union[int, Callable] = 100, ttl: Union[int, float] = configs.CACHE_TTL):
-    """TTL cache decorator with safe global clear function"""
+    """Thread-safe TTL cache decorator with safe global clear function"""
     if callable(maxsize):
         # ttl_cache was applied directly
         func = maxsize
-        cache = _get_ttl_cache()
+        cache, lock = _get_ttl_cache()
 
-        return cached(cache)(func)
+        return cached(cache, lock=lock)(func)
     else:
-        cache = _get_ttl_cache(maxsize, ttl)
-        return cached(cache)
+        cache, lock = _get_ttl_cache(maxsize, ttl)
+        return cached(cache, lock=lock)
 
 
 def clear_caches(ttl_treshold: int = configs.CACHE_TTL, clear_all: bool = False):
-    for cache in _caches:
+    for cache, lock in _caches:
         if cache._TTLCache__ttl <= ttl_treshold or clear_all:
-            cache.clear()
+            with lock:
+                cache.clear()
 
 
 def get_stats():
     if not configs.CACHE_STATS:
         raise Exception('Stats only available if configs.CACHE_STATS=True')
+    caches = [cache for cache, _ in _caches]
     return {
-        'n_hits': sum(cache._n_hits for cache in _caches),
-        'n_sets': sum(cache._n_sets for cache in _caches),
-        'n_hits_total': sum(cache._n_hits_total for cache in _caches),
-        'n_sets_total': sum(cache._n_hits_total for cache in _caches),
+        'n_hits': sum(cache._n_hits for cache in caches),
+        'n_sets': sum(cache._n_sets for cache in caches),
+        'n_hits_total': sum(cache._n_hits_total for cache in caches),
+        'n_sets_total': sum(cache._n_hits_total for cache in caches),
     }
@@ -0,0 +1,315 @@
+"""In-process EVM execution of contract calls against a locally cached state.
+
+State fixtures are captured from the node with geth's `prestateTracer`, which returns every
+account and storage slot touched by a transaction, and can be saved / loaded as JSON for offline
+use. Requires py-evm (`eth` package), which is only imported when a `LocalEVM` is created.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+from copy import deepcopy
+from functools import lru_cache
+from typing import NamedTuple, Union
+
+from eth_abi import decode_abi
+from eth_utils import to_canonical_address, to_checksum_address
+from web3 import Web3
+from web3.contract import ContractFunction
+
+import configs
+from tools import price
+
+log = logging.getLogger(__name__)
+
+PathLike = Union[bytes, str, os.PathLike]
+
+DEFAULT_MAX_GAS = 1_000_000
+DEFAULT_BLOCK_GAS_LIMIT = 80_000_000
+REVERT_SELECTOR = bytes.fromhex('08c379a0')  # Error(string)
+MAX_BALANCE_SLOT_INDEX = 20  # Max index of `balanceOf` mapping searched in ERC20 storage layouts
+
+# Gas schedule used to compute intrinsic gas (Istanbul)
+TX_GAS = 21_000
+TX_DATA_ZERO_GAS = 4
+TX_DATA_NON_ZERO_GAS = 16
+
+# UniswapV2Pair storage layout: reserve0 (uint112), reserve1 (uint112), blockTimestampLast (uint32)
+UNISWAP_V2_RESERVES_SLOT = 8
+
+
+@lru_cache(maxsize=None)
+def is_available() -> bool:
+    """Whether py-evm is installed"""
+    try:
+        import eth  # noqa: F401
+    except ImportError:
+        log.warning('py-evm is not installed, local EVM is not available')
+        return False
+    return True
+
+
+class EVMResult(NamedTuple):
+    success: bool
+    gas_used: int
+    output: bytes
+    revert_reason: str = ''
+
+
+class StateFixture:
+    def __init__(self, accounts: dict[str, dict], block: dict = None):
+        """Accounts state, keyed by checksum address, with fields `balance`, `nonce`, `code`
+        (bytes) and `storage` (dict of int slot -> int value)"""
+        self.accounts = accounts
+        self.block = block or {}
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(n_accounts={len(self.accounts)})'
+
+    @classmethod
+    def from_prestate(cls, prestate: dict, block: dict = None) -> StateFixture:
+        accounts = {}
+        for address, data in prestate.items():
+            accounts[to_checksum_address(address)] = {
+                'balance': _to_int(data.get('balance', 0)),
+                'nonce': _to_int(data.get('nonce', 0)),
+                'code': bytes.fromhex(data.get('code', '0x')[2:]),
+                'storage': {
+                    int(slot, 16): int(value, 16)
+                    for slot, value in data.get('storage', {}).items()
+                },
+            }
+        return cls(accounts, block)
+
+    @classmethod
+    def load(cls, filepath: PathLike) -> StateFixture:
+        with open(filepath) as f:
+            data = json.load(f)
+        return cls.from_prestate(data['accounts'], data.get('block'))
+
+    def save(self, filepath: PathLike):
+        accounts = {
+            address: {
+                'balance': hex(data['balance']),
+                'nonce': data['nonce'],
+                'code': '0x' + data['code'].hex(),
+                'storage': {hex(slot): hex(value) for slot, value in data['storage'].items()},
+            }
+            for address, data in self.accounts.items()
+        }
+        with open(filepath, 'w') as f:
+            json.dump({'accounts': accounts, 'block': self.block}, f, indent=4)
+
+    def merge(self, other: StateFixture):
+        """Add accounts and storage slots from `other`, overwriting existing values"""
+        for address, data in other.accounts.items():
+            if address not in self.accounts:
+                self.accounts[address] = deepcopy(data)
+                continue
+            account = self.accounts[address]
+            account.update({k: v for k, v in data.items() if k != 'storage'})
+            account['storage'].update(data['storage'])
+        self.block = other.block or self.block
+
+
+def capture_prestate(
+    tx: dict,
+    web3: Web3,
+    block_identifier: Union[int, str] = None,
+) -> StateFixture:
+    """Capture state of all accounts and storage slots touched by `tx` using `debug_traceCall`"""
+    block_identifier = configs.BLOCK if block_identifier is None else block_identifier
+    block = web3.eth.get_block(block_identifier)
+    call = {
+        key: Web3.toHex(value) if isinstance(value, int) else value
+        for key, value in tx.items()
+        if key in ('from', 'to', 'gas', 'gasPrice', 'value', 'data')
+    }
+    prestate = web3.manager.request_blocking(
+        'debug_traceCall',
+        [call, Web3.toHex(block.number), {'tracer': 'prestateTracer'}],
+    )
+    block_data = {
+        'number': block.number,
+        'timestamp': block.timestamp,
+        'gas_limit': block.gasLimit,
+        'coinbase': block.miner,
+    }
+    return StateFixture.from_prestate(prestate, block_data)
+
+
+class LocalEVM:
+    def __init__(self, fixture: StateFixture, chain_id: int = None):
+        from eth.chains.base import Chain
+        from eth.db.atomic import AtomicDB
+        from eth.vm.forks import IstanbulVM
+
+        self.fixture = fixture
+        self.chain_id = configs.CHAIN_ID if chain_id is None else chain_id
+
+        chain_class = Chain.configure(
+            __name__='LocalChain',
+            vm_configuration=((0, IstanbulVM),),
+            chain_id=self.chain_id,
+        )
+        genesis_params = {
+            'difficulty': 1,
+            'gas_limit': fixture.block.get('gas_limit', DEFAULT_BLOCK_GAS_LIMIT),
+            'timestamp': fixture.block.get('timestamp', 0),
+        }
+        if 'coinbase' in fixture.block:
+            genesis_params['coinbase'] = to_canonical_address(fixture.block['coinbase'])
+        genesis_state = {
+            to_canonical_address(address): data
+            for address, data in fixture.accounts.items()
+        }
+        self.chain = chain_class.from_genesis(AtomicDB(), genesis_params, genesis_state)
+        self.state = self.chain.get_vm().state
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.fixture})'
+
+    def call(
+        self,
+        sender: str,
+        to: str,
+        data: Union[bytes, str],
+        value: int = 0,
+        gas: int = DEFAULT_MAX_GAS,
+        gas_price: int = 0,
+    ) -> EVMResult:
+        """Execute call without persisting state changes. `gas_used` includes intrinsic gas and
+        refunds, as in a transaction receipt"""
+        from eth.vm.message import Message
+
+        data = bytes.fromhex(data[2:]) if isinstance(data, str) else data
+        sender = to_canonical_address(sender)
+        to = to_canonical_address(to)
+        intrinsic_gas = get_intrinsic_gas(data)
+
+        snapshot = self.state.snapshot()
+        try:
+            message = Message(
+                gas=gas - intrinsic_gas,
+                to=to,
+                sender=sender,
+                value=value,
+                data=data,
+                code=self.state.get_code(to),
+            )
+            tx_context = self.state.get_transaction_context_class()(
+                gas_price=gas_price,
+                origin=sender,
+            )
+            computation = self.state.computation_class.apply_message(
+                self.state, message, tx_context)
+        finally:
+            self.state.revert(snapshot)
+
+        gas_used = intrinsic_gas + computation.get_gas_used()
+        if computation.is_error:
+            return EVMResult(False, gas_used, computation.output, _get_revert_reason(computation))
+        gas_used -= min(computation.get_gas_refund(), gas_used // 2)
+        return EVMResult(True, gas_used, computation.output)
+
+    def get_storage(self, address: str, slot: int) -> int:
+        return self.state.get_storage(to_canonical_address(address), slot)
+
+    def set_storage(self, address: str, slot: int, value: int):
+        self.state.set_storage(to_canonical_address(address), slot, value)
+
+    def set_erc20_balance(self, token_address: str, holder: str, amount: int):
+        """Set ERC20 balance, using the `balanceOf` mapping slot found in the fixture"""
+        slot = self._find_balance_slot(token_address, holder)
+        self.set_storage(token_address, slot, amount)
+
+    def set_uniswap_v2_reserves(
+        self,
+        pair_address: str,
+        reserve_0: int,
+        reserve_1: int,
+        token_0_address: str = None,
+        token_1_address: str = None,
+    ):
+        """Patch pair reserves. If token addresses are passed, also patch the pair's token
+        balances to be equal to the reserves, as after a `sync()`"""
+        slot_value = self.get_storage(pair_address, UNISWAP_V2_RESERVES_SLOT)
+        block_timestamp_last = slot_value >> 224
+        new_value = reserve_0 | reserve_1 << 112 | block_timestamp_last << 224
+        self.set_storage(pair_address, UNISWAP_V2_RESERVES_SLOT, new_value)
+        if token_0_address is not None:
+            self.set_erc20_balance(token_0_address, pair_address, reserve_0)
+        if token_1_address is not None:
+            self.set_erc20_balance(token_1_address, pair_address, reserve_1)
+
+    def _find_balance_slot(self, token_address: str, holder: str) -> int:
+        storage = self.fixture.accounts.get(to_checksum_address(token_address), {}).get('storage')
+        for index in range(MAX_BALANCE_SLOT_INDEX):
+            slot = _get_mapping_slot(holder, index)
+            if storage is not None and slot in storage:
+                return slot
+        raise ValueError(f'balanceOf({holder}) slot not found in fixture for {token_address}')
+
+
+def get_intrinsic_gas(data: bytes) -> int:
+    n_zeros = data.count(0)
+    return TX_GAS + n_zeros * TX_DATA_ZERO_GAS + (len(data) - n_zeros) * TX_DATA_NON_ZERO_GAS
+
+
+def capture_contract_tx_prestate(
+    func: ContractFunction,
+    *args,
+    from_: str = None,
+    value_: int = 0,
+    gas_price_: int = None,
+    max_gas_: int = DEFAULT_MAX_GAS,
+    **kwargs,
+) -> StateFixture:
+    tx = {
+        'from': configs.ADDRESS if from_ is None else from_,
+        'to': func.address,
+        'gas': max_gas_,
+        'gasPrice': price.get_gas_price() if gas_price_ is None else gas_price_,
+        'value': value_,
+        'data': func(*args, **kwargs)._encode_transaction_data(),
+    }
+    return capture_prestate(tx, func.web3)
+
+
+def dry_run_contract_tx(
+    func: ContractFunction,
+    *args,
+    evm_: LocalEVM,
+    from_: str = None,
+    value_: int = 0,
+    gas_price_: int = None,
+    max_gas_: int = DEFAULT_MAX_GAS,
+    **kwargs,
+) -> str:
+    """Same as `tools.transaction.dry_run_contract_tx`, executed in local EVM"""
+    from_ = configs.ADDRESS if from_ is None else from_
+    gas_price_ = price.get_gas_price() if gas_price_ is None else gas_price_
+    data = func(*args, **kwargs)._encode_transaction_data()
+    result = evm_.call(from_, func.address, data, value_, max_gas_, gas_price_)
+    if not result.success:
+        raise Exception(f'execution reverted: {result.revert_reason}')
+    return '0x' + result.output.hex()
+
+
+def _get_mapping_slot(key: str, index: int) -> int:
+    return int.from_bytes(Web3.solidityKeccak(['uint256', 'uint256'], [int(key, 16), index]), 'big')
+
+
+def _get_revert_reason(computation) -> str:
+    output = computation.output
+    if output[:4] == REVERT_SELECTOR:
+        try:
+            return decode_abi(['string'], output[4:])[0]
+        except Exception:
+            pass
+    return repr(computation.error)
+
+
+def _to_int(value: Union[int, str]) -> int:
+    return int(value, 16) if isinstance(value, str) else value
@@ -20,11 +20,11 @@ with open('addresses/dex/_1inch_v3/_1inch_v3.json') as f:
     _1INCH_ROUTER_ADDRESS = json.load(f)[str(configs.CHAIN_ID)]['router']
 
 
-def get_quote_1inch(
+def _get_quote_params_1inch(
     amountIn: Union[int, TokenAmount],
     tokenOut: Token = None,
     gas_price: int = None,
-) -> int:
+) -> dict:
     token_out_address = tokenOut.address if tokenOut is not None else _1INCH_CURRENCY_ADDRESS
     gas_price = price.get_gas_price() if gas_price is None else gas_price
     if isinstance(amountIn, TokenAmount):
@@ -33,16 +33,37 @@ def get_quote_1inch(
     else:
         from_token_address = _1INCH_CURRENCY_ADDRESS
         from_token_amount = amountIn
-    query_params = {
+    return {
         'fromTokenAddress': from_token_address,
         'toTokenAddress': token_out_address,
         'amount': from_token_amount,
         'gasPrice': gas_price,
     }
-    print(f'{_1INCH_API_URL}/quote', query_params)
+
+
+def get_quote_1inch(
+    amountIn: Union[int, TokenAmount],
+    tokenOut: Token = None,
+    gas_price: int = None,
+) -> int:
+    query_params = _get_quote_params_1inch(amountIn, tokenOut, gas_price)
+    log.debug(f'1inch quote: {query_params}')
     res = http.get(f'{_1INCH_API_URL}/quote', params=query_params, timeout=TIMEOUT_REQUESTS)
-    amount = int(res.json()['toTokenAmount'])
-    return amount
+    return int(res.json()['toTokenAmount'])
+
+
+async def get_quote_1inch_async(
+    amountIn: Union[int, TokenAmount],
+    tokenOut: Token = None,
+    gas_price: int = None,
+) -> int:
+    """Async version of `get_quote_1inch`, to run multiple quotes concurrently. `gas_price`
+    should be given, as fetching it blocks the event loop"""
+    query_params = _get_quote_params_1inch(amountIn, tokenOut, gas_price)
+    log.debug(f'1inch quote: {query_params}')
+    res = await http.get_async(
+        f'{_1INCH_API_URL}/quote', params=query_params, timeout=TIMEOUT_REQUESTS)
+    return int(res.json()['toTokenAmount'])
 
 
 def exchange_1inch(
@@ -0,0 +1,137 @@
+import logging
+import math
+from collections import deque
+from threading import Lock, Thread
+from typing import Iterable, NamedTuple
+
+from web3 import Web3
+
+import configs
+from tools import price, transaction, w3
+
+log = logging.getLogger(__name__)
+
+DEFAULT_WINDOW_BLOCKS = 20  # About 1 minute at 3 seconds per block
+BASELINE_GAS_PRICE_PERCENTILE = 50
+ADDRESS_WORD_PREFIX = '0' * 24  # ABI encoded addresses are left-padded with 12 zero bytes
+
+
+class BlockGasData(NamedTuple):
+    number: int
+    gas_prices: list[int]
+    competitors: dict[str, int]  # Max gas price of transactions that hit each watched address
+
+
+class GasOracle:
+    def __init__(
+        self,
+        web3: Web3,
+        window_blocks: int = DEFAULT_WINDOW_BLOCKS,
+        watched_addresses: Iterable[str] = (),
+    ):
+        """Gas price oracle based on transactions included in the last `window_blocks` blocks.
+
+        Blocks are processed incrementally in a background thread, keeping the gas prices of all
+        included transactions and of transactions that hit watched addresses (e.g.: pools used by
+        the strategy), which are likely competing for the same opportunities.
+        """
+        self.web3 = web3
+        self.window_blocks = window_blocks
+
+        self.lock = Lock()
+        self._blocks: deque[BlockGasData] = deque(maxlen=window_blocks)
+        self._sorted_gas_prices: list[int] = []
+        self._competitors: dict[str, int] = {}
+        self._watched_addresses: dict[str, str] = {}  # Lowercase hex without '0x' -> address
+        self._own_addresses = {
+            configs.ADDRESS.lower(),
+            *(account.address.lower() for account in transaction.get_executor_accounts()),
+        }
+        self._thread: Thread = None
+
+        self.watch(watched_addresses)
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(n_blocks={len(self._blocks)})'
+
+    @property
+    def is_ready(self) -> bool:
+        return bool(self._sorted_gas_prices)
+
+    def watch(self, addresses: Iterable[str]):
+        for address in addresses:
+            self._watched_addresses[address[2:].lower()] = address
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = Thread(target=self._listen_blocks, daemon=True)
+        self._thread.start()
+
+    def _listen_blocks(self):
+        listener = w3.BlockListener(self.web3, verbose=False)
+        for block_number in listener.wait_for_new_blocks():
+            try:
+                self.add_block(block_number)
+            except Exception:
+                log.debug(f'GasOracle failed to process block {block_number}', exc_info=True)
+
+    def add_block(self, block_number: int):
+        block = self.web3.eth.get_block(block_number, full_transactions=True)
+        gas_prices = []
+        competitors: dict[str, int] = {}
+        for tx in block.transactions:
+            gas_prices.append(tx['gasPrice'])
+            if tx['from'].lower() in self._own_addresses:
+                continue
+            for address in self._get_hit_addresses(tx):
+                competitors[address] = max(competitors.get(address, 0), tx['gasPrice'])
+        if competitors:
+            log.debug(f'GasOracle: {len(competitors)} watched addresses hit on {block_number=}')
+
+        with self.lock:
+            self._blocks.append(BlockGasData(block_number, gas_prices, competitors))
+            self._sorted_gas_prices = sorted(
+                gas_price for block_data in self._blocks for gas_price in block_data.gas_prices
+            )
+            self._competitors = {}
+            for block_data in self._blocks:
+                for address, gas_price in block_data.competitors.items():
+                    self._competitors[address] = max(self._competitors.get(address, 0), gas_price)
+
+    def _get_hit_addresses(self, tx: dict) -> set[str]:
+        """Return watched addresses that are either the transaction destination or ABI encoded
+        in its input data"""
+        hit_addresses = set()
+        if tx['to'] is not None and (to := tx['to'][2:].lower()) in self._watched_addresses:
+            hit_addresses.add(self._watched_addresses[to])
+        data = tx['input'][10:]  # Skip '0x' and function selector
+        for i in range(0, len(data) - 63, 64):
+            word = data[i:i + 64]
+            if not word.startswith(ADDRESS_WORD_PREFIX):
+                continue
+            if (address := word[24:]) in self._watched_addresses:
+                hit_addresses.add(self._watched_addresses[address])
+        return hit_addresses
+
+    def get_percentile(self, percentile: float) -> int:
+        with self.lock:
+            if not self._sorted_gas_prices:
+                return None
+            index = math.ceil(percentile / 100 * len(self._sorted_gas_prices)) - 1
+            return self._sorted_gas_prices[max(index, 0)]
+
+    def get_gas_price(self, percentile: float = BASELINE_GAS_PRICE_PERCENTILE) -> int:
+        """Baseline gas price, using same adjustments as `tools.price.get_gas_price`. Falls back
+        to node estimate before any block is processed."""
+        gas_price = self.get_percentile(percentile)
+        if gas_price is None:
+            return price.get_gas_price()
+        gas_price = max(gas_price, configs.MIN_GAS_PRICE)
+        return round(gas_price * configs.BASELINE_GAS_PRICE_PREMIUM)
+
+    def get_competitor_gas_price(self, addresses: Iterable[str]) -> int:
+        """Highest gas price paid by other accounts' transactions that hit any of the addresses
+        during the window, or 0 if none."""
+        with self.lock:
+            return max((self._competitors.get(address, 0) for address in addresses), default=0)
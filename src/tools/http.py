@@ -1,11 +1,66 @@
+import asyncio
 import logging
 import time
+import weakref
+from functools import lru_cache
 from typing import Iterable
 
 import httpx
 
 log = logging.getLogger(__name__)
 
+MAX_CONNECTIONS = 20
+MAX_KEEPALIVE_CONNECTIONS = 10
+MAX_CONCURRENT_ASYNC_REQUESTS = 10
+
+# Async clients and semaphores are bound to the event loop in which they are created
+_async_clients: weakref.WeakKeyDictionary[
+    asyncio.AbstractEventLoop, dict[bool, tuple[httpx.AsyncClient, asyncio.Semaphore]]
+] = weakref.WeakKeyDictionary()
+
+
+def _get_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=MAX_CONNECTIONS,
+        max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+    )
+
+
+@lru_cache(maxsize=None)
+def get_client(http2: bool = True) -> httpx.Client:
+    """Pooled client shared by all requests, keeping connections alive between requests and
+    multiplexing concurrent requests to the same host over HTTP/2. Thread-safe"""
+    return httpx.Client(http2=http2, limits=_get_limits())
+
+
+def get_async_client(http2: bool = True) -> tuple[httpx.AsyncClient, asyncio.Semaphore]:
+    """Pooled async client of running event loop, and semaphore limiting concurrent requests"""
+    loop_clients = _async_clients.setdefault(asyncio.get_running_loop(), {})
+    if http2 not in loop_clients:
+        loop_clients[http2] = (
+            httpx.AsyncClient(http2=http2, limits=_get_limits()),
+            asyncio.Semaphore(MAX_CONCURRENT_ASYNC_REQUESTS),
+        )
+    return loop_clients[http2]
+
+
+async def close_async_clients():
+    """Close pooled async clients of running event loop"""
+    for client, _ in _async_clients.pop(asyncio.get_running_loop(), {}).values():
+        await client.aclose()
+
+
+def _check_retry(
+    e: httpx.HTTPStatusError,
+    method: str,
+    i: int,
+    n_tries: int,
+    status_forcelist: Iterable[int],
+):
+    log.debug(f'Error on http {method} ({e})', exc_info=True)
+    if i == n_tries - 1 or e.response.status_code not in status_forcelist:
+        raise e
+
 
 def request(
     method: str,
@@ -17,20 +72,18 @@ def request(
     status_forcelist: Iterable[int] = (500, 502, 503, 504),
     http2: bool = True,
     **kwargs,
-) -> httpx.Request:
-    """httpx request with default retries.
+) -> httpx.Response:
+    """httpx request with default retries, using pooled client.
     inspired by https://www.peterbe.com/plog/best-practice-with-retries-with-requests"""
-    with httpx.Client(http2=http2, timeout=timeout) as client:
-        for i in range(n_tries):
-            try:
-                res = client.request(method, url, *args, **kwargs)
-                res.raise_for_status()
-                return res
-            except httpx.HTTPStatusError as e:
-                log.debug(f'Error on http {method} ({e})', exc_info=True)
-                if i == n_tries - 1 or e.response.status_code not in status_forcelist:
-                    raise e
-                time.sleep((1 + backoff_factor) ** i - 1)
+    client = get_client(http2)
+    for i in range(n_tries):
+        try:
+            res = client.request(method, url, *args, timeout=timeout, **kwargs)
+            res.raise_for_status()
+            return res
+        except httpx.HTTPStatusError as e:
+            _check_retry(e, method, i, n_tries, status_forcelist)
+            time.sleep((1 + backoff_factor) ** i - 1)
 
 
 def get(
@@ -39,8 +92,8 @@ def get(
     timeout: httpx._types.TimeoutTypes = 5,
     n_tries: int = 4,
     **kwargs,
-) -> httpx.Request:
-    """httpx POST with default retries"""
+) -> httpx.Response:
+    """httpx GET with default retries"""
     return request('GET', url, *args, timeout=timeout, n_tries=n_tries, **kwargs)
 
 
@@ -50,6 +103,53 @@ def post(
     timeout: httpx._types.TimeoutTypes = 5,
     n_tries: int = 4,
     **kwargs,
-) -> httpx.Request:
+) -> httpx.Response:
     """httpx POST with default retries"""
     return request('POST', url, *args, timeout=timeout, n_tries=n_tries, **kwargs)
+
+
+async def request_async(
+    method: str,
+    url: str,
+    *args,
+    timeout: httpx._types.TimeoutTypes = 5,
+    n_tries: int = 4,
+    backoff_factor: float = 0.5,
+    status_forcelist: Iterable[int] = (500, 502, 503, 504),
+    http2: bool = True,
+    **kwargs,
+) -> httpx.Response:
+    """Async version of `request`, with at most MAX_CONCURRENT_ASYNC_REQUESTS concurrent
+    requests per event loop"""
+    client, semaphore = get_async_client(http2)
+    for i in range(n_tries):
+        try:
+            async with semaphore:
+                res = await client.request(method, url, *args, timeout=timeout, **kwargs)
+            res.raise_for_status()
+            return res
+        except httpx.HTTPStatusError as e:
+            _check_retry(e, method, i, n_tries, status_forcelist)
+            await asyncio.sleep((1 + backoff_factor) ** i - 1)
+
+
+async def get_async(
+    url: str,
+    *args,
+    timeout: httpx._types.TimeoutTypes = 5,
+    n_tries: int = 4,
+    **kwargs,
+) -> httpx.Response:
+    """Async httpx GET with default retries"""
+    return await request_async('GET', url, *args, timeout=timeout, n_tries=n_tries, **kwargs)
+
+
+async def post_async(
+    url: str,
+    *args,
+    timeout: httpx._types.TimeoutTypes = 5,
+    n_tries: int = 4,
+    **kwargs,
+) -> httpx.Response:
+    """Async httpx POST with default retries"""
+    return await request_async('POST', url, *args, timeout=timeout, n_tries=n_tries, **kwargs)
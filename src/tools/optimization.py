@@ -1,4 +1,5 @@
 import logging
+import math
 from typing import Callable, Union
 
 log = logging.getLogger(__name__)
@@ -16,6 +17,7 @@ def optimizer_second_order(
     tol: int = 10 ** 18,
     max_iter: int = DEFAULT_MAX_ITER,
     use_fallback: bool = True,
+    func_derivatives: Callable[int, tuple[int, float, float]] = None,
 ) -> tuple[int, int]:
     """Maximizes function using Newton's method and finite differences, where variables are in int.
 
@@ -23,10 +25,18 @@ def optimizer_second_order(
         x0 (int): Initial guess
         dx (int): Interval to calculate derivatives
         tol (int): Absolute tolerance between iterations to stop optimization
+        func_derivatives (Callable): Returns func(x) and its first and second derivatives; if
+            passed, derivatives are used instead of finite differences, falling back to them
+            on errors
 
     Returns:
         tuple[int, int]: Result in x and func(x)
     """
+    if func_derivatives is not None:
+        try:
+            return newton_optimizer_analytic(func_derivatives, x0, tol, max_iter)
+        except Exception as e:
+            log.debug(f'Newton with analytic derivatives failed ({e!r}), using finite differences')
     try:
         return newton_optimizer(func, x0, dx, tol, max_iter)
     except Exception as e:
@@ -71,6 +81,161 @@ def newton_optimizer(
     return x_i_next, func(x_i_next)
 
 
+def newton_optimizer_analytic(
+    func_derivatives: Callable[int, tuple[int, float, float]],
+    x0: int,
+    tol: int = 10 ** 18,
+    max_iter: int = DEFAULT_MAX_ITER,
+    positive_only: bool = True,
+) -> tuple[int, int]:
+    """Maximizes function using Newton's method with exact derivatives, one evaluation per step.
+
+    Args:
+        func_derivatives (Callable): Returns func(x) and its first and second derivatives
+        x0 (int): Initial guess
+        tol (int): Absolute tolerance between iterations to stop optimization
+        max_iter (int): Maximum number of iterations
+
+    Returns:
+        tuple[int, int]: Result in x and func(x)
+    """
+    x_i = x0
+    for i in range(max_iter):
+        f_x_i, first_derivative, second_derivative = func_derivatives(x_i)
+        if second_derivative >= 0:
+            raise Exception(f'Non-negative second derivative at x={x_i}')
+        x_i_next = round(x_i - first_derivative / second_derivative)
+        if x_i_next < 0 and positive_only:
+            if x_i == 0:
+                raise Exception(f'Negative result when {positive_only=}')
+            x_i_next = 0
+        if abs(x_i_next - x_i) < tol:
+            break
+        x_i = x_i_next
+    else:
+        raise Exception(f'No convergence after {max_iter=}')
+    if x_i_next == x_i:
+        return x_i, f_x_i
+    return x_i_next, func_derivatives(x_i_next)[0]
+
+
+def bounded_newton_optimizer(
+    func_derivatives: Callable[int, tuple[int, float, float]],
+    x0: int,
+    x_max: int,
+    tol: int = 10 ** 18,
+    max_iter: int = DEFAULT_MAX_ITER,
+) -> tuple[int, int]:
+    """Maximizes concave function in [0, x_max) using Newton's method with exact derivatives,
+    safeguarded by bissection of the interval where the first derivative changes sign.
+    Evaluation errors (e.g.: insufficient liquidity) are handled as the upper boundary.
+
+    Args:
+        func_derivatives (Callable): Returns func(x) and its first and second derivatives
+        x0 (int): Initial guess
+        x_max (int): Upper boundary (exclusive) of x
+        tol (int): Absolute tolerance between iterations to stop optimization
+        max_iter (int): Maximum number of iterations
+
+    Returns:
+        tuple[int, int]: Result in x and func(x)
+    """
+    x_low, x_high = 0, x_max
+    x_i = min(max(x0, 0), x_max - 1)
+    result = None
+    for i in range(max_iter):
+        try:
+            f_x_i, first_derivative, second_derivative = func_derivatives(x_i)
+        except Exception:
+            x_high = x_i
+            x_i = (x_low + x_high) // 2
+            continue
+        result = x_i, f_x_i
+        if first_derivative > 0:
+            x_low = x_i
+        else:
+            x_high = x_i
+        if second_derivative < 0:
+            x_i_next = round(x_i - first_derivative / second_derivative)
+        else:
+            x_i_next = -1  # Not concave at x_i, bissect
+        if not x_low < x_i_next < x_high:
+            x_i_next = (x_low + x_high) // 2
+        if abs(x_i_next - x_i) < tol or x_high - x_low < tol:
+            break
+        x_i = x_i_next
+    if result is None:
+        raise Exception(f'Could not evaluate function in [{x_low}, {x_max})')
+    return result
+
+
+def weighted_pairs_optimizer(
+    pair_0: tuple[int, int, float, float],
+    pair_1: tuple[int, int, float, float],
+    tol: float = 1.0,
+    max_iter: int = DEFAULT_MAX_ITER,
+) -> int:
+    """Amount x that maximizes out_0(x) - in_1(x), where out_0 is the amount out of weighted
+    pair 0 given x in, and in_1 is the amount in of weighted pair 1 given x out:
+        out_0(x) = R_out_0 * (1 - (R_in_0 / (R_in_0 + g_0 * x)) ** a)
+        in_1(x) = R_in_1 * ((R_out_1 / (R_out_1 - x)) ** b - 1) / g_1
+    At the optimum, C_0 * (R_in_0 + g_0 * x) ** -(a + 1) = C_1 * (R_out_1 - x) ** -(b + 1),
+    with C_0 = R_out_0 * a * g_0 * R_in_0 ** a and C_1 = R_in_1 * b * R_out_1 ** b / g_1.
+    Solved in closed form if a == b (e.g.: both pairs are constant product), otherwise by a
+    safeguarded Newton root-finding in log space bounded by [0, R_out_1).
+
+    Args:
+        pair_0 (tuple): (R_in_0, R_out_0, a, g_0), with a = weight_in / weight_out
+        pair_1 (tuple): (R_in_1, R_out_1, b, g_1), with b = weight_out / weight_in
+        tol (float): Absolute tolerance in x for root-finding
+        max_iter (int): Maximum number of iterations for root-finding
+
+    Returns:
+        int: Optimal x, or zero if there is no profitable amount
+    """
+    reserve_in_0, reserve_out_0, power_0, gamma_0 = pair_0
+    reserve_in_1, reserve_out_1, power_1, gamma_1 = pair_1
+    log_c_0 = (
+        math.log(reserve_out_0) + math.log(power_0) + math.log(gamma_0)
+        + power_0 * math.log(reserve_in_0)
+    )
+    log_c_1 = (
+        math.log(reserve_in_1) + math.log(power_1) - math.log(gamma_1)
+        + power_1 * math.log(reserve_out_1)
+    )
+    p, q = power_0 + 1, power_1 + 1
+
+    def log_ratio(x: float) -> float:
+        """log(marginal out_0 / marginal in_1), decreasing in x"""
+        return (
+            log_c_0 - p * math.log(reserve_in_0 + gamma_0 * x)
+            - log_c_1 + q * math.log(reserve_out_1 - x)
+        )
+
+    if log_ratio(0) <= 0:
+        return 0
+    if math.isclose(p, q):
+        k = math.exp((log_c_1 - log_c_0) / p)
+        return max(round((reserve_out_1 - k * reserve_in_0) / (1 + k * gamma_0)), 0)
+
+    x_low, x_high = 0.0, float(reserve_out_1)
+    x = x_high / 2
+    for i in range(max_iter):
+        h = log_ratio(x)
+        if h > 0:
+            x_low = x
+        else:
+            x_high = x
+        derivative = -p * gamma_0 / (reserve_in_0 + gamma_0 * x) - q / (reserve_out_1 - x)
+        x_next = x - h / derivative
+        if not x_low < x_next < x_high:
+            x_next = (x_low + x_high) / 2
+        if abs(x_next - x) < tol:
+            break
+        x = x_next
+    return round(x_next)
+
+
 def bissection_optimizer(
     func: Callable[int, int],
     x0: int,
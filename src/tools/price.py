@@ -1,45 +1,80 @@
 import json
 import logging
+import time
 import urllib.parse
-from datetime import datetime
-from typing import Iterable, Union
+from collections import defaultdict
+from concurrent import futures
+from functools import lru_cache
+from threading import Lock, Thread
+from typing import Iterable, NamedTuple, Union
 
 from web3 import Web3
 
 import configs
 from core import LiquidityPool, Token, TokenAmount
 from exceptions import InsufficientLiquidity
-from tools import http, w3
+from tools import http, process, rpc, w3
 from tools.cache import ttl_cache
 
-CHAINLINK_PRICE_FEED_ABI = json.load(open('abis/ChainlinkPriceFeed.json'))
-WRAPPED_CURRENCY_TOKEN = Token(
-    chain_id=configs.CHAIN_ID,
-    **json.load(open('addresses/wrapped_currency_tokens.json'))[str(configs.CHAIN_ID)],
-)
-
-_USD_PRICE_FEED_ADDRESSES = \
-    json.load(open('addresses/chainlink_usd_price_feeds.json'))[str(configs.CHAIN_ID)]
-PRICE_FEEDS = {
-    Token(chain_id=configs.CHAIN_ID, **data.pop('token')): data
-    for data in _USD_PRICE_FEED_ADDRESSES['tokens']
-}
-PRICE_FEEDS.update({
-    _USD_PRICE_FEED_ADDRESSES['native_currency'].pop('symbol'):
-    _USD_PRICE_FEED_ADDRESSES['native_currency']
-})
-PRICE_FEEDS.update({WRAPPED_CURRENCY_TOKEN: _USD_PRICE_FEED_ADDRESSES['native_currency']})
-
+CHAINLINK_PRICE_FEED_ABI_FILE = 'abis/ChainlinkPriceFeed.json'
+WRAPPED_CURRENCY_TOKENS_FILE = 'addresses/wrapped_currency_tokens.json'
+USD_PRICE_FEEDS_FILE = 'addresses/chainlink_usd_price_feeds.json'
 
 # These functions should not be used for too time-critical data, so ttl can be higher
 USD_PRICE_CACHE_TTL = 60
 GAS_PRICE_CACHE_TTL = 30
 USD_PRICE_DATA_STALE = 3600
 
-WEB3 = w3.get_web3()
+# Chainlink feeds are refreshed in background ahead of USD_PRICE_CACHE_TTL expiry
+PRICE_FEEDS_REFRESH_INTERVAL = USD_PRICE_CACHE_TTL / 2
+MAX_BLOCKS_PRICE_FEED_LAG = 20  # About USD_PRICE_CACHE_TTL at 3 seconds per block
+MAX_PRICE_FEEDS_DATA_AGE = USD_PRICE_CACHE_TTL  # Older data is read again from node
+N_WORKERS_PRICE_FEEDS = 8
+
 log = logging.getLogger(__name__)
 
 
+# Web3 provider, ABIs and price feeds are only loaded on first use, so that importing this module
+# has no side effects (e.g.: probing RPC endpoints)
+def __getattr__(name: str):
+    if name == 'WEB3':
+        return w3.get_default_web3()
+    if name == 'CHAINLINK_PRICE_FEED_ABI':
+        return get_chainlink_price_feed_abi()
+    if name == 'WRAPPED_CURRENCY_TOKEN':
+        return get_wrapped_currency_token()
+    if name == 'PRICE_FEEDS':
+        return get_price_feeds()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+@lru_cache(maxsize=None)
+def get_chainlink_price_feed_abi() -> dict:
+    return json.load(open(CHAINLINK_PRICE_FEED_ABI_FILE))
+
+
+@lru_cache(maxsize=None)
+def get_wrapped_currency_token() -> Token:
+    return Token(
+        chain_id=configs.CHAIN_ID,
+        **json.load(open(WRAPPED_CURRENCY_TOKENS_FILE))[str(configs.CHAIN_ID)],
+    )
+
+
+@lru_cache(maxsize=None)
+def get_price_feeds() -> dict[Union[str, Token], dict]:
+    """Chainlink USD price feeds (address and decimals) by token, or by symbol for native token"""
+    usd_price_feed_addresses = json.load(open(USD_PRICE_FEEDS_FILE))[str(configs.CHAIN_ID)]
+    price_feeds = {
+        Token(chain_id=configs.CHAIN_ID, **data.pop('token')): data
+        for data in usd_price_feed_addresses['tokens']
+    }
+    native_currency = usd_price_feed_addresses['native_currency']
+    price_feeds[native_currency.pop('symbol')] = native_currency
+    price_feeds[get_wrapped_currency_token()] = native_currency
+    return price_feeds
+
+
 def get_native_token_decimals():
     if configs.CHAIN_ID in (1, 56):
         return 18
@@ -53,45 +88,176 @@ def get_native_token_symbol():
         return 'BNB'
 
 
-@ttl_cache(maxsize=1000, ttl=USD_PRICE_CACHE_TTL)
-def _get_chainlink_data(asset: Union[str, Token], address: str, decimals: int, web3: Web3) -> float:
-    contract = web3.eth.contract(address, abi=CHAINLINK_PRICE_FEED_ABI)
-    (
-        round_id, answer, started_at, updated_at, answered_in_round
-    ) = contract.functions.latestRoundData().call(block_identifier=configs.BLOCK)
+class FeedData(NamedTuple):
+    price: float
+    updated_at: int  # Timestamp of chainlink round
+    block: int  # Block in which data was read
+    fetched_at: float
 
-    dt_updated_at = datetime.fromtimestamp(updated_at)
-    seconds_since_last_update = (dt_updated_at - datetime.utcnow()).total_seconds()
+
+def _check_stale_round(asset: Union[str, Token], updated_at: int):
+    seconds_since_last_update = time.time() - updated_at
     if seconds_since_last_update > USD_PRICE_DATA_STALE:
-        log.warning(f'Price data for {asset} {seconds_since_last_update} seconds old')
+        log.warning(f'Price data for {asset} {seconds_since_last_update:.0f} seconds old')
 
-    return answer / 10 ** decimals
 
+@ttl_cache(maxsize=1000, ttl=USD_PRICE_CACHE_TTL)
+def _get_chainlink_data(asset: Union[str, Token], address: str, decimals: int, web3: Web3) -> float:
+    if configs.USE_RAW_RPC:
+        round_data, = rpc.get_latest_round_data([address], web3)
+        if round_data is None:
+            raise Exception(f'Failed to read chainlink feed of {asset}')
+    else:
+        contract = web3.eth.contract(address, abi=get_chainlink_price_feed_abi())
+        round_data = contract.functions.latestRoundData().call(block_identifier=configs.BLOCK)
+    round_id, answer, started_at, updated_at, answered_in_round = round_data
+    _check_stale_round(asset, updated_at)
+
+    return answer / 10 ** decimals
 
-def get_chainlink_price_usd(asset: Union[str, Token], web3: Web3 = WEB3) -> float:
-    address = PRICE_FEEDS[asset]['address']
-    decimals = PRICE_FEEDS[asset]['decimals']
 
+class ChainlinkFeeds:
+    def __init__(
+        self,
+        web3: Web3,
+        refresh_interval: float = PRICE_FEEDS_REFRESH_INTERVAL,
+        n_workers: int = N_WORKERS_PRICE_FEEDS,
+    ):
+        """Keep data of all chainlink feeds in PRICE_FEEDS updated in a background thread, so
+        that price lookups never wait on RPC calls. All feeds are read together at the same block
+        in each refresh, and data age is tracked per feed.
+        """
+        self.web3 = web3
+        self.refresh_interval = refresh_interval
+
+        self.feeds = {
+            data['address']: (asset, data['decimals'])
+            for asset, data in get_price_feeds().items()
+        }
+        self.lock = Lock()
+        self._start_lock = Lock()
+        self._data: dict[str, FeedData] = {}
+        self._executor = futures.ThreadPoolExecutor(n_workers)
+        self._thread: Thread = None
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(n_feeds={len(self.feeds)})'
+
+    def start(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            self.refresh()  # Only blocking refresh, so first lookups already have data
+            self._thread = Thread(target=self._keep_feeds_updated, daemon=True)
+            self._thread.start()
+
+    def _keep_feeds_updated(self):
+        while not process.is_shutting_down():
+            time.sleep(self.refresh_interval)
+            try:
+                self.refresh()
+            except Exception:
+                log.debug('ChainlinkFeeds refresh failed, retrying next interval', exc_info=True)
+
+    def refresh(self):
+        block = self.web3.eth.block_number
+        addresses = list(self.feeds)
+        if configs.USE_RAW_RPC:
+            results = [
+                None if round_data is None else (round_data[1], round_data[3])
+                for round_data in rpc.get_latest_round_data(addresses, self.web3, block)
+            ]
+        else:
+            results = self._executor.map(lambda addr: self._read_feed(addr, block), addresses)
+        fetched_at = time.time()
+        new_data = {}
+        for address, result in zip(addresses, results):
+            if result is None:
+                continue
+            asset, decimals = self.feeds[address]
+            answer, updated_at = result
+            _check_stale_round(asset, updated_at)
+            new_data[address] = FeedData(answer / 10 ** decimals, updated_at, block, fetched_at)
+        with self.lock:
+            self._data.update(new_data)
+
+    def _read_feed(self, address: str, block: int) -> tuple[int, int]:
+        contract = self.web3.eth.contract(address, abi=get_chainlink_price_feed_abi())
+        try:
+            (
+                round_id, answer, started_at, updated_at, answered_in_round
+            ) = contract.functions.latestRoundData().call(block_identifier=block)
+        except Exception:
+            log.debug(f'Failed to read chainlink feed {address}', exc_info=True)
+            return None
+        return answer, updated_at
+
+    def get_price(self, address: str) -> float:
+        """Return latest known price of feed, or None if not available for configs.BLOCK"""
+        self.start()
+        with self.lock:
+            data = self._data.get(address)
+        if data is None:
+            return None
+        if (
+            configs.BLOCK != 'latest'
+            and abs(configs.BLOCK - data.block) > MAX_BLOCKS_PRICE_FEED_LAG
+        ):
+            return None  # e.g.: simulating past block
+        if (
+            configs.BLOCK == 'latest'
+            and (age := time.time() - data.fetched_at) > MAX_PRICE_FEEDS_DATA_AGE
+        ):
+            log.debug(f'Chainlink feed {address} data fetched {age:.1f} seconds ago')
+            return None  # e.g.: background refresh failing
+        return data.price
+
+
+_chainlink_feeds: ChainlinkFeeds = None
+
+
+def get_chainlink_feeds() -> ChainlinkFeeds:
+    global _chainlink_feeds
+    if _chainlink_feeds is None:
+        _chainlink_feeds = ChainlinkFeeds(w3.get_default_web3())
+    return _chainlink_feeds
+
+
+def get_chainlink_price_usd(asset: Union[str, Token], web3: Web3 = None) -> float:
+    """Price from background `ChainlinkFeeds` if `web3` is the default provider, otherwise (e.g.:
+    hardhat fork) or if it is not available, price is read from `web3`"""
+    default_web3 = w3.get_default_web3()
+    web3 = default_web3 if web3 is None else web3
+    price_feed = get_price_feeds()[asset]
+    address = price_feed['address']
+    decimals = price_feed['decimals']
+
+    if web3 is default_web3 and (price := get_chainlink_feeds().get_price(address)) is not None:
+        return price
     return _get_chainlink_data(asset, address, decimals, web3)
 
 
 @ttl_cache(maxsize=100, ttl=GAS_PRICE_CACHE_TTL)
-def get_gas_price(web3: Web3 = WEB3) -> int:
+def get_gas_price(web3: Web3 = None) -> int:
+    web3 = w3.get_default_web3() if web3 is None else web3
     gas_price = max(web3.eth.gas_price, configs.MIN_GAS_PRICE)  # Fix for geth BSC geth 1.1.0 beta
     return round(gas_price * configs.BASELINE_GAS_PRICE_PREMIUM)
 
 
-def get_gas_cost_native_tokens(gas: int, web3: Web3 = WEB3) -> float:
-    return float(Web3.fromWei(gas, 'ether')) * get_gas_price(web3)
+def get_gas_cost_native_tokens(gas: int, web3: Web3 = None, gas_price: int = None) -> float:
+    gas_price = get_gas_price(web3) if gas_price is None else gas_price
+    return float(Web3.fromWei(gas, 'ether')) * gas_price
 
 
-def get_price_usd_native_token(web3: Web3) -> float:
+def get_price_usd_native_token(web3: Web3 = None) -> float:
     symbol = get_native_token_symbol()
     return get_chainlink_price_usd(symbol, web3)
 
 
-def get_gas_cost_usd(gas: int, web3: Web3 = WEB3) -> float:
-    gas_cost = get_gas_cost_native_tokens(gas, web3)
+def get_gas_cost_usd(gas: int, web3: Web3 = None, gas_price: int = None) -> float:
+    gas_cost = get_gas_cost_native_tokens(gas, web3, gas_price)
     price_native_token_usd = get_price_usd_native_token(web3)
 
     return gas_cost * price_native_token_usd
@@ -104,7 +270,7 @@ async def get_prices_coingecko(addresses: Iterable[str]) -> dict[str, float]:
         'contract_addresses': ','.join(addresses),
         'vs_currencies': 'USD',
     })
-    res = http.get(f'{url}?{query_string}')
+    res = await http.get_async(f'{url}?{query_string}')
     return {
         key: value['usd']
         for key, value in res.json().items()
@@ -127,7 +293,7 @@ def _get_token_price(
 def get_price_usd(
     token: Token,
     pools: list[LiquidityPool],
-    web3: Web3 = WEB3,
+    web3: Web3 = None,
     _use_fallback: bool = True,
 ) -> float:
     """Return token price in USD using chainlink and, if token not in chainlink, by comparing
@@ -142,7 +308,7 @@ def get_price_usd(
         if token not in pool.tokens:
             continue
         for reserve in pool.reserves:
-            if reserve.token not in PRICE_FEEDS:
+            if reserve.token not in get_price_feeds():
                 continue
             reserve_token_price = get_chainlink_price_usd(reserve.token, web3)
             liquidity = reserve_token_price * reserve.amount_in_units
@@ -169,5 +335,124 @@ def get_price_usd(
     return max(liquidity_prices)[1]
 
 
-def get_wrapped_currency_token() -> Token:
-    return WRAPPED_CURRENCY_TOKEN
+class UsdPriceTable:
+    def __init__(
+        self,
+        pools: Iterable[LiquidityPool],
+        web3: Web3 = None,
+        max_age: float = USD_PRICE_CACHE_TTL,
+    ):
+        """USD prices of all tokens in a set of liquidity pools, computed once per block.
+
+        Prices are seeded from chainlink feeds and propagated through the pools graph, layer by
+        layer; when a token can be priced through more than one pool, the one with largest
+        liquidity of the already priced token is used (same criteria as `get_price_usd`).
+
+        Args:
+            pools (Iterable[LiquidityPool]): Pools used to propagate prices
+            web3 (Web3): Web3 provider to fetch chainlink data, default provider if None
+            max_age (float): Maximum age in seconds of prices when configs.BLOCK == 'latest'
+        """
+        self.web3 = w3.get_default_web3() if web3 is None else web3
+        self.max_age = max_age
+        self._pools_by_token: dict[Token, list[LiquidityPool]] = defaultdict(list)
+        self._prices: dict[Token, float] = {}
+        self._block: Union[int, str] = None
+        self._timestamp = 0.0
+
+        self.add_pools(pools)
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(n_tokens={len(self._pools_by_token)})'
+
+    def __contains__(self, token: Token) -> bool:
+        self._update_if_stale()
+        return token in self._prices
+
+    @property
+    def prices(self) -> dict[Token, float]:
+        self._update_if_stale()
+        return self._prices.copy()
+
+    def add_pools(self, pools: Iterable[LiquidityPool]):
+        for pool in pools:
+            for token in pool.tokens:
+                if pool not in self._pools_by_token[token]:
+                    self._pools_by_token[token].append(pool)
+        self._block = None  # Force update on next lookup
+
+    def remove_pools(self, pools: Iterable[LiquidityPool]):
+        """Stop using pools to propagate prices. Lists of pools are replaced instead of changed,
+        as they may be in use by `update()` in other threads"""
+        pools = set(pools)
+        for token, token_pools in list(self._pools_by_token.items()):
+            if not pools.intersection(token_pools):
+                continue
+            if (new_token_pools := [pool for pool in token_pools if pool not in pools]):
+                self._pools_by_token[token] = new_token_pools
+            else:
+                del self._pools_by_token[token]
+        self._block = None
+
+    def get_price_usd(self, token: Token) -> float:
+        self._update_if_stale()
+        try:
+            return self._prices[token]
+        except KeyError:
+            raise InsufficientLiquidity(f'Found no pool with USD price linked to {token}.')
+
+    def _update_if_stale(self):
+        if (
+            self._block != configs.BLOCK
+            or (configs.BLOCK == 'latest' and time.time() - self._timestamp > self.max_age)
+        ):
+            self.update()
+
+    def update(self):
+        pools_by_token = dict(self._pools_by_token)  # Pools may be added from other threads
+        prices = {
+            token: get_chainlink_price_usd(token, self.web3)
+            for token in pools_by_token
+            if token in get_price_feeds()
+        }
+        frontier = set(prices)
+        while frontier:
+            candidates: dict[Token, tuple[float, float]] = {}
+            visited_pools = set()
+            for reserve_token in frontier:
+                for pool in pools_by_token.get(reserve_token, []):
+                    if pool in visited_pools:
+                        continue
+                    visited_pools.add(pool)
+                    self._add_pool_candidates(pool, prices, candidates)
+            for token, (_, price) in candidates.items():
+                prices[token] = price
+            frontier = set(candidates)
+
+        self._prices = prices
+        self._block = configs.BLOCK
+        self._timestamp = time.time()
+
+    @staticmethod
+    def _add_pool_candidates(
+        pool: LiquidityPool,
+        prices: dict[Token, float],
+        candidates: dict[Token, tuple[float, float]],
+    ):
+        reserves = pool.reserves
+        for token in pool.tokens:
+            if token in prices:
+                continue
+            for reserve in reserves:
+                if reserve.token not in prices:
+                    continue
+                reserve_token_price = prices[reserve.token]
+                liquidity = reserve_token_price * reserve.amount_in_units
+                if token in candidates and candidates[token][0] >= liquidity:
+                    continue
+                try:
+                    token_usd_price = _get_token_price(token, pool, reserve, reserve_token_price)
+                except (InsufficientLiquidity, ZeroDivisionError):
+                    continue
+                candidates[token] = (liquidity, token_usd_price)
+
@@ -0,0 +1,327 @@
+"""Raw JSON-RPC client for hot-path calls, bypassing web3.py's contract and middleware machinery.
+
+Calls use precomputed function selectors and hand-written decoders for fixed return layouts, and
+can be sent as JSON-RPC batches. Requests go directly to the node's IPC socket or HTTP endpoint
+(websocket endpoints fall back to the web3 provider), encoded with orjson when it is installed.
+Used by pools entities and `tools.transaction` when `configs.USE_RAW_RPC` is set.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import socket
+import threading
+from functools import lru_cache
+from typing import Any, Callable, NamedTuple, Optional, Union
+
+import httpx
+from web3 import Web3
+from web3.exceptions import TransactionNotFound
+
+import configs
+
+log = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 10.0
+IPC_CHUNK_SIZE = 1 << 16
+MAX_BATCH_SIZE = 500  # Larger batches are split into multiple requests
+WORD_SIZE = 32
+
+# Function selectors
+GET_RESERVES_SELECTOR = '0x0902f1ac'  # getReserves()
+BALANCES_SELECTOR = '0x4903b0d1'  # balances(uint256)
+LATEST_ROUND_DATA_SELECTOR = '0xfeaf968c'  # latestRoundData()
+BALANCE_OF_SELECTOR = '0x70a08231'  # balanceOf(address)
+
+Block = Union[int, str]
+Call = tuple[str, list]  # (method, params)
+
+
+class RPCError(ValueError):
+    """JSON-RPC error response; args are the error dict, same as web3.py's ValueError"""
+
+
+class Receipt(NamedTuple):
+    # Same attribute names as web3.py's receipts, for compatibility
+    status: int
+    blockNumber: int
+    gasUsed: int
+    logs: list[dict]
+
+
+@lru_cache(maxsize=None)
+def get_json_codec() -> tuple[Callable[[Any], bytes], Callable[[bytes], Any]]:
+    """Return (dumps, loads) of orjson if installed, else of standard json"""
+    try:
+        import orjson
+    except ImportError:
+        log.info('orjson not installed, using standard json on raw RPC client')
+        return (lambda obj: json.dumps(obj).encode()), json.loads
+    return orjson.dumps, orjson.loads
+
+
+def encode_block(block: Block = None) -> str:
+    block = configs.BLOCK if block is None else block
+    return block if isinstance(block, str) else hex(block)
+
+
+def encode_uint(value: int) -> str:
+    return f'{value:064x}'
+
+
+def encode_address(address: str) -> str:
+    return address[2:].lower().rjust(64, '0')
+
+
+def decode_words(data: Union[str, bytes], n: int) -> tuple[int, ...]:
+    """Decode first `n` 32 bytes words of return data as uint256"""
+    if isinstance(data, str):
+        data = bytes.fromhex(data[2:])
+    if len(data) < n * WORD_SIZE:
+        raise RPCError({'message': f'Return data too short ({len(data)} bytes)'})
+    return tuple(
+        int.from_bytes(data[i * WORD_SIZE:(i + 1) * WORD_SIZE], 'big')
+        for i in range(n)
+    )
+
+
+def decode_int(word: int) -> int:
+    """Convert uint256 to int256"""
+    return word - (1 << 256) if word >= 1 << 255 else word
+
+
+def decode_reserves(data: Union[str, bytes]) -> tuple[int, int, int]:
+    """getReserves() returns (uint112 reserve0, uint112 reserve1, uint32 blockTimestampLast)"""
+    return decode_words(data, 3)
+
+
+def decode_uint(data: Union[str, bytes]) -> int:
+    return decode_words(data, 1)[0]
+
+
+def decode_round_data(data: Union[str, bytes]) -> tuple[int, int, int, int, int]:
+    """latestRoundData() returns (uint80 roundId, int256 answer, uint256 startedAt,
+    uint256 updatedAt, uint80 answeredInRound)"""
+    round_id, answer, started_at, updated_at, answered_in_round = decode_words(data, 5)
+    return round_id, decode_int(answer), started_at, updated_at, answered_in_round
+
+
+class RawRPC:
+    def __init__(self, endpoint_uri: str, timeout: float = DEFAULT_TIMEOUT):
+        """JSON-RPC client of a single endpoint. Thread-safe; IPC connections are per-thread"""
+        self.endpoint_uri = endpoint_uri
+        self.timeout = timeout
+
+        self._dumps, self._loads = get_json_codec()
+        self._local = threading.local()
+        self._http_client: httpx.Client = None
+        self._provider = None
+        if endpoint_uri.startswith('http'):
+            self._http_client = httpx.Client(timeout=timeout)
+            self._send = self._send_http
+        elif endpoint_uri.endswith('ipc'):
+            self._send = self._send_ipc
+        else:
+            from tools import w3
+            self._provider = w3.from_uri(endpoint_uri).provider
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.endpoint_uri})'
+
+    def _get_ipc_socket(self) -> socket.socket:
+        if (sock := getattr(self._local, 'socket', None)) is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.endpoint_uri)
+            self._local.socket = sock
+        return sock
+
+    def _close_ipc_socket(self):
+        if (sock := getattr(self._local, 'socket', None)) is not None:
+            sock.close()
+            self._local.socket = None
+
+    def _send_ipc(self, payload: bytes) -> Any:
+        for i in range(2):  # Retry once on a new connection, if node closed previous one
+            try:
+                sock = self._get_ipc_socket()
+                sock.sendall(payload)
+                return self._receive_ipc(sock)
+            except OSError:
+                self._close_ipc_socket()
+                if i == 1:
+                    raise
+
+    def _receive_ipc(self, sock: socket.socket) -> Any:
+        data = b''
+        while True:
+            chunk = sock.recv(IPC_CHUNK_SIZE)
+            if not chunk:
+                raise ConnectionError('IPC connection closed')
+            data += chunk
+            if data.rstrip()[-1:] not in (b'}', b']'):
+                continue
+            try:
+                return self._loads(data)
+            except ValueError:
+                continue  # Incomplete response
+
+    def _send_http(self, payload: bytes) -> Any:
+        response = self._http_client.post(
+            self.endpoint_uri, content=payload, headers={'Content-Type': 'application/json'})
+        response.raise_for_status()
+        return self._loads(response.content)
+
+    def batch(self, calls: list[Call], raise_errors: bool = True) -> list[Any]:
+        """Send calls as a single JSON-RPC batch and return their results in the same order.
+        If `raise_errors` is False, failed calls return an RPCError instead of raising it"""
+        if not calls:
+            return []
+        if len(calls) > MAX_BATCH_SIZE:
+            return [
+                result
+                for i in range(0, len(calls), MAX_BATCH_SIZE)
+                for result in self.batch(calls[i:i + MAX_BATCH_SIZE], raise_errors)
+            ]
+        if self._provider is not None:
+            responses = [self._provider.make_request(method, params) for method, params in calls]
+        else:
+            requests = [
+                {'jsonrpc': '2.0', 'id': i, 'method': method, 'params': params}
+                for i, (method, params) in enumerate(calls)
+            ]
+            if len(requests) == 1:
+                responses = [self._send(self._dumps(requests[0]))]
+            else:
+                responses = sorted(self._send(self._dumps(requests)), key=lambda r: r['id'])
+        results = []
+        for response in responses:
+            if 'error' in response:
+                error = RPCError(response['error'])
+                if raise_errors:
+                    raise error
+                results.append(error)
+            else:
+                results.append(response['result'])
+        return results
+
+    def request(self, method: str, params: list) -> Any:
+        return self.batch([(method, params)])[0]
+
+    def eth_call(self, to: str, data: str, block: Block = None) -> str:
+        return self.request('eth_call', [{'to': to, 'data': data}, encode_block(block)])
+
+    def eth_call_batch(
+        self,
+        calls: list[tuple[str, str]],
+        block: Block = None,
+        raise_errors: bool = True,
+    ) -> list[Union[str, RPCError]]:
+        """Batch of eth_call's of (to, data) at the same block"""
+        block = encode_block(block)
+        return self.batch(
+            [('eth_call', [{'to': to, 'data': data}, block]) for to, data in calls],
+            raise_errors,
+        )
+
+    def call_transaction(self, tx: dict, block: Block = None) -> str:
+        """eth_call of transaction dict built by web3.py's `buildTransaction`"""
+        params = {
+            key: hex(value) if isinstance(value, int) else value
+            for key, value in tx.items()
+            if key in ('from', 'to', 'gas', 'gasPrice', 'value', 'data')
+        }
+        return self.request('eth_call', [params, encode_block(block)])
+
+    def get_transaction_receipt(self, tx_hash: str) -> Receipt:
+        receipt = self.request('eth_getTransactionReceipt', [tx_hash])
+        if receipt is None:
+            raise TransactionNotFound(f'Transaction with hash: {tx_hash} not found.')
+        return Receipt(
+            int(receipt['status'], 16),
+            int(receipt['blockNumber'], 16),
+            int(receipt['gasUsed'], 16),
+            receipt['logs'],
+        )
+
+
+def get_endpoint_uri(web3: Web3) -> str:
+    provider = web3.provider
+    if (endpoint_uri := getattr(provider, 'endpoint_uri', None)) is not None:
+        return str(endpoint_uri)
+    return str(provider.ipc_path)
+
+
+@lru_cache(maxsize=None)
+def _get_client(endpoint_uri: str) -> RawRPC:
+    return RawRPC(endpoint_uri)
+
+
+def get_client(web3: Web3) -> RawRPC:
+    """Client connected to the same endpoint as `web3`"""
+    return _get_client(get_endpoint_uri(web3))
+
+
+def get_reserves(address: str, web3: Web3, block: Block = None) -> tuple[int, int, int]:
+    return decode_reserves(get_client(web3).eth_call(address, GET_RESERVES_SELECTOR, block))
+
+
+def get_reserves_batch(
+    addresses: list[str],
+    web3: Web3,
+    block: Block = None,
+) -> list[Optional[tuple[int, int, int]]]:
+    """UniswapV2 pairs' getReserves() in a single batch, with None for failed calls"""
+    data = get_client(web3).eth_call_batch(
+        [(address, GET_RESERVES_SELECTOR) for address in addresses], block, False)
+    results = []
+    for address, result in zip(addresses, data):
+        try:
+            if isinstance(result, RPCError):
+                raise result
+            results.append(decode_reserves(result))
+        except RPCError as e:
+            log.debug(f'Failed to read reserves of {address} ({e})')
+            results.append(None)
+    return results
+
+
+def get_balances(address: str, n_coins: int, web3: Web3, block: Block = None) -> list[int]:
+    """Curve pool's balances(i) for all coins, in a single batch"""
+    data = get_client(web3).eth_call_batch(
+        [(address, BALANCES_SELECTOR + encode_uint(i)) for i in range(n_coins)], block)
+    return [decode_uint(result) for result in data]
+
+
+def get_token_balances(
+    owner: str,
+    token_addresses: list[str],
+    web3: Web3,
+    block: Block = None,
+) -> list[int]:
+    """ERC20 balanceOf(owner) of all tokens, in a single batch"""
+    data = get_client(web3).eth_call_batch(
+        [(address, BALANCE_OF_SELECTOR + encode_address(owner)) for address in token_addresses],
+        block,
+    )
+    return [decode_uint(result) for result in data]
+
+
+def get_latest_round_data(
+    addresses: list[str],
+    web3: Web3,
+    block: Block = None,
+) -> list[Optional[tuple[int, int, int, int, int]]]:
+    """Chainlink feeds' latestRoundData() in a single batch, with None for failed calls"""
+    data = get_client(web3).eth_call_batch(
+        [(address, LATEST_ROUND_DATA_SELECTOR) for address in addresses], block, False)
+    results = []
+    for address, result in zip(addresses, data):
+        try:
+            if isinstance(result, RPCError):
+                raise result
+            results.append(decode_round_data(result))
+        except RPCError as e:
+            log.debug(f'Failed to read chainlink feed {address} ({e})')
+            results.append(None)
+    return results
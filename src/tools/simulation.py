@@ -84,7 +84,7 @@ def simulate_block(
         try:
             cache.clear_caches(clear_all=clear_all_caches)
             if reset_tx_counter:
-                transaction.ACCOUNT_TX_COUNTER.reset()
+                transaction.WALLET_POOL.reset()
             configs.BLOCK = block
             yield
         finally:
@@ -95,24 +95,24 @@ def simulate_block(
             hardhat_fork_process = HardhatForkProcess(block)
             hardhat_fork_process.start()
             if reset_tx_counter:
-                transaction.ACCOUNT_TX_COUNTER.reset()
+                transaction.WALLET_POOL.reset()
             cache.clear_caches(clear_all=clear_all_caches)
             yield
         finally:
             hardhat_fork_process.stop()
             cache.clear_caches(clear_all=clear_all_caches)
             if reset_tx_counter:
-                transaction.ACCOUNT_TX_COUNTER.reset()
+                transaction.WALLET_POOL.reset()
     else:
         previous_block = hardhat_fork_process.block
         try:
             hardhat_fork_process.restart_at_block(block)
             cache.clear_caches(clear_all=clear_all_caches)
             if reset_tx_counter:
-                transaction.ACCOUNT_TX_COUNTER.reset()
+                transaction.WALLET_POOL.reset()
             yield
         finally:
             hardhat_fork_process.restart_at_block(previous_block)
             cache.clear_caches(clear_all=clear_all_caches)
             if reset_tx_counter:
-                transaction.ACCOUNT_TX_COUNTER.reset()
+                transaction.WALLET_POOL.reset()
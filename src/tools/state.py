@@ -0,0 +1,259 @@
+"""Shared reserves state, served by `strategies.state_daemon` over a local Unix socket.
+
+The daemon owns the union of the pools of all strategies, reads their reserves once per block
+and keeps a binary snapshot of them, so that strategy processes don't poll the node for the
+same reserves, and can load pools without calling the node for their tokens.
+
+Protocol: requests and responses are `struct` framed as 1 byte command + 4 bytes payload
+length + payload (responses have no command byte):
+    - b'S' (snapshot): empty payload; response is a snapshot header (block number, number of
+      pools) followed by one entry per pool (address, reserve0, reserve1, timestamp)
+    - b'R' (register): payload is concatenated 20 bytes addresses of pools to be read by daemon
+    - b'M' (metadata): payload is concatenated addresses; response is JSON with tokens
+      (address, symbol, decimals) of each known pool
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import socket
+import socketserver
+import struct
+import time
+from functools import lru_cache
+from threading import Lock
+from typing import Iterable, NamedTuple, Optional, Protocol
+
+from web3 import Web3
+
+import configs
+
+log = logging.getLogger(__name__)
+
+CMD_SNAPSHOT = b'S'
+CMD_REGISTER = b'R'
+CMD_METADATA = b'M'
+
+REQUEST_HEADER = struct.Struct('!cI')
+RESPONSE_HEADER = struct.Struct('!I')
+SNAPSHOT_HEADER = struct.Struct('!QI')  # block number, number of pools
+SNAPSHOT_ENTRY = struct.Struct('!20s14s14sI')  # address, uint112 reserve0, uint112 reserve1, ts
+ADDRESS_SIZE = 20
+RESERVE_SIZE = 14
+
+SOCKET_TIMEOUT = 2.0
+SNAPSHOT_RETRY_INTERVAL = 0.01  # Minimum seconds between requests of snapshot to daemon
+RECONNECT_INTERVAL = 10.0  # Seconds to wait before retrying connection to daemon after failure
+
+
+class PoolReserves(NamedTuple):
+    reserve_0: int
+    reserve_1: int
+    timestamp: int
+
+
+def encode_addresses(addresses: Iterable[str]) -> bytes:
+    return b''.join(bytes.fromhex(address[2:]) for address in addresses)
+
+
+def decode_addresses(data: bytes) -> list[str]:
+    return [
+        Web3.toChecksumAddress(data[i:i + ADDRESS_SIZE])
+        for i in range(0, len(data), ADDRESS_SIZE)
+    ]
+
+
+def encode_snapshot(block_number: int, reserves: dict[str, PoolReserves]) -> bytes:
+    return SNAPSHOT_HEADER.pack(block_number, len(reserves)) + b''.join(
+        SNAPSHOT_ENTRY.pack(
+            bytes.fromhex(address[2:]),
+            data.reserve_0.to_bytes(RESERVE_SIZE, 'big'),
+            data.reserve_1.to_bytes(RESERVE_SIZE, 'big'),
+            data.timestamp,
+        )
+        for address, data in reserves.items()
+    )
+
+
+def decode_snapshot(data: bytes) -> tuple[int, dict[bytes, PoolReserves]]:
+    """Block number and reserves of snapshot, keyed by raw 20 bytes address of pool"""
+    block_number, n_pools = SNAPSHOT_HEADER.unpack_from(data)
+    reserves = {}
+    for address, reserve_0, reserve_1, timestamp in SNAPSHOT_ENTRY.iter_unpack(
+        data[SNAPSHOT_HEADER.size:SNAPSHOT_HEADER.size + n_pools * SNAPSHOT_ENTRY.size]
+    ):
+        reserves[address] = PoolReserves(
+            int.from_bytes(reserve_0, 'big'),
+            int.from_bytes(reserve_1, 'big'),
+            timestamp,
+        )
+    return block_number, reserves
+
+
+def send_message(sock: socket.socket, payload: bytes, command: bytes = None):
+    if command is None:
+        sock.sendall(RESPONSE_HEADER.pack(len(payload)) + payload)
+    else:
+        sock.sendall(REQUEST_HEADER.pack(command, len(payload)) + payload)
+
+
+def receive_exact(sock: socket.socket, size: int) -> bytes:
+    chunks = []
+    while size > 0:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk:
+            raise ConnectionError('Connection closed')
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def receive_request(sock: socket.socket) -> tuple[bytes, bytes]:
+    command, size = REQUEST_HEADER.unpack(receive_exact(sock, REQUEST_HEADER.size))
+    return command, receive_exact(sock, size)
+
+
+def receive_response(sock: socket.socket) -> bytes:
+    size, = RESPONSE_HEADER.unpack(receive_exact(sock, RESPONSE_HEADER.size))
+    return receive_exact(sock, size)
+
+
+class StateClient:
+    def __init__(self, socket_path: str):
+        """Client of state daemon, keeping the latest snapshot of reserves. Thread-safe"""
+        self.socket_path = socket_path
+        self.block_number = 0
+        self.reserves: dict[bytes, PoolReserves] = {}  # Keyed by raw 20 bytes address
+
+        self._lock = Lock()
+        self._socket: socket.socket = None
+        self._fetched_at = 0.0
+        self._failed_at = 0.0
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.socket_path}, block={self.block_number})'
+
+    def _request(self, command: bytes, payload: bytes = b'') -> Optional[bytes]:
+        """Send request to daemon, return None if it is unavailable"""
+        if time.time() - self._failed_at < RECONNECT_INTERVAL:
+            return None
+        try:
+            if self._socket is None:
+                self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                self._socket.settimeout(SOCKET_TIMEOUT)
+                self._socket.connect(self.socket_path)
+            send_message(self._socket, payload, command)
+            return receive_response(self._socket)
+        except OSError as e:
+            log.warning(f'{self}: State daemon unavailable ({e!r}), using node')
+            self._failed_at = time.time()
+            if self._socket is not None:
+                self._socket.close()
+                self._socket = None
+            return None
+
+    def _is_stale(self) -> bool:
+        if configs.BLOCK == 'latest':
+            return time.time() - self._fetched_at > configs.POLL_INTERVAL
+        return self.block_number < configs.BLOCK
+
+    def _update_snapshot(self):
+        """Fetch snapshot from daemon, without waiting for it to read current block, so that
+        until it does, reserves are read from node"""
+        if time.time() - self._fetched_at < SNAPSHOT_RETRY_INTERVAL:
+            return
+        if (data := self._request(CMD_SNAPSHOT)) is not None:
+            self.block_number, self.reserves = decode_snapshot(data)
+        self._fetched_at = time.time()
+
+    def get_reserves(self, address: str) -> Optional[PoolReserves]:
+        """Reserves of pool on current block (configs.BLOCK), or None if not available"""
+        with self._lock:
+            if self._is_stale():
+                self._update_snapshot()
+            if configs.BLOCK != 'latest' and self.block_number != configs.BLOCK:
+                return None  # Daemon missed block, or block is in the past (e.g.: simulations)
+            return self.reserves.get(bytes.fromhex(address[2:]))
+
+    def register(self, addresses: Iterable[str]):
+        with self._lock:
+            self._request(CMD_REGISTER, encode_addresses(addresses))
+
+    def get_metadata(self, addresses: Iterable[str]) -> dict[str, list[tuple[str, str, int]]]:
+        """Tokens (address, symbol, decimals) of pools known by daemon"""
+        with self._lock:
+            data = self._request(CMD_METADATA, encode_addresses(addresses))
+        return {} if data is None else json.loads(data)
+
+
+@lru_cache(maxsize=None)
+def get_client(socket_path: str = None) -> Optional[StateClient]:
+    """Client connected to configs.STATE_DAEMON_SOCKET, or None if it is not set"""
+    socket_path = configs.STATE_DAEMON_SOCKET if socket_path is None else socket_path
+    if not socket_path:
+        return None
+    return StateClient(socket_path)
+
+
+def get_pool_reserves(address: str) -> Optional[PoolReserves]:
+    """Reserves of pool from state daemon, or None if daemon is not used or unavailable"""
+    if (client := get_client()) is None:
+        return None
+    return client.get_reserves(address)
+
+
+def get_pool_tokens(address: str) -> Optional[list[tuple[str, str, int]]]:
+    """Tokens (address, symbol, decimals) of pool from state daemon, registering pool on daemon
+    if it is unknown. Return None if daemon is not used, unavailable or does not know pool"""
+    if (client := get_client()) is None:
+        return None
+    if (tokens := client.get_metadata([address]).get(address)) is None:
+        client.register([address])
+    return tokens
+
+
+class StateRequestHandler(socketserver.BaseRequestHandler):
+    server: StateServer
+
+    def handle(self):
+        while True:
+            try:
+                command, payload = receive_request(self.request)
+            except (ConnectionError, struct.error):
+                return
+            if command == CMD_SNAPSHOT:
+                response = self.server.state.get_snapshot()
+            elif command == CMD_REGISTER:
+                self.server.state.register(decode_addresses(payload))
+                response = b''
+            elif command == CMD_METADATA:
+                metadata = self.server.state.get_metadata(decode_addresses(payload))
+                response = json.dumps(metadata).encode()
+            else:
+                log.warning(f'Unknown state daemon command {command!r}')
+                return
+            send_message(self.request, response)
+
+
+class StateServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, state: SharedState):
+        """Serve `state` to `StateClient`'s over Unix socket at `socket_path`"""
+        if os.path.exists(socket_path):
+            os.remove(socket_path)  # Stale socket from previous run
+        self.state = state
+        super().__init__(socket_path, StateRequestHandler)
+        os.chmod(socket_path, 0o666)
+
+
+class SharedState(Protocol):
+    def get_snapshot(self) -> bytes:
+        ...
+
+    def register(self, addresses: list[str]):
+        ...
+
+    def get_metadata(self, addresses: list[str]) -> dict[str, list[tuple[str, str, int]]]:
+        ...
@@ -7,6 +7,7 @@ import time
 import traceback
 from concurrent import futures
 from copy import copy
+from functools import lru_cache
 from threading import Lock, Thread
 
 from eth_account.datastructures import SignedTransaction
@@ -15,17 +16,15 @@ from web3.contract import Contract, ContractFunction
 from web3.exceptions import TransactionNotFound
 
 import configs
-from tools import price, w3
+from tools import price, rpc, w3
 
 log = logging.getLogger(__name__)
 
 PUBLIC_ENDPOINTS_FILEPATH = 'addresses/public_rpc_endpoints.json'
 LIST_BG_WEB3: list[BackgroundWeb3] = []
-ACCOUNT = Account.from_key(configs.PRIVATE_KEY)
-ACCOUNT_TX_COUNTER: TransactionCounter = None
+WALLET_POOL: WalletPool = None
 TX_WAIT_POLL_INTERVAL = 0.01
-TX_COUNTER_POLL_INTERVAL = 1.0
-MAX_SECONDS_TX_COUNTER_STAY_AHEAD = 30
+MAX_SECONDS_PENDING_NONCE = 60  # Consider transaction lost after this time for account selection
 
 CONNECTION_KEEP_ALIVE_TIME_INTERVAL = 30
 MAX_BLOCKS_WAIT_RECEIPT = 20
@@ -33,6 +32,25 @@ CHI_FLAG = 'chiFlag'
 DEFAULT_MAX_GAS = 1_000_000
 
 
+def __getattr__(name: str):
+    # Accounts are derived from private keys on first use
+    if name == 'ACCOUNT':
+        return get_account()
+    if name == 'EXECUTOR_ACCOUNTS':
+        return get_executor_accounts()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+@lru_cache(maxsize=None)
+def get_account() -> Account:
+    return Account.from_key(configs.PRIVATE_KEY)
+
+
+@lru_cache(maxsize=None)
+def get_executor_accounts() -> list[Account]:
+    return [Account.from_key(key) for key in configs.EXECUTOR_PRIVATE_KEYS]
+
+
 class BackgroundWeb3:
     def __init__(self, uri: str, verbose: bool = False):
         self.uri = uri
@@ -81,65 +99,97 @@ class BackgroundWeb3:
                     log.warning(traceback.format_exc())
 
 
-class TransactionCounter:
-    def __init__(
-        self,
-        address: str,
-        web3: Web3,
-        poll_interval: float = TX_COUNTER_POLL_INTERVAL,
-    ):
+class NonceTracker:
+    def __init__(self, address: str, web3: Web3):
+        """Nonce tracker for one of our accounts, updated from our own transactions' events instead
+        of polling the node. Only resyncs with the node when a transaction is dropped or on reset"""
         self.address = address
         self.web3 = web3
-        self.poll_interval = poll_interval
-        self.max_checks_stay_ahead = round(MAX_SECONDS_TX_COUNTER_STAY_AHEAD / poll_interval)
 
         self.lock = Lock()
-        self._count = web3.eth.get_transaction_count(address)
-        self._n_checks_stay = 0
+        self._count = web3.eth.get_transaction_count(address, 'pending')
+        self._pending: dict[int, float] = {}  # Nonce -> timestamp sent
 
-        self._tread = Thread(target=self._keep_count_updated, daemon=True)
-        self._tread.start()
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.address}, count={self._count})'
 
     def reset(self):
-        count = self.web3.eth.get_transaction_count(self.address)
-        if self._count != count:
-            with self.lock:
-                self._count = count
-
-    def _keep_count_updated(self):
-        while True:
-            try:
-                time.sleep(self.poll_interval)
-                count = self.web3.eth.get_transaction_count(self.address)
-                if self.count > count:
-                    self._n_checks_stay += 1
-                    if self._n_checks_stay > self.max_checks_stay_ahead:
-                        self._n_checks_stay = 0
-                        with self.lock:
-                            self._count = count
-                else:
-                    self._n_checks_stay = 0
-                    if self._count < count:
-                        with self.lock:
-                            self._count = count
-            except Exception:
-                log.debug('TransactionCounter listener failed, restarting in 1 sec')
-                time.sleep(1)
+        count = self.web3.eth.get_transaction_count(self.address, 'pending')
+        with self.lock:
+            self._count = count
+            self._pending.clear()
 
-    def get_nonce(self):
+    def get_nonce(self) -> int:
         with self.lock:
+            nonce = self._count
             self._count += 1
-            return self._count - 1
+            self._pending[nonce] = time.time()
+            return nonce
+
+    def confirm(self, nonce: int):
+        """Transaction with `nonce` was included in a block, whether it succeeded or not"""
+        with self.lock:
+            self._pending.pop(nonce, None)
+
+    def drop(self, nonce: int):
+        """Transaction with `nonce` was not found in node, resync to avoid a stuck nonce gap"""
+        count = self.web3.eth.get_transaction_count(self.address, 'pending')
+        with self.lock:
+            self._pending.pop(nonce, None)
+            if count < self._count:
+                log.info(f'{self}: resyncing nonce to {count} after dropped {nonce=}')
+                self._count = count
+                self._pending = {n: ts for n, ts in self._pending.items() if n < count}
 
     @property
-    def count(self):
+    def count(self) -> int:
         with self.lock:
             return self._count
 
+    @property
+    def n_pending(self) -> int:
+        min_timestamp = time.time() - MAX_SECONDS_PENDING_NONCE
+        with self.lock:
+            return sum(1 for ts in self._pending.values() if ts > min_timestamp)
+
+
+class WalletPool:
+    def __init__(self, accounts: list[Account], web3: Web3):
+        """Pool of signing accounts, each one with its own nonce tracker, allowing concurrent
+        transactions without nonce collisions"""
+        self.accounts = accounts
+        self.trackers = {
+            account.address: NonceTracker(account.address, web3)
+            for account in accounts
+        }
+        self._index = 0
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(n_accounts={len(self.accounts)})'
+
+    def acquire(self) -> tuple[Account, int]:
+        """Return account with fewest pending transactions (in round-robin order for ties) and
+        its next nonce"""
+        n = len(self.accounts)
+        order = [self.accounts[(self._index + i) % n] for i in range(n)]
+        account = min(order, key=lambda acc: self.trackers[acc.address].n_pending)
+        self._index = (self.accounts.index(account) + 1) % n
+        return account, self.trackers[account.address].get_nonce()
+
+    def confirm(self, address: str, nonce: int):
+        self.trackers[address].confirm(nonce)
+
+    def drop(self, address: str, nonce: int):
+        self.trackers[address].drop(nonce)
+
+    def reset(self):
+        for tracker in self.trackers.values():
+            tracker.reset()
+
 
 def load_contract(contract_data_filepath: str, web3: Web3 = None) -> Contract:
     """Load contract and add "sign_and_call" method to its functions"""
-    web3 = w3.get_web3() if web3 is None else web3
+    web3 = w3.get_default_web3() if web3 is None else web3
     with open(contract_data_filepath) as f:
         data = json.load(f)
     address = data['networks'][str(configs.CHAIN_ID)]['address']
@@ -158,12 +208,17 @@ def _has_chi_flag(func: ContractFunction):
     return any(fn_input.get('name') == CHI_FLAG for fn_input in function_inputs)
 
 
+def get_chi_flag(gas_price: int) -> int:
+    """Burn CHI only if gas price is high relative to current gas price"""
+    return 0 if gas_price < 2 * price.get_gas_price() else 1
+
+
 def get_nonce(address: str, web3: Web3, dry_run: bool = False):
-    if address != ACCOUNT.address:
+    if WALLET_POOL is None or address not in WALLET_POOL.trackers:
         return web3.eth.get_transaction_count(address)
     if dry_run:
-        return ACCOUNT_TX_COUNTER.count
-    return ACCOUNT_TX_COUNTER.get_nonce()
+        return WALLET_POOL.trackers[address].count
+    return WALLET_POOL.trackers[address].get_nonce()
 
 
 def sign_and_send_tx(
@@ -174,7 +229,7 @@ def sign_and_send_tx(
     account: Account = None,
 ) -> str:
     tx = copy(tx)
-    account = ACCOUNT if account is None else account
+    account = get_account() if account is None else account
     tx['gas'] = tx.get('gas', DEFAULT_MAX_GAS)
 
     # Do not use dict get() with default, or it will update nonce unnecessarily
@@ -201,7 +256,7 @@ def dry_run_contract_tx(
     **kwargs,
 ) -> str:
     web3 = func.web3
-    account = ACCOUNT if account_ is None else account_
+    account = get_account() if account_ is None else account_
     gas_price_ = price.get_gas_price() if gas_price_ is None else gas_price_
 
     tx = func(*args, **kwargs).buildTransaction({
@@ -212,6 +267,8 @@ def dry_run_contract_tx(
         'nonce': get_nonce(account.address, web3, dry_run=True),
         'gasPrice': gas_price_,
     })
+    if configs.USE_RAW_RPC:
+        return rpc.get_client(web3).call_transaction(tx)
     return web3.eth.call(tx, block_identifier=configs.BLOCK).hex()
 
 
@@ -224,12 +281,13 @@ def sign_and_send_contract_tx(
     max_gas_: int = DEFAULT_MAX_GAS,
     wait_finish_: bool = False,
     max_blocks_wait_: int = MAX_BLOCKS_WAIT_RECEIPT,
+    nonce_: int = None,
     **kwargs,
 ) -> str:
     web3 = func.web3
-    account = ACCOUNT if account_ is None else account_
+    account = get_account() if account_ is None else account_
     if _has_chi_flag(func) and kwargs.get(CHI_FLAG) is not None:
-        kwargs[CHI_FLAG] = 0 if gas_price_ < 2 * price.get_gas_price() else 1
+        kwargs[CHI_FLAG] = get_chi_flag(gas_price_)
 
     tx = func(*args, **kwargs).buildTransaction({
         'from': account.address,
@@ -238,9 +296,18 @@ def sign_and_send_contract_tx(
         'gas': max_gas_,
         'gasPrice': price.get_gas_price() if gas_price_ is None else gas_price_,
     })
+    if nonce_ is not None:
+        tx['nonce'] = nonce_
     return sign_and_send_tx(tx, web3, wait_finish_, max_blocks_wait_, account)
 
 
+def get_transaction_receipt(tx_hash: str, web3: Web3):
+    """Receipt of transaction; raise TransactionNotFound if it is not mined yet"""
+    if configs.USE_RAW_RPC:
+        return rpc.get_client(web3).get_transaction_receipt(tx_hash)
+    return web3.eth.getTransactionReceipt(tx_hash)
+
+
 def wait_tx_finish(
     tx_hash: str,
     web3: Web3,
@@ -251,7 +318,7 @@ def wait_tx_finish(
     n = 0
     for current_block in listener.wait_for_new_blocks():
         try:
-            receipt = web3.eth.getTransactionReceipt(tx_hash)
+            receipt = get_transaction_receipt(tx_hash, web3)
         except TransactionNotFound:
             n += 1
             if n >= max_blocks_wait:
@@ -279,6 +346,7 @@ def _get_providers() -> list[BackgroundWeb3]:
 
 def setup():
     global LIST_BG_WEB3
-    global ACCOUNT_TX_COUNTER
+    global WALLET_POOL
     LIST_BG_WEB3 = _get_providers()
-    ACCOUNT_TX_COUNTER = TransactionCounter(ACCOUNT.address, LIST_BG_WEB3[0].web3)
+    WALLET_POOL = WalletPool([get_account(), *get_executor_accounts()], LIST_BG_WEB3[0].web3)
+    log.info(f'Using {WALLET_POOL}')
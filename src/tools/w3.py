@@ -1,32 +1,230 @@
 import logging
 import time
+from functools import lru_cache
+from threading import Lock, Thread
+from typing import Any, Iterable
 
 from web3 import HTTPProvider, IPCProvider, Web3, WebsocketProvider
 from web3.middleware import geth_poa_middleware
+from web3.providers.base import BaseProvider
+from web3.types import RPCEndpoint, RPCResponse
 
 import configs
 from tools import process
 
 log = logging.getLogger(__name__)
 
+# Managed provider params
+MONITOR_INTERVAL = 1.0
+MAX_HEAD_LAG = 0  # Maximum blocks behind the most advanced endpoint to be considered fresh
+LATENCY_EWMA_WEIGHT = 0.2  # Weight of each new latency measurement on its moving average
+LATENCY_SWITCH_MARGIN = 0.2  # Only switch to a faster endpoint if it is 20% faster than current
+RETRY_FAILED_ENDPOINT_INTERVAL = 10.0
+NEW_FILTER_METHODS = {'eth_newFilter', 'eth_newBlockFilter', 'eth_newPendingTransactionFilter'}
+FILTER_METHODS = {'eth_getFilterChanges', 'eth_getFilterLogs', 'eth_uninstallFilter'}
 
-def from_uri(endpoint_uri: str) -> Web3:
-    middlewares = []
-    if configs.POA_CHAIN:
-        middlewares.append(geth_poa_middleware)
 
+def get_provider(endpoint_uri: str) -> BaseProvider:
     if endpoint_uri.startswith('http'):
-        provider = HTTPProvider(endpoint_uri)
+        return HTTPProvider(endpoint_uri)
     elif endpoint_uri.startswith('wss'):
-        provider = WebsocketProvider(endpoint_uri)
+        return WebsocketProvider(endpoint_uri)
     elif endpoint_uri.endswith('ipc'):
-        provider = IPCProvider(endpoint_uri)
-    else:
-        raise ValueError(f'Invalid {endpoint_uri=}')
-    return Web3(provider, middlewares)
+        return IPCProvider(endpoint_uri)
+    raise ValueError(f'Invalid {endpoint_uri=}')
+
+
+def _get_middlewares() -> list:
+    return [geth_poa_middleware] if configs.POA_CHAIN else []
+
+
+def from_uri(endpoint_uri: str) -> Web3:
+    return Web3(get_provider(endpoint_uri), _get_middlewares())
+
+
+class Endpoint:
+    def __init__(self, endpoint_uri: str):
+        """RPC endpoint and its health metrics, as measured by `ManagedProvider`"""
+        self.endpoint_uri = endpoint_uri
+        self.provider = get_provider(endpoint_uri)
+        self.head: int = None
+        self.latency: float = None  # Moving average of eth_blockNumber latency, in seconds
+        self.n_requests = 0
+        self.n_errors = 0
+        self.failed_at = 0.0
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.endpoint_uri})'
+
+    @property
+    def is_healthy(self) -> bool:
+        return (
+            self.head is not None
+            and time.time() - self.failed_at > RETRY_FAILED_ENDPOINT_INTERVAL
+        )
+
+    def make_request(self, method: RPCEndpoint, params: Any) -> RPCResponse:
+        self.n_requests += 1
+        try:
+            return self.provider.make_request(method, params)
+        except Exception:
+            self.n_errors += 1
+            self.failed_at = time.time()
+            raise
+
+    def measure(self):
+        start = time.perf_counter()
+        try:
+            response = self.make_request(RPCEndpoint('eth_blockNumber'), [])
+            head = int(response['result'], 16)
+        except Exception as e:
+            log.debug(f'{self} failed health check ({e!r})')
+            self.head = None
+            return
+        latency = time.perf_counter() - start
+        self.head = head
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency += LATENCY_EWMA_WEIGHT * (latency - self.latency)
+
+    def get_metrics(self) -> dict:
+        return {
+            'head': self.head,
+            'latency_ms': None if self.latency is None else self.latency * 1000,
+            'n_requests': self.n_requests,
+            'n_errors': self.n_errors,
+            'healthy': self.is_healthy,
+        }
+
+
+class ManagedProvider(BaseProvider):
+    def __init__(
+        self,
+        endpoint_uris: Iterable[str],
+        monitor_interval: float = MONITOR_INTERVAL,
+        max_head_lag: int = MAX_HEAD_LAG,
+    ):
+        """Provider over multiple endpoints that continuously measures head and latency of each
+        one in a background thread and routes requests to the freshest, fastest endpoint, failing
+        over to the others on errors. Filters are pinned to the endpoint that created them.
+
+        Args:
+            endpoint_uris (Iterable[str]): URIs of endpoints, in order of preference
+            monitor_interval (float): Seconds between health checks of endpoints
+            max_head_lag (int): Maximum blocks behind most advanced endpoint to be selected
+        """
+        self.endpoints = [Endpoint(uri) for uri in dict.fromkeys(endpoint_uris)]
+        self.monitor_interval = monitor_interval
+        self.max_head_lag = max_head_lag
+        self.n_switches = 0
+
+        self.current = self.endpoints[0]
+        self._filters: dict[str, Endpoint] = {}
+        self._lock = Lock()
+        self.monitor()
+        self._thread = Thread(target=self._keep_monitoring, daemon=True)
+        self._thread.start()
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(current={self.current.endpoint_uri})'
+
+    @property
+    def endpoint_uri(self) -> str:
+        """URI of currently selected endpoint"""
+        return self.current.endpoint_uri
+
+    def _keep_monitoring(self):
+        while not process.is_shutting_down():
+            time.sleep(self.monitor_interval)
+            try:
+                self.monitor()
+            except Exception:
+                log.debug(f'{self} failed to monitor endpoints', exc_info=True)
+
+    def monitor(self):
+        for endpoint in self.endpoints:
+            endpoint.measure()
+        self._select_endpoint()
+
+    def _select_endpoint(self):
+        with self._lock:
+            healthy = [endpoint for endpoint in self.endpoints if endpoint.is_healthy]
+            if not healthy:
+                return
+            max_head = max(endpoint.head for endpoint in healthy)
+            fresh = [e for e in healthy if max_head - e.head <= self.max_head_lag]
+            best = min(fresh, key=lambda endpoint: endpoint.latency)
+            current = self.current
+            if best is current:
+                return
+            if (
+                current in fresh
+                and best.latency > current.latency * (1 - LATENCY_SWITCH_MARGIN)
+            ):
+                return
+            self.current = best
+            self.n_switches += 1
+        log.info(f'Switched RPC endpoint from {current} to {best}: {self.get_metrics()}')
+
+    def _get_candidates(self) -> list[Endpoint]:
+        current = self.current
+        others = sorted(
+            (e for e in self.endpoints if e is not current and e.is_healthy),
+            key=lambda endpoint: (-endpoint.head, endpoint.latency),
+        )
+        return [current, *others]
+
+    def make_request(self, method: RPCEndpoint, params: Any) -> RPCResponse:
+        if method in FILTER_METHODS and params and params[0] in self._filters:
+            return self._filters[params[0]].make_request(method, params)
+        candidates = self._get_candidates()
+        for i, endpoint in enumerate(candidates):
+            try:
+                response = endpoint.make_request(method, params)
+            except Exception as e:
+                if i == len(candidates) - 1:
+                    raise
+                log.info(f'Request {method} failed on {endpoint} ({e!r}), failing over')
+                self._select_endpoint()
+                continue
+            if method in NEW_FILTER_METHODS and 'result' in response:
+                self._filters[response['result']] = endpoint
+            return response
+
+    def isConnected(self) -> bool:
+        return any(endpoint.provider.isConnected() for endpoint in self.endpoints)
+
+    def get_metrics(self) -> dict:
+        return {
+            'current': self.current.endpoint_uri,
+            'n_switches': self.n_switches,
+            'endpoints': {
+                endpoint.endpoint_uri: endpoint.get_metrics()
+                for endpoint in self.endpoints
+            },
+        }
+
+
+@lru_cache(maxsize=None)
+def _get_managed_provider(endpoint_uris: tuple[str, ...]) -> ManagedProvider:
+    return ManagedProvider(endpoint_uris)
 
 
 def get_web3(verbose: bool = False, use_remote: bool = configs.USE_REMOTE_RCP_CONNECTION) -> Web3:
+    if configs.USE_MANAGED_PROVIDER:
+        if use_remote:
+            endpoint_uris = (configs.RPC_LOCAL_URI, configs.RPC_REMOTE_URI)
+        else:
+            endpoint_uris = (configs.RPC_LOCAL_URI,)
+        provider = _get_managed_provider(endpoint_uris)
+        if not any(endpoint.is_healthy for endpoint in provider.endpoints):
+            raise Exception('No available RPC connection')
+        if verbose:
+            log.info(f'Using {provider}: {provider.get_metrics()}')
+            log.info(f'Running on chain_id={configs.CHAIN_ID}')
+        return Web3(provider, _get_middlewares())
+
     if use_remote:
         web3_remote = from_uri(configs.RPC_REMOTE_URI)
     else:
@@ -69,6 +267,12 @@ def get_web3(verbose: bool = False, use_remote: bool = configs.USE_REMOTE_RCP_CO
     return web3
 
 
+@lru_cache(maxsize=None)
+def get_default_web3() -> Web3:
+    """Web3 provider shared by functions without explicit provider, connected on first use"""
+    return get_web3()
+
+
 class BlockListener:
     def __init__(
         self,
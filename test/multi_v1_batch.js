@@ -0,0 +1,172 @@
+// Tests of MultiV1.swapBatch_SYr against a BSC fork with unlocked accounts:
+//   scripts/hardhat-fork -f <BSC_NODE_URL> && yarn test:fork
+const MultiV1 = artifacts.require('MultiV1');
+
+const WBNB = '0xbb4CdB9CBd36B01bD1cBaEBF2De08d9173bc095c';
+const BUSD = '0xe9e7CEA3DedcA5984780Bafc599bD69ADd087D56';
+const PCS_1_FACTORY = '0xBCfCcbde45cE874adCB698cC183deBcF17952812';
+const PCS_2_FACTORY = '0xcA143Ce32Fe78f1f7019d7d551a6402fC5350c73';
+const PCS_1 = 0n;
+const PCS_2 = 1n;
+
+const WBNB_ABI = [
+  {name: 'deposit', type: 'function', inputs: [], outputs: [], stateMutability: 'payable'},
+  {
+    name: 'transfer', type: 'function', stateMutability: 'nonpayable',
+    inputs: [{name: 'to', type: 'address'}, {name: 'value', type: 'uint256'}],
+    outputs: [{name: '', type: 'bool'}],
+  },
+  {
+    name: 'balanceOf', type: 'function', stateMutability: 'view',
+    inputs: [{name: 'owner', type: 'address'}], outputs: [{name: '', type: 'uint256'}],
+  },
+];
+const FACTORY_ABI = [{
+  name: 'getPair', type: 'function', stateMutability: 'view',
+  inputs: [{name: 'tokenA', type: 'address'}, {name: 'tokenB', type: 'address'}],
+  outputs: [{name: 'pair', type: 'address'}],
+}];
+const PAIR_ABI = [
+  {
+    name: 'token0', type: 'function', stateMutability: 'view',
+    inputs: [], outputs: [{name: '', type: 'address'}],
+  },
+  {
+    name: 'getReserves', type: 'function', stateMutability: 'view', inputs: [],
+    outputs: [
+      {name: 'reserve0', type: 'uint112'},
+      {name: 'reserve1', type: 'uint112'},
+      {name: 'blockTimestampLast', type: 'uint32'},
+    ],
+  },
+  {
+    name: 'swap', type: 'function', stateMutability: 'nonpayable', outputs: [],
+    inputs: [
+      {name: 'amount0Out', type: 'uint256'},
+      {name: 'amount1Out', type: 'uint256'},
+      {name: 'to', type: 'address'},
+      {name: 'data', type: 'bytes'},
+    ],
+  },
+];
+
+function rpc(method, params) {
+  return new Promise((resolve, reject) => {
+    web3.currentProvider.send(
+      {jsonrpc: '2.0', id: Date.now(), method, params},
+      (err, res) => (err || res.error ? reject(err || res.error) : resolve(res.result)),
+    );
+  });
+}
+
+function toWord(value) {
+  return '0x' + value.toString(16).padStart(64, '0');
+}
+
+// Same as arbitrage.encode_data.encode_data_v2
+function encodeDataV2(dex0, dex1, exp, mant, pairs, tokenFirst, tokenLast) {
+  const addresses = pairs.map(pair => BigInt(pair));
+  const data0 = (
+    (tokenFirst << 254n)
+    + (tokenLast << 253n)
+    + (dex0 << 248n)
+    + (dex1 << 243n)
+    + (exp << 237n)
+    + (mant << 224n)
+    + (addresses[0] << 64n)
+    + (addresses[1] >> 96n)
+  );
+  const data1 = (
+    ((addresses[1] & ((1n << 96n) - 1n)) << 160n)
+    + (addresses.length === 3 ? addresses[2] : 0n)
+  );
+  return [toWord(data0), toWord(data1)];
+}
+
+async function tokenIndex(pair, token) {
+  const token0 = await pair.methods.token0().call();
+  return token0.toLowerCase() === token.toLowerCase() ? 0n : 1n;
+}
+
+// Encode arbitrage sending WBNB to pair0 for BUSD, and BUSD to pair1 for amountLast WBNB
+async function encodeArbitrage(dex0, dex1, pair0, pair1) {
+  const exp = 47n;
+  const mant = 7105n;  // amountLast ~= 1 WBNB
+  return encodeDataV2(
+    dex0,
+    dex1,
+    exp,
+    mant,
+    [pair0.options.address, pair1.options.address],
+    await tokenIndex(pair0, BUSD),
+    await tokenIndex(pair1, WBNB),
+  );
+}
+
+contract('MultiV1', accounts => {
+  const owner = accounts[0];
+  let multi;
+  let wbnb;
+  let pcs1Pair;
+  let pcs2Pair;
+
+  before(async () => {
+    await rpc('hardhat_setBalance', [owner, '0x' + (10n ** 27n).toString(16)]);
+    multi = await MultiV1.new({from: owner});
+    wbnb = new web3.eth.Contract(WBNB_ABI, WBNB);
+    const pcs1Factory = new web3.eth.Contract(FACTORY_ABI, PCS_1_FACTORY);
+    const pcs2Factory = new web3.eth.Contract(FACTORY_ABI, PCS_2_FACTORY);
+    pcs1Pair = new web3.eth.Contract(PAIR_ABI, await pcs1Factory.methods.getPair(WBNB, BUSD).call());
+    pcs2Pair = new web3.eth.Contract(PAIR_ABI, await pcs2Factory.methods.getPair(WBNB, BUSD).call());
+
+    // Dump 5% of WBNB reserves on PCS2 pair, making WBNB cheaper there than on PCS1
+    const wbnbIndex = await tokenIndex(pcs2Pair, WBNB);
+    const reserves = await pcs2Pair.methods.getReserves().call();
+    const [reserveIn, reserveOut] = wbnbIndex === 0n
+      ? [BigInt(reserves.reserve0), BigInt(reserves.reserve1)]
+      : [BigInt(reserves.reserve1), BigInt(reserves.reserve0)];
+    const amountIn = reserveIn / 20n;
+    const amountOut = (amountIn * 997n * reserveOut) / (reserveIn * 1000n + amountIn * 997n);
+    const funding = 10n * 10n ** 18n;
+    await wbnb.methods.deposit().send({from: owner, value: (amountIn + funding).toString()});
+    await wbnb.methods.transfer(pcs2Pair.options.address, amountIn.toString()).send({from: owner});
+    const [amount0Out, amount1Out] = wbnbIndex === 0n ? [0n, amountOut] : [amountOut, 0n];
+    await pcs2Pair.methods.swap(amount0Out.toString(), amount1Out.toString(), owner, '0x')
+      .send({from: owner, gas: 500000});
+    await wbnb.methods.transfer(multi.address, funding.toString()).send({from: owner});
+  });
+
+  it('executes profitable arbitrages and skips unprofitable ones, reporting each', async () => {
+    const profitable = await encodeArbitrage(PCS_1, PCS_2, pcs1Pair, pcs2Pair);
+    const unprofitable = await encodeArbitrage(PCS_2, PCS_1, pcs2Pair, pcs1Pair);
+    const balanceBefore = BigInt(await wbnb.methods.balanceOf(multi.address).call());
+
+    const tx = await multi.swapBatch_SYr([...profitable, ...unprofitable], {from: owner});
+
+    const results = tx.logs.filter(log => log.event === 'BatchItemResult');
+    assert.equal(results.length, 2);
+    assert.equal(results[0].args.index.toString(), '0');
+    assert.isTrue(results[0].args.executed);
+    assert.equal(results[1].args.index.toString(), '1');
+    assert.isFalse(results[1].args.executed);
+    for (const result of results) {
+      assert.isTrue(BigInt(result.args.gasUsed.toString()) > 0n);
+    }
+    // Executed arbitrage uses more gas than skipped one, which only reads reserves
+    assert.isTrue(
+      BigInt(results[0].args.gasUsed.toString()) > BigInt(results[1].args.gasUsed.toString()));
+    const balanceAfter = BigInt(await wbnb.methods.balanceOf(multi.address).call());
+    assert.isTrue(balanceAfter > balanceBefore);
+  });
+
+  it('reverts if no arbitrage is executed', async () => {
+    const unprofitable = await encodeArbitrage(PCS_2, PCS_1, pcs2Pair, pcs1Pair);
+    try {
+      await multi.swapBatch_SYr(unprofitable, {from: owner});
+    } catch (error) {
+      assert.include(error.message, 'LR');
+      return;
+    }
+    assert.fail('Batch without executed arbitrages did not revert');
+  });
+});
@@ -0,0 +1,11 @@
+import os
+import sys
+
+# configs.py requires these to be set, tests do not connect to any node
+os.environ.setdefault('CHAIN_ID', '56')
+os.environ.setdefault('PRIVATE_KEY', '0x' + '11' * 32)
+os.environ.setdefault('ADDRESS', '0x19E7E376E7C213B7E7e7e46cc70A5dD086DAff2A')
+os.environ.setdefault('CACHE_TTL', '1')
+os.environ.setdefault('POLL_INTERVAL', '1')
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), 'src'))
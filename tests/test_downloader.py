@@ -0,0 +1,103 @@
+"""Tests of scripts/downloader.py against a local HTTP server supporting Range requests"""
+import asyncio
+import concurrent.futures
+import importlib.util
+import json
+import os
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip('requests')
+pytest.importorskip('tqdm')
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'scripts', 'downloader.py')
+DATA = bytes(range(256)) * 40  # 10240 bytes
+CHUNK_SIZE = 1000
+
+
+@pytest.fixture
+def downloader(monkeypatch):
+    spec = importlib.util.spec_from_file_location('downloader', SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    monkeypatch.setattr(module, 'DOWNLOAD_JIGGLE_TIME', 0)
+    monkeypatch.setattr(module, 'BLOCK_SIZE_DISK_WRITE', 100)
+    return module
+
+
+@pytest.fixture
+def server():
+    ranges = []
+
+    class RangeHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if (match := re.fullmatch(r'bytes=(\d+)-(\d+)', self.headers.get('Range', ''))):
+                start, end = int(match[1]), int(match[2])
+                ranges.append((start, end))
+                self.send_response(206)
+                self.send_header('Content-Range', f'bytes {start}-{end}/{len(DATA)}')
+                body = DATA[start:end + 1]
+            else:
+                self.send_response(200)
+                body = DATA
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), RangeHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{httpd.server_port}/snap.tar.gz', ranges
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _download(downloader, url, output):
+    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+        asyncio.run(downloader.download(executor, url, output, CHUNK_SIZE))
+
+
+def _write_journal(output, url, written):
+    header = {'url': url, 'size': len(DATA), 'chunk_size': CHUNK_SIZE}
+    with open(f'{output}.journal', 'w') as f:
+        json.dump({**header, 'written': written}, f)
+
+
+def test_download(downloader, server, tmp_path):
+    url, ranges = server
+    output = str(tmp_path / 'snap.tar.gz')
+    _download(downloader, url, output)
+    assert open(output, 'rb').read() == DATA
+    assert not os.path.exists(f'{output}.journal')
+    assert len(ranges) == len(range(0, len(DATA), CHUNK_SIZE))
+
+
+def test_resume_from_journal(downloader, server, tmp_path):
+    url, ranges = server
+    output = str(tmp_path / 'snap.tar.gz')
+    with open(output, 'wb') as f:
+        f.write(DATA[:CHUNK_SIZE + 300] + bytes(len(DATA) - CHUNK_SIZE - 300))
+    _write_journal(output, url, {'0': CHUNK_SIZE, '1': 300})
+    _download(downloader, url, output)
+    assert open(output, 'rb').read() == DATA
+    assert (0, CHUNK_SIZE - 1) not in ranges
+    assert (CHUNK_SIZE + 300, 2 * CHUNK_SIZE - 1) in ranges
+
+
+@pytest.mark.parametrize('output_size', [None, len(DATA) // 2])
+def test_journal_discarded_without_output(downloader, server, tmp_path, output_size):
+    url, ranges = server
+    output = str(tmp_path / 'snap.tar.gz')
+    if output_size is not None:
+        with open(output, 'wb') as f:
+            f.write(bytes(output_size))
+    _write_journal(output, url, {str(i): CHUNK_SIZE for i in range(len(DATA) // CHUNK_SIZE)})
+    _download(downloader, url, output)
+    assert open(output, 'rb').read() == DATA
+    assert (0, CHUNK_SIZE - 1) in ranges
@@ -0,0 +1,96 @@
+"""Offline tests of tools.evm against hand-built state fixtures"""
+import pytest
+
+pytest.importorskip('eth')
+
+from eth_utils import to_checksum_address  # noqa: E402
+
+from tools import evm  # noqa: E402
+
+SENDER = '0x19E7E376E7C213B7E7e7e46cc70A5dD086DAff2A'
+PAIR = '0x58F876857a02D6762E0101bb5C46A8c1ED44Dc16'
+TOKEN = '0xbb4CdB9CBd36B01bD1cBaEBF2De08d9173bc095c'
+REVERTER = '0x0000000000000000000000000000000000000Bad'
+
+# PUSH1 8 SLOAD PUSH1 0 MSTORE PUSH1 32 PUSH1 0 RETURN: returns reserves slot of UniswapV2Pair
+RESERVES_READER_CODE = '0x60085460005260206000f3'
+# CODECOPY(0, 12, 100) REVERT(0, 100), followed by abi encoded Error("LR")
+REVERTER_CODE = '0x6064600c6000396064' + '6000fd' + (
+    '08c379a0'
+    + f'{0x20:064x}'
+    + f'{2:064x}'
+    + b'LR'.hex().ljust(64, '0')
+)
+BLOCK_TIMESTAMP_LAST = 1_625_000_000
+RESERVES = 10**18 | 2 * 10**18 << 112 | BLOCK_TIMESTAMP_LAST << 224
+
+
+@pytest.fixture
+def fixture():
+    balance_slot = evm._get_mapping_slot(PAIR, 1)
+    prestate = {
+        SENDER.lower(): {'balance': hex(10**18), 'nonce': 1},
+        PAIR.lower(): {
+            'balance': '0x0',
+            'code': RESERVES_READER_CODE,
+            'storage': {hex(evm.UNISWAP_V2_RESERVES_SLOT): hex(RESERVES)},
+        },
+        TOKEN.lower(): {
+            'balance': '0x0',
+            'code': '0x00',
+            'storage': {hex(balance_slot): hex(10**18)},
+        },
+        REVERTER.lower(): {'balance': '0x0', 'code': REVERTER_CODE},
+    }
+    block = {'number': 1, 'timestamp': BLOCK_TIMESTAMP_LAST + 3, 'gas_limit': 80_000_000}
+    return evm.StateFixture.from_prestate(prestate, block)
+
+
+def test_fixture_save_load(fixture, tmp_path):
+    filepath = tmp_path / 'fixture.json'
+    fixture.save(filepath)
+    loaded = evm.StateFixture.load(filepath)
+    assert loaded.accounts == fixture.accounts
+    assert loaded.block == fixture.block
+
+
+def test_fixture_merge(fixture):
+    other = evm.StateFixture.from_prestate({
+        PAIR.lower(): {'storage': {'0x9': '0x1'}},
+    }, {'number': 2})
+    fixture.merge(other)
+    storage = fixture.accounts[to_checksum_address(PAIR)]['storage']
+    assert storage == {evm.UNISWAP_V2_RESERVES_SLOT: RESERVES, 9: 1}
+    assert fixture.block == {'number': 2}
+
+
+def test_call_reads_fixture_storage(fixture):
+    local_evm = evm.LocalEVM(fixture)
+    result = local_evm.call(SENDER, PAIR, b'')
+    assert result.success
+    assert int.from_bytes(result.output, 'big') == RESERVES
+    assert result.gas_used > evm.get_intrinsic_gas(b'')
+
+
+def test_set_uniswap_v2_reserves(fixture):
+    local_evm = evm.LocalEVM(fixture)
+    local_evm.set_uniswap_v2_reserves(PAIR, 5, 7, token_1_address=TOKEN)
+    output = local_evm.call(SENDER, PAIR, b'').output
+    assert int.from_bytes(output, 'big') == 5 | 7 << 112 | BLOCK_TIMESTAMP_LAST << 224
+    assert local_evm.get_storage(TOKEN, evm._get_mapping_slot(PAIR, 1)) == 7
+
+
+def test_set_erc20_balance_requires_slot_in_fixture(fixture):
+    local_evm = evm.LocalEVM(fixture)
+    with pytest.raises(ValueError):
+        local_evm.set_erc20_balance(TOKEN, SENDER, 1)
+
+
+def test_call_revert_reason(fixture):
+    result = evm.LocalEVM(fixture).call(SENDER, REVERTER, b'')
+    assert not result.success
+    assert result.revert_reason == 'LR'
+
+
+def test_get_intrinsic_gas():
+    assert evm.get_intrinsic_gas(b'\x00\x01') == 21_000 + 4 + 16
@@ -17,6 +17,14 @@ module.exports = {
       gasPrice: 5000000000,
       skipDryRun: true,
     },
+    fork: {  // BSC fork with unlocked accounts, e.g.: scripts/hardhat-fork
+      host: "127.0.0.1",
+      port: 8546,
+      network_id: '*',
+      gas: 9000000,
+      gasPrice: 5000000001,
+      skipDryRun: true,
+    },
     testnet: {
       provider: () => new HDWalletProvider({
         privateKeys: [privateKey],